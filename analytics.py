@@ -0,0 +1,342 @@
+"""
+Hotel Booking System - Occupancy, ADR and RevPAR Analytics
+
+The standard hotel KPIs per day, week or month, for the whole hotel or per
+room type:
+    occupancy  room nights sold / room nights available
+    ADR        room revenue / room nights sold (average daily rate)
+    RevPAR     room revenue / room nights available
+
+Bookings are turned into columns (NumPy arrays of room type, check-in,
+check-out, nightly rate) once, and every stay is expanded into its room
+nights with np.repeat over the columns, so there is no loop per night.
+Nights are then summed per day and room type with np.bincount and rolled
+up into weeks (starting Monday) or months. Revenue is spread evenly over
+the nights of a stay.
+
+hotel_kpis, the date range report the CLI runs, doesn't scan bookings at
+all: it reads the daily rollups (rollups.py), which hold the same nights
+sold and spread revenue per day and room type, so its cost is one row per
+day of the range however long the history is. compute_kpis over columns is
+there for bookings that aren't in storage (what-if sets, tests).
+
+Example:
+    >>> kpis = hotel_kpis("2026-01-01", "2026-04-01", period="month", by_room_type=True)
+    >>> for row in kpis.rows(): print(row)
+
+Functions:
+    load_columns: Read bookings from storage into BookingColumns
+    compute_kpis: KPIs for some columns over a date range
+    rollup_kpis: KPIs over a date range from the daily rollups
+    hotel_kpis: KPIs for the bookings in storage, from the daily rollups
+
+Classes:
+    BookingColumns: Bookings as NumPy arrays
+    KPIs: Result of compute_kpis
+"""
+
+from datetime import date, datetime
+
+import numpy as np
+
+import rollups
+import storage
+from models import default_rooms
+
+PERIODS = ("day", "week", "month")
+#Day numbers are days since 1970-01-01, the same as np.datetime64[D]
+_EPOCH = date(1970, 1, 1).toordinal()
+
+
+def _day(text, days):
+    number = days.get(text)
+    if number is None:
+        try:
+            number = datetime.strptime(text, "%Y-%m-%d").toordinal() - _EPOCH
+        except (TypeError, ValueError):
+            number = -1
+        days[text] = number
+    return number
+
+
+def _catalog(rooms):
+    """Room types in catalog order, and the type of every room id"""
+    types, type_of = [], {}
+    for room in rooms:
+        if room.room_type not in types:
+            types.append(room.room_type)
+        type_of[room.room_id] = room.room_type
+    return types, type_of
+
+
+class BookingColumns:
+    """
+    Confirmed bookings as parallel NumPy arrays.
+
+    Attributes:
+        room_types (list): Room type names, indexed by room_type
+        room_type (np.ndarray): Room type index of each booking (int16)
+        check_in (np.ndarray): Check-in day number (int32, days since 1970-01-01)
+        check_out (np.ndarray): Check-out day number (int32)
+        rate (np.ndarray): Revenue per night (float64)
+    """
+
+    def __init__(self, room_types, room_type, check_in, check_out, rate):
+        self.room_types = room_types
+        self.room_type = room_type
+        self.check_in = check_in
+        self.check_out = check_out
+        self.rate = rate
+
+    def __len__(self):
+        return len(self.check_in)
+
+    @classmethod
+    def from_bookings(cls, bookings, rooms=None):
+        """
+        Build columns from booking dicts, keeping CONFIRMED stays with valid dates.
+
+        Args:
+            bookings (iterable): Booking dictionaries
+            rooms (list): Room catalog, a booking's room type comes from its room id
+                (or its own room_type for rooms no longer in the catalog)
+
+        Returns:
+            BookingColumns: The columns
+        """
+        room_types, type_of = _catalog(rooms if rooms is not None else default_rooms())
+        type_index = {name: i for i, name in enumerate(room_types)}
+        days = {}
+        kinds, starts, ends, prices = [], [], [], []
+        for b in bookings:
+            if b.get('status') != 'CONFIRMED':
+                continue
+            check_in, check_out = _day(b.get('check_in'), days), _day(b.get('check_out'), days)
+            if check_in < 0 or check_out <= check_in:
+                continue
+            name = type_of.get(b.get('room_id'), b.get('room_type'))
+            if name not in type_index:
+                type_index[name] = len(room_types)
+                room_types.append(name)
+            kinds.append(type_index[name])
+            starts.append(check_in)
+            ends.append(check_out)
+            prices.append(b.get('total_price') or 0.0)
+        check_in = np.array(starts, dtype=np.int32)
+        check_out = np.array(ends, dtype=np.int32)
+        rate = np.array(prices, dtype=np.float64) / np.maximum(check_out - check_in, 1)
+        return cls(room_types, np.array(kinds, dtype=np.int16), check_in, check_out, rate)
+
+
+def load_columns(end=None, rooms=None, include_cold=True):
+    """
+    Read the confirmed bookings from storage into columns.
+
+    Args:
+        end (str): Skip partitions for check-in months after this date
+        rooms (list): Room catalog, defaults to models.default_rooms()
+        include_cold (bool): Also read the compressed archive
+
+    Returns:
+        BookingColumns: The columns
+    """
+    #No start pruning: a stay checking in months earlier can still run into the range
+    return BookingColumns.from_bookings(storage.iter_bookings(include_cold=include_cold, end=end), rooms)
+
+
+class KPIs:
+    """
+    Occupancy, ADR and RevPAR per period (and per room type).
+
+    Arrays are indexed [period] for the whole hotel or [period, room type]
+    with by_room_type.
+
+    Attributes:
+        period (str): "day", "week" or "month"
+        starts (np.ndarray): First day of each period (datetime64[D])
+        room_types (list): Column names with by_room_type, None otherwise
+        available (np.ndarray): Room nights available
+        sold (np.ndarray): Room nights sold
+        revenue (np.ndarray): Room revenue
+    """
+
+    def __init__(self, period, starts, room_types, available, sold, revenue):
+        self.period = period
+        self.starts = starts
+        self.room_types = room_types
+        self.available = available
+        self.sold = sold
+        self.revenue = revenue
+
+    @staticmethod
+    def _ratio(top, bottom):
+        return np.divide(top, bottom, out=np.zeros(np.shape(top), dtype=np.float64), where=bottom > 0)
+
+    @property
+    def occupancy(self):
+        """Room nights sold / available (0-1)"""
+        return self._ratio(self.sold, self.available)
+
+    @property
+    def adr(self):
+        """Average daily rate: revenue / room nights sold"""
+        return self._ratio(self.revenue, self.sold)
+
+    @property
+    def revpar(self):
+        """Revenue per available room night"""
+        return self._ratio(self.revenue, self.available)
+
+    def rows(self):
+        """
+        The KPIs as plain dicts, one per period (and room type).
+
+        Yields:
+            dict: period, room_type (with by_room_type), available, sold, revenue, occupancy, adr, revpar
+        """
+        occupancy, adr, revpar = self.occupancy, self.adr, self.revpar
+        for i, start in enumerate(self.starts):
+            for j, name in enumerate(self.room_types or [None]):
+                index = (i, j) if self.room_types else i
+                row = {"period": str(start)}
+                if self.room_types:
+                    row["room_type"] = name
+                row.update(available=int(self.available[index]), sold=int(self.sold[index]),
+                           revenue=round(float(self.revenue[index]), 2), occupancy=round(float(occupancy[index]), 4),
+                           adr=round(float(adr[index]), 2), revpar=round(float(revpar[index]), 2))
+                yield row
+
+
+def _period_starts(first, days, period):
+    """First day of the period each day falls in, as datetime64[D]"""
+    day = np.arange(first, first + days).astype("datetime64[D]")
+    if period == "day":
+        return day
+    if period == "month":
+        return day.astype("datetime64[M]").astype("datetime64[D]")
+    #1970-01-01 was a Thursday, so Monday based weekdays are (days + 3) % 7
+    return day - (day.astype(np.int64) + 3) % 7
+
+
+def compute_kpis(columns, start, end, period="day", by_room_type=False, rooms=None):
+    """
+    KPIs for the nights from start up to (not including) end.
+
+    Args:
+        columns (BookingColumns): Bookings to count
+        start (str): First night "YYYY-MM-DD"
+        end (str): Day after the last night "YYYY-MM-DD"
+        period (str): "day", "week" or "month"
+        by_room_type (bool): Split every period by room type
+        rooms (list): Room catalog for the rooms available each night, defaults to models.default_rooms()
+
+    Returns:
+        KPIs: The result
+
+    Raises:
+        ValueError: Bad dates or period
+    """
+    first, last = _range(start, end, period)
+    days = last - first
+    rooms = rooms if rooms is not None else default_rooms()
+    room_types = list(columns.room_types)
+    catalog_types, _ = _catalog(rooms)
+    for name in catalog_types:
+        if name not in room_types:
+            room_types.append(name)
+    types = len(room_types)
+
+    #Expand every stay into its nights: stay i contributes nights check_in[i] .. check_out[i]-1
+    check_in = np.maximum(columns.check_in, first)
+    check_out = np.minimum(columns.check_out, last)
+    keep = check_out > check_in
+    check_in, check_out = check_in[keep], check_out[keep]
+    nights = (check_out - check_in).astype(np.int64)
+    stay = np.repeat(np.arange(len(nights)), nights)
+    offset = np.arange(len(stay)) - np.repeat(np.cumsum(nights) - nights, nights)
+    day = check_in[stay] - first + offset
+    cell = day * types + columns.room_type[keep][stay]
+    sold = np.bincount(cell, minlength=days * types).reshape(days, types)
+    revenue = np.bincount(cell, weights=columns.rate[keep][stay], minlength=days * types).reshape(days, types)
+    return _roll_up(first, period, by_room_type, rooms, room_types, sold, revenue)
+
+
+def _range(start, end, period):
+    """Check the arguments, returning the first and last day numbers"""
+    if period not in PERIODS:
+        raise ValueError(f"period must be one of {', '.join(PERIODS)}")
+    first, last = _day(start, {}), _day(end, {})
+    if first < 0 or last <= first:
+        raise ValueError("start and end must be YYYY-MM-DD dates with end after start")
+    return first, last
+
+
+def _roll_up(first, period, by_room_type, rooms, room_types, sold, revenue):
+    """KPIs from [day, room type] nights sold and revenue"""
+    days, types = sold.shape
+    counts = {name: 0 for name in room_types}
+    for room in rooms:
+        counts[room.room_type] += 1
+    available = np.broadcast_to(np.array([counts[name] for name in room_types], dtype=np.int64), (days, types))
+
+    starts, group = np.unique(_period_starts(first, days, period), return_inverse=True)
+    rolled = []
+    for values in (available, sold, revenue):
+        total = np.zeros((len(starts), types), dtype=values.dtype)
+        np.add.at(total, group, values)
+        rolled.append(total if by_room_type else total.sum(axis=1))
+    return KPIs(period, starts, room_types if by_room_type else None, *rolled)
+
+
+def rollup_kpis(start, end, period="day", by_room_type=False, rooms=None):
+    """
+    KPIs for the nights from start up to (not including) end, from the daily rollups.
+
+    Reads one rollup row per day and room type, however many bookings there
+    are. Room types come from the bookings as stored.
+
+    Args:
+        start (str): First night "YYYY-MM-DD"
+        end (str): Day after the last night "YYYY-MM-DD"
+        period (str): "day", "week" or "month"
+        by_room_type (bool): Split every period by room type
+        rooms (list): Room catalog for the rooms available each night, defaults to models.default_rooms()
+
+    Returns:
+        KPIs: The result
+
+    Raises:
+        ValueError: Bad dates or period
+    """
+    first, last = _range(start, end, period)
+    rooms = rooms if rooms is not None else default_rooms()
+    room_types, _ = _catalog(rooms)
+    rows = rollups.daily(start, end)
+    for row in rows:
+        if row["room_type"] not in room_types:
+            room_types.append(row["room_type"])
+    type_index = {name: i for i, name in enumerate(room_types)}
+    sold = np.zeros((last - first, len(room_types)), dtype=np.int64)
+    revenue = np.zeros((last - first, len(room_types)))
+    for row in rows:
+        cell = (_day(row["date"], {}) - first, type_index[row["room_type"]])
+        sold[cell] = row["sold"]
+        revenue[cell] = row["revenue"]
+    return _roll_up(first, period, by_room_type, rooms, room_types, sold, revenue)
+
+
+def hotel_kpis(start, end, period="day", by_room_type=False, rooms=None):
+    """
+    KPIs for the bookings in storage, read from the daily rollups (see rollup_kpis).
+
+    Args:
+        start (str): First night "YYYY-MM-DD"
+        end (str): Day after the last night "YYYY-MM-DD"
+        period (str): "day", "week" or "month"
+        by_room_type (bool): Split every period by room type
+        rooms (list): Room catalog, defaults to models.default_rooms() (the app's rooms)
+
+    Returns:
+        KPIs: The result
+    """
+    return rollup_kpis(start, end, period, by_room_type, rooms)
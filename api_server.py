@@ -0,0 +1,251 @@
+"""
+Hotel Booking System - HTTP JSON API
+
+A small threaded HTTP server so front desk clients and kiosks can all talk
+to one warm process instead of each running the app. It uses the same
+operations as the command line tool (resources/cli.py), which sit on
+room_logic.get_available_rooms and createReservation_logic, and every
+request thread shares the process's one booking index (storage.get_index),
+so a request never re-reads the booking files unless another process wrote
+to them.
+
+Endpoints (JSON in, JSON out):
+    GET    /health
+    GET    /rooms?check_in=&check_out=&guests=&beds=&amenity=   availability search
+    POST   /reservations                                       create (Idempotency-Key header honoured)
+    GET    /reservations/<conf>                                look up one reservation
+    GET    /reservations?email=...  or  ?phone=...             a guest's reservations
+    PUT    /reservations/<conf>                                modify (new dates, room or guest details)
+    DELETE /reservations/<conf>                                cancel
+    GET    /report?start=&end=                                 counts and revenue
+
+The "#" at the start of a confirmation number can be left off or sent as
+%23. Errors come back as {"error": ...} with 400 (bad input), 404 (not
+found), 409 (room taken, with "conflicts" and "alternatives") or 500
+(anything unexpected, the connection stays usable).
+
+Run from the project folder:
+    python api_server.py --port 8080 --no-email
+
+Functions:
+    start_server: Run the API on a background thread in this process
+    main: Command line entry point
+
+Classes:
+    APIServer: A running in-process server
+"""
+
+import argparse
+import json
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlsplit
+
+import storage
+from storage import BookingConflictError
+from utils import find_booking, find_bookings_by_guest
+from resources import cli
+
+DEFAULT_PORT = 8080
+#Largest request body accepted
+MAX_BODY_BYTES = 1024 * 1024
+
+
+class _APIError(Exception):
+    def __init__(self, status, message, **extra):
+        super().__init__(message)
+        self.status = status
+        self.body = {"error": message, **extra}
+
+
+def _conf_number(raw):
+    conf_num = unquote(raw)
+    return conf_num if conf_num.startswith("#") else "#" + conf_num
+
+
+class _Handler(BaseHTTPRequestHandler):
+    """One HTTP request; keep-alive is on so clients can reuse connections"""
+
+    protocol_version = "HTTP/1.1"
+    server_version = "HotelAPI/1.0"
+    #Headers and body go out in separate writes, Nagle would hold the body back ~40ms per response
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def send_json(self, status, body):
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def read_json(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        if length > MAX_BODY_BYTES:
+            raise _APIError(413, "Request body too large")
+        if not length:
+            return {}
+        try:
+            body = json.loads(self.rfile.read(length))
+        except ValueError:
+            raise _APIError(400, "Request body is not JSON")
+        if not isinstance(body, dict):
+            raise _APIError(400, "Request body must be a JSON object")
+        return body
+
+    def handle_method(self, method):
+        url = urlsplit(self.path)
+        parts = [part for part in url.path.split("/") if part]
+        query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        try:
+            #Read the body first, so an error reply never leaves it on the kept-alive connection
+            body = self.read_json() if method in ("POST", "PUT") else {}
+            status, result = self.route(method, parts, query, body, parse_qs(url.query))
+        except _APIError as e:
+            status, result = e.status, e.body
+        except BookingConflictError as e:
+            status, result = 409, {"error": str(e), "conflicts": e.conflicts,
+                                   "alternatives": [room.room_id for room in e.alternatives]}
+        except (ValueError, KeyError) as e:
+            status, result = 400, {"error": str(e)}
+        except LookupError as e:
+            status, result = 404, {"error": str(e)}
+        except Exception as e:
+            print(f"Error handling {method} {self.path}: {e!r}", file=sys.stderr)
+            status, result = 500, {"error": "Internal server error"}
+        self.send_json(status, result)
+
+    def route(self, method, parts, query, body, multi):
+        """Dispatch to the operation for this method and path, returning (status, result)"""
+        params = dict(body, no_email=self.server.no_email)
+        if self.headers.get("Idempotency-Key"):
+            params["idempotency_key"] = self.headers["Idempotency-Key"]
+        if parts == ["health"] and method == "GET":
+            return 200, {"status": "ok", "bookings": len(storage.get_index().by_conf)}
+        if parts == ["rooms"] and method == "GET":
+            params.update(query, amenities=multi.get("amenity", []))
+            return 200, cli.search(params)
+        if parts == ["report"] and method == "GET":
+            params.update(query)
+            return 200, cli.report(params)
+        if parts == ["reservations"]:
+            if method == "POST":
+                return 201, cli.book(params)
+            if method == "GET":
+                if not query.get("email") and not query.get("phone"):
+                    raise _APIError(400, "Give an email or phone to look up")
+                return 200, {"reservations": find_bookings_by_guest(query.get("email"), query.get("phone"))}
+        if len(parts) == 2 and parts[0] == "reservations":
+            params["confirmation_number"] = _conf_number(parts[1])
+            if method == "GET":
+                reservation = find_booking(params["confirmation_number"])
+                if reservation is None:
+                    raise LookupError(f"No reservation {params['confirmation_number']}")
+                return 200, {"reservation": reservation}
+            if method == "PUT":
+                return 200, cli.modify(params)
+            if method == "DELETE":
+                result = cli.cancel(params)
+                if not result["cancelled"][params["confirmation_number"]]:
+                    raise LookupError(f"No confirmed reservation {params['confirmation_number']}")
+                return 200, result
+            raise _APIError(405, f"{method} not allowed here")
+        raise _APIError(404, f"No endpoint {method} /{'/'.join(parts)}")
+
+    def do_GET(self):
+        self.handle_method("GET")
+
+    def do_POST(self):
+        self.handle_method("POST")
+
+    def do_PUT(self):
+        self.handle_method("PUT")
+
+    def do_DELETE(self):
+        self.handle_method("DELETE")
+
+
+class _APIHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+    #Kiosks reconnecting all at once shouldn't be refused
+    request_queue_size = 128
+
+    def __init__(self, address, no_email=False, verbose=False):
+        self.no_email = no_email
+        self.verbose = verbose
+        super().__init__(address, _Handler)
+
+
+class APIServer:
+    """
+    The API running on a background thread.
+
+    Attributes:
+        host (str): Address it listens on
+        port (int): Port it listens on
+    """
+
+    def __init__(self, host="127.0.0.1", port=0, no_email=False, verbose=False):
+        self._server = _APIHTTPServer((host, port), no_email, verbose)
+        self.host, self.port = self._server.server_address[:2]
+        self._thread = threading.Thread(target=self._server.serve_forever, name="api-server", daemon=True)
+        self._thread.start()
+
+    @property
+    def url(self):
+        """Base URL, e.g. http://127.0.0.1:8080"""
+        return f"http://{self.host}:{self.port}"
+
+    def stop(self):
+        """Stop listening and close the socket"""
+        self._server.shutdown()
+        self._server.server_close()
+        self._thread.join()
+
+
+def start_server(host="127.0.0.1", port=0, no_email=False, verbose=False):
+    """
+    Start the API in this process, with the booking index already loaded.
+
+    Args:
+        host (str): Address to listen on
+        port (int): Port, 0 picks a free one
+        no_email (bool): Don't send guest emails
+        verbose (bool): Log every request to stderr
+
+    Returns:
+        APIServer: The running server, call stop() when done
+    """
+    storage.get_index()
+    return APIServer(host, port, no_email, verbose)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Hotel booking HTTP JSON API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--no-email", action="store_true", help="Don't send guest emails")
+    parser.add_argument("--verbose", action="store_true", help="Log every request")
+    args = parser.parse_args()
+
+    #Build the index before taking requests so the first caller doesn't pay for it
+    storage.get_index()
+    server = _APIHTTPServer((args.host, args.port), args.no_email, args.verbose)
+    print(f"Hotel API listening on http://{args.host}:{server.server_address[1]}", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -8,19 +8,27 @@ Class:
     HotelBookingApp: Main software/project controller
 """
 import os
+import threading
+import uuid
 import tkinter as tk
 from tkinter import ttk, messagebox, scrolledtext
 from datetime import datetime, timedelta
 from PIL import Image, ImageTk, ImageDraw
 
 # Import from other modules
-from models import Room
+from models import Room, default_rooms, AMENITIES
 from utils import validate_date, generate_conf_number, load_bookings, find_booking, save_booking
 # from storage import load_bookings, find_booking
-from utils import load_bookings, find_booking
+from utils import load_bookings, find_booking, find_bookings_by_guest
 from createReservation_logic import create_reservation, modify_reservation, cancel_reservation
-from room_logic import get_available_rooms
+from room_logic import get_available_rooms, shared_segment
 from email_service import send_email
+from storage import start_archiver, room_versions, BookingConflictError
+from holds import hold_manager
+from email_retry import start_retry_worker
+from report_jobs import start_report_job, format_report
+from report_export import export_bookings, available_formats
+from pricing import quote_stays
 
 class BestHotelBookingGroup:
     """
@@ -39,6 +47,8 @@ class BestHotelBookingGroup:
         email_sender (str): Email address for notifications
         email_password (str): Email password fro SMTP
         current_frame (tk.frame): Currently displayed frame
+        archiver_stop (threading.Event): Set to stop the background booking archiver
+        retry_stop (threading.Event): Set to stop the background email retry worker
 
     How Main.py calls this class to run program:
         >>> root = tk.Tk()
@@ -60,20 +70,7 @@ class BestHotelBookingGroup:
         screen_width = root.winfo_screenwidth()
         root.geometry(f"{screen_width}x{screen_height}+0+0")
 
-        self.rooms = [
-            Room("R000", "Single", 1, 1, 100.0, ["None"]),
-            Room("R001", "Double", 1, 1, 150.0, ["None"]),
-            Room("R002", "Suite", 1, 1, 300.0, ["None"]),
-            Room("R003", "Single", 1, 1, 110.0, ["\U0001F4F6 WiFi - $10 "]),
-            Room("R004", "Double", 1, 1, 125.0, ["\U0001F321 Air Conditoning - $25"]),
-            Room("R005", "Suite", 4, 2, 538.0, ["\U0001F6C1 Bathtub - $38"]),
-            Room("R006", "Suite", 4, 2, 552.0, ["\U0001F37A Mini-Fridge - $52"]),
-            Room("R007", "Single", 1, 1, 135.0, ["\U0001F4F6 WiFi - $10 ", "\U0001F321 Air Conditoning - $25"]),
-            Room("R008", "Double", 2, 1, 223.0, ["\U0001F4F6 WiFi - $10 ", "\U0001F321 Air Conditoning - $25", "\U0001F6C1 Bathtub - $38"]),
-            Room("R009", "Suite", 4, 2, 340.0, ["\U0001F6C1 Bathtub - $38", "\U0001F37A Mini-Fridge - $52"]),
-            Room("R0010", "Suite", 4, 2, 323.0, ["\U0001F4F6 WiFi - $10 ", "\U0001F321 Air Conditoning - $25", "\U0001F6C1 Bathtub - $38"]),
-            Room("R0011", "Suite", 4, 2, 375.0, ["\U0001F4F6 WiFi - $10 ", "\U0001F321 Air Conditoning - $25", "\U0001F6C1 Bathtub - $38", "\U0001F37A Mini-Fridge - $52"])
-        ]
+        self.rooms = default_rooms()
 
         #Admin credentials for report access
         self.admin_user = "admin"
@@ -86,6 +83,11 @@ class BestHotelBookingGroup:
         #Track current frame for clearing
         self.current_frame = None
 
+        #Move stays that are over into the compressed archive in the background
+        self.archiver_stop = start_archiver()
+        #Emails that failed to send are retried from the outbox folder in the background
+        self.retry_stop = start_retry_worker()
+
         #Show homepage
         self.show_homepage()
 
@@ -120,6 +122,7 @@ class BestHotelBookingGroup:
     def search(self,conf_entry,method):
             """
             Checks if Reservation Exists
+            Also accepts the guest's email or phone number if they lost their confirmation number
             Passes user to corresponding method
             Example:
                 if cancelling
@@ -130,8 +133,28 @@ class BestHotelBookingGroup:
             conf = conf_entry.get()
             booking = find_booking(conf)
             if not booking:
-                messagebox.showerror("ERROR", "Reservation Not Found")
-                return
+                #Guest may have typed their email or phone instead of the confirmation number,
+                #only look in the index that matches what was typed
+                text = conf.strip()
+                if text.startswith("#") and len(text) == 9:
+                    matches = []
+                elif "@" in text:
+                    matches = find_bookings_by_guest(email=text)
+                else:
+                    matches = find_bookings_by_guest(phone=text)
+                matches = [b for b in matches if b.get('status') == 'CONFIRMED']
+                if len(matches) == 1:
+                    booking = matches[0]
+                    conf = booking['confirmation_number']
+                elif matches:
+                    messagebox.showinfo("Multiple Reservations",
+                                        "Reservations found for this guest:\n" +
+                                        "\n".join(f"{b['confirmation_number']} ({b['check_in']} to {b['check_out']})" for b in matches) +
+                                        "\n\nPlease enter one of these confirmation numbers.")
+                    return
+                else:
+                    messagebox.showerror("ERROR", "Reservation Not Found")
+                    return
             method(conf, booking)
 
     def show_homepage(self):
@@ -306,10 +329,10 @@ class BestHotelBookingGroup:
         #Amenities checkbox selection, we need to add more later guys
         tk.Label(self.current_frame, text="Amenities:", font = ("Times New Roman", 12, "bold"), bg=("lemon chiffon"), pady=10).pack()
         amenity_check={}
-        for amenity in ["\U0001F4F6 WiFi - $10 ", "\U0001F321 Air Conditoning - $25", "\U0001F6C1 Bathtub - $38", "\U0001F37A Mini-Fridge - $52"]:
+        for amenity in AMENITIES.values():
             var = tk.BooleanVar()
-            tk.Checkbutton(self.current_frame,text=amenity, bg=("lemon chiffon"), variable=var).pack(anchor="center",padx=20)
-            amenity_check[amenity] = var
+            tk.Checkbutton(self.current_frame,text=amenity.display, bg=("lemon chiffon"), variable=var).pack(anchor="center",padx=20)
+            amenity_check[amenity.amenity_id] = var
 
         def search():
             "Search Button - validate user selections then if valid go on to step 2"
@@ -330,8 +353,12 @@ class BestHotelBookingGroup:
             # Get Selected Amenities
             amenities = [a for a, v in amenity_check.items() if v.get()]
 
+            # Remember each room's version before searching so confirming later can tell if it was booked in between
+            versions = room_versions([r.room_id for r in self.rooms])
+
             # Get available rooms based on filters
-            available = get_available_rooms(self.rooms, check_in, check_out, int(guests_var.get()), int(beds_var.get()), amenities)
+            available = get_available_rooms(self.rooms, check_in, check_out, int(guests_var.get()), int(beds_var.get()), amenities,
+                                            segment=shared_segment())
             
             # Check if any rooms available
             if not available:
@@ -345,7 +372,8 @@ class BestHotelBookingGroup:
             prefs={
                 "check_in":check_in,
                 "check_out":check_out,
-                "nights": (validate_date(check_out) - validate_date(check_in)).days
+                "nights": (validate_date(check_out) - validate_date(check_in)).days,
+                "room_versions": versions
             }
             self.room_GUI(available, prefs)
 
@@ -370,6 +398,14 @@ class BestHotelBookingGroup:
             available_rooms (list): List of Available Room Objects
             prefs (dict): Preferences from step 1
         """   
+        #Room, amenities and taxes for every room in one go (nights * price without rate rules or tax),
+        #worked out before the screen changes so a bad date or rate rule leaves the user where they were
+        try:
+            quote = quote_stays(available_rooms, prefs['check_in'], prefs['check_out'])
+        except ValueError as e:
+            messagebox.showerror("ERROR", f"Could not price these dates: {e}")
+            return
+
         #Update screen with new menu display
         self.updateScreen(bColor="lemon chiffon",xSize=0,ySize=0)
 
@@ -395,10 +431,12 @@ class BestHotelBookingGroup:
         canvas.pack(side="left", fill="both", expand=True)
         scrollbar.pack(side="right",fill="y")
 
+        totals = {}
+
         # Display All Available Rooms
-        for room in available_rooms:
-            #Calculate Total Price
-            total = prefs['nights'] * room.price
+        for i, room in enumerate(available_rooms):
+            breakdown = quote.breakdown(i)
+            total = totals[room.room_id] = breakdown["total"]
             amenity_str = ",".join(room.amenities)
             #Create Room Display Box
             room_box = tk.Frame(scroll_frame, bg="white", relief="ridge", bd=2)
@@ -409,7 +447,9 @@ class BestHotelBookingGroup:
             #Room Details
             details_text = (f"Beds: {room.num_beds} | "
                             f"Amenities: {amenity_str}\n"
-                            f"Total for {prefs['nights']} night(s): ${total:.2f}")
+                            f"Total for {prefs['nights']} night(s): ${total:.2f} "
+                            f"(room ${breakdown['room']:.2f} + amenities ${breakdown['amenities']:.2f}"
+                            f" + taxes ${breakdown['taxes']:.2f})")
             tk.Label(room_box, text=details_text, font=("Times New Roman", 12, "bold"), bg="white",
                      fg="#023553").pack(anchor="w", padx=30)
         
@@ -423,11 +463,20 @@ class BestHotelBookingGroup:
             #Get Selected Room
             selected_room = next((r for r in available_rooms if r.room_id == room_var.get()), None)
 
+            #Hold the room while the guest fills in their details, dropping any hold from an earlier pick
+            if prefs.get("hold_id"):
+                hold_manager.release(prefs.pop("hold_id"))
+            hold_id = hold_manager.place(selected_room.room_id, prefs['check_in'], prefs['check_out'])
+            if hold_id is None:
+                messagebox.showerror("Room Taken", "Another guest is booking this room right now.\nPlease choose a different room.")
+                return
+            prefs["hold_id"] = hold_id
+
             #Create Booking Info and proceed to step 3
             booking_info = {
                 "prefs" : prefs,
                 "room": selected_room,
-                "total": prefs['nights'] * selected_room.price
+                "total": totals[selected_room.room_id]
             }
             self.guest_Details(booking_info)
 
@@ -512,6 +561,9 @@ class BestHotelBookingGroup:
         card_entry = tk.Entry(self.current_frame,width=20)
         card_entry.pack()
 
+        #Same key for every click on this screen, so a double click or retry can't book twice
+        idempotency_key = uuid.uuid4().hex
+
         def confirm():
             """Confirm Reservation and Send User Confirmation Email"""
             #Validate All Fields Filled
@@ -532,14 +584,32 @@ class BestHotelBookingGroup:
                 'card': card
             }
 
-            booking = create_reservation(guest_info, room, prefs, self.email_sender, self.email_password)
+            try:
+                booking = create_reservation(guest_info, room, prefs, self.email_sender, self.email_password, rooms=self.rooms,
+                                             idempotency_key=idempotency_key)
+            except BookingConflictError as e:
+                #Someone else booked this room while the guest was filling in the form
+                hold_manager.release(prefs.pop("hold_id", None))
+                if not e.alternatives:
+                    messagebox.showerror("Room Taken", "Sorry, this room was just booked and nothing else is free for these dates.")
+                    self.preferences()
+                    return
+                messagebox.showerror("Room Taken", "Sorry, this room was just booked by another guest.\nPlease choose one of the rooms still available.")
+                prefs["room_versions"] = room_versions([r.room_id for r in self.rooms])
+                self.room_GUI(e.alternatives, prefs)
+                return
 
             #Show Confirmation Screen
             self.show_confirmation(booking, room, prefs)
 
+        def back():
+            """Let go of the room hold and go back to room selection"""
+            hold_manager.release(prefs.pop("hold_id", None))
+            self.room_GUI([room], prefs)
+
         #Buttons
         self.createButton(buttonText="Confirm Reservation",color="#023553",toDo=confirm,space=15,size=12)
-        self.createButton(buttonText="Back",color="gray",toDo=lambda: self.room_GUI([room], prefs),space=0,size=11)
+        self.createButton(buttonText="Back",color="gray",toDo=back,space=0,size=11)
         
     def show_confirmation(self, booking, room, prefs):
         """
@@ -741,7 +811,13 @@ class BestHotelBookingGroup:
                 'nights': nights
             }
 
-            modify_reservation(old_conf, new_guest_info, new_prefs, room, self.email_sender, self.email_password)
+            try:
+                modify_reservation(old_conf, new_guest_info, new_prefs, room, self.email_sender, self.email_password, rooms=self.rooms,
+                                   idempotency_key=f"{old_conf}:{check_in}:{check_out}")
+            except BookingConflictError as e:
+                others = ", ".join(f"{r.room_type} ({r.room_id})" for r in e.alternatives) or "none"
+                messagebox.showerror("ERROR", f"Your room is already booked for those dates.\nRooms still free: {others}\nYour original reservation was kept.")
+                return
             messagebox.showinfo("SUCCESS", "Reservation Updated! An Email confirmation has been sent to you for your records. Enjoy your stay!")
             self.show_homepage()
 
@@ -826,7 +902,7 @@ class BestHotelBookingGroup:
 
         def cancel():
             """Cancel Reservation: cancels the users reservation"""
-            cancel_reservation(conf_num, booking, self.email_sender, self.email_password)
+            cancel_reservation(conf_num, booking, self.email_sender, self.email_password, idempotency_key=conf_num)
             messagebox.showinfo("SUCCESS", "Reservation Cancelled! An Email confirmation has been sent to you for your records. We hope to see you again soon!")
             self.show_homepage()
 
@@ -921,62 +997,64 @@ class BestHotelBookingGroup:
             
             If admin selects custom verifies dates are appropiate values
             """
-            bookings = load_bookings()
+            start = end = None
             if report_type.get() == "custom":
-                start = validate_date(start_entry.get())
-                end = validate_date(end_entry.get())
-                if not start or not end:
+                if not validate_date(start_entry.get()) or not validate_date(end_entry.get()):
                     messagebox.showerror("ERROR", "Invalid Dates")
                     return
-                bookings = [b for b in bookings
-                            if start <= validate_date(b['check_in']) <= end]
-
-            self.show_report(bookings)
+                start, end = start_entry.get(), end_entry.get()
+            self.show_report_progress(start, end)
 
         # Buttons
         self.createButton(buttonText="Generate",color="green",toDo=generate,space=20,size=12)
         self.createButton(buttonText="Back",color="gray",toDo=self.show_homepage,space=0,size=12)
 
-    def show_report(self, bookings):
+    def show_report_progress(self, start, end):
         """
-        Displays Hotel Report for admin: allows admin to save report or
-        go back to homepage(main menu)
+        Displays a progress screen while the report is built by the worker processes
+
+        Args:
+            start (str): First check-in date to include, None for all reservations
+            end (str): Last check-in date to include, None for all reservations
         """
-        # Update screen with new menu display
         self.updateScreen(bColor="lemon chiffon",xSize=0,ySize=0)
-        tk.Label(self.current_frame, text="Hotel Reservation Report", font=("Georgia", 22, "bold"), bg = "lemon chiffon").pack(pady=10)
-        # Calculate Statistics
-        total_revenue = sum(b.get('total_price', 0) for b in bookings
-                            if b.get('status') == 'CONFIRMED')
-        confirmed = sum(1 for b in bookings if b.get('status') == 'CONFIRMED')
-        cancelled = sum(1 for b in bookings if b.get('status') == 'CANCELLED')
-        # Create Report Text
-        report = f"""Hotel Reservation Report
-{'='*50}
+        tk.Label(self.current_frame, text="Generating Report...", font=("Georgia", 22, "bold"), bg = "lemon chiffon").pack(pady=20)
+        progress = ttk.Progressbar(self.current_frame, length=300, mode="determinate")
+        progress.pack(pady=10)
 
-Generated: {datetime.now().strftime('%Y-%m-%d %H:%M')}
+        def on_progress(done, total):
+            progress["maximum"] = total
+            progress["value"] = done
 
-SUMMARY:
-Total Reservations: {len(bookings)}
-Confirmed Reservations: {confirmed}
-Cancelled Reservations: {cancelled}
-Total Revenue: ${total_revenue:.2f}
-Average Value: ${total_revenue/confirmed if confirmed > 0 else 0:.2f}
+        def on_error(error):
+            messagebox.showerror("ERROR", f"Could not build the report: {error}")
+            self.show_report_options()
 
-{'='*50}
-DETAILS:
-"""
-        for b in bookings: 
-            report += f"""   
-Confirmation #: {b.get('confirmation_number')}
-Guest: {b.get('guest_name')}
-Email: {b.get('guest_email')}
-Room: {b.get('room_type')}
-Check-In Date: {b.get('check_in')}
-Check-Out Date: {b.get('check_out')}
-Total: ${b.get('total_price')}
-Status: {b.get('status')}
-{'-'*50}"""
+        #The shards are aggregated in other processes, the GUI just checks in on them
+        job = start_report_job(self.root, lambda report_data: self.show_report(report_data, start, end), on_progress,
+                               start=start, end=end, on_error=on_error)
+
+        def back():
+            job.cancel()
+            self.show_report_options()
+
+        self.createButton(buttonText="Back",color="gray",toDo=back,space=20,size=12)
+
+    def show_report(self, report_data, start=None, end=None):
+        """
+        Displays Hotel Report for admin: allows admin to save report, export
+        the report's bookings as CSV/columnar files, or go back to homepage(main menu)
+
+        Args:
+            report_data (dict): Finished report from report_jobs
+            start (str): First check-in date the report covers, None for all reservations
+            end (str): Last check-in date the report covers, None for all reservations
+        """
+        # Update screen with new menu display
+        self.updateScreen(bColor="lemon chiffon",xSize=0,ySize=0)
+        tk.Label(self.current_frame, text="Hotel Reservation Report", font=("Georgia", 22, "bold"), bg = "lemon chiffon").pack(pady=10)
+        # Create Report Text
+        report = format_report(report_data)
             
         # Display in Scrolled Text
         text_area = scrolledtext.ScrolledText(self.current_frame, width=80,height=20,font=("Courier",9))
@@ -993,7 +1071,33 @@ Status: {b.get('status')}
                 messagebox.showinfo("SUCCESS", f"Saved: {filename}")
             except:
                 messagebox.showerror("ERROR", "Could Not Save Report")
-            
+
+        def export(format):
+            """Exports the report's bookings on a background thread so big histories don't freeze the screen"""
+            filename = f"report_{datetime.now().strftime('%y%m%d_%H%M%S')}.{format}"
+            outcome = {}
+
+            def run():
+                try:
+                    outcome["count"] = export_bookings(filename, format, start, end)
+                except (ValueError, OSError) as e:
+                    outcome["error"] = e
+
+            worker = threading.Thread(target=run, name="report-export", daemon=True)
+            worker.start()
+
+            def poll():
+                if worker.is_alive():
+                    self.root.after(100, poll)
+                elif "error" in outcome:
+                    messagebox.showerror("ERROR", f"Could Not Export Report: {outcome['error']}")
+                else:
+                    messagebox.showinfo("SUCCESS", f"Exported {outcome['count']} reservations: {filename}")
+            self.root.after(100, poll)
+
         # Buttons
         self.createButton(buttonText="Save Report",color="green",toDo=save,space=10,size=12)
+        labels = {"csv": "Export CSV", "npz": "Export NumPy Columns", "arrow": "Export Arrow"}
+        for format in available_formats():
+            self.createButton(buttonText=labels[format],color="#023553",toDo=lambda format=format: export(format),space=5,size=12)
         self.createButton(buttonText="Back",color="gray",toDo=self.show_homepage,space=0,size=12)
@@ -0,0 +1,358 @@
+"""
+Hotel Booking System - Async Reservation Service
+
+An asyncio front for the reservation logic, so one event loop can juggle
+thousands of booking requests (e.g. from an async web server) without a
+thread per request:
+
+- the storage work of each call (availability check, journal commit) runs
+  in a small thread pool through loop.run_in_executor
+- calls touching the same room wait on an asyncio.Lock for that room, so
+  they queue up on the loop instead of racing each other to the commit
+  and failing the compare-and-set; different rooms still go in parallel
+- guest emails go out over a pool of reused async SMTP sessions, paced by
+  the same token bucket as email_dispatcher, and never hold a room lock
+
+The SMTP client here is deliberately small: EHLO, AUTH PLAIN, MAIL, RCPT,
+DATA and QUIT over asyncio streams, with implicit TLS when
+email_service.SMTP_SSL is on. Messages that can't be sent are parked in
+the email retry queue like everywhere else.
+
+Example:
+    >>> service = ReservationService(sender_email, sender_password)
+    >>> reservation = await service.create_reservation(guest_info, room, preferences)
+    >>> await service.close()
+
+Classes:
+    AsyncSMTP: One asynchronous SMTP session
+    AsyncMailer: Pool of AsyncSMTP sessions with rate limiting
+    ReservationService: Async create/modify/cancel/search over the sync logic
+"""
+
+import asyncio
+import base64
+import contextlib
+import re
+import smtplib
+import socket
+import ssl
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+import email_service
+from email_dispatcher import TokenBucket, DEFAULT_RATE, DEFAULT_BURST, DEFAULT_WORKERS
+from email_retry import park
+from email_templates import get_template
+from models import default_rooms
+from room_logic import get_available_rooms
+from utils import find_booking
+from idempotency import idempotency_store
+import createReservation_logic
+from createReservation_logic import _confirmation_context, _cancellation_context, _email_context
+
+#Threads running storage calls; commits serialize on the storage lock anyway
+DEFAULT_STORAGE_THREADS = 4
+SMTP_TIMEOUT = 30.0
+
+
+def _cancel(conf_num, reservation):
+    """Cancel in storage and build the email context in one trip to the pool, None if not found"""
+    if not createReservation_logic.cancel_reservation(conf_num, reservation, "", ""):
+        return None
+    return _cancellation_context(conf_num, reservation)
+
+
+class AsyncSMTP:
+    """
+    One SMTP session over asyncio streams.
+
+    Errors are raised as the same smtplib exceptions the blocking code
+    handles (SMTPAuthenticationError, SMTPResponseException, ...).
+    """
+
+    def __init__(self, host, port, use_ssl, timeout=SMTP_TIMEOUT):
+        """
+        Args:
+            host (str): Mail relay host
+            port (int): Mail relay port
+            use_ssl (bool): Implicit TLS (port 465 style)
+            timeout (float): Seconds to wait for any one reply
+        """
+        self.host, self.port, self.use_ssl, self.timeout = host, port, use_ssl, timeout
+        self._reader = self._writer = None
+
+    async def _reply(self):
+        """Read one (possibly multi-line) reply, returning (code, text)"""
+        lines = []
+        while True:
+            line = await asyncio.wait_for(self._reader.readline(), self.timeout)
+            if not line:
+                raise smtplib.SMTPServerDisconnected("Connection unexpectedly closed")
+            lines.append(line[4:].strip().decode("utf-8", "replace"))
+            if line[3:4] != b"-":
+                return int(line[:3]), "\n".join(lines)
+
+    async def _command(self, line, *expected):
+        self._writer.write(line.encode("utf-8") + b"\r\n")
+        await self._writer.drain()
+        code, text = await self._reply()
+        if code not in expected:
+            raise smtplib.SMTPResponseException(code, text)
+        return code, text
+
+    async def connect(self):
+        """Open the connection and say EHLO"""
+        context = ssl.create_default_context() if self.use_ssl else None
+        self._reader, self._writer = await asyncio.wait_for(
+            asyncio.open_connection(self.host, self.port, ssl=context), self.timeout)
+        code, text = await self._reply()
+        if code != 220:
+            raise smtplib.SMTPConnectError(code, text)
+        await self._command(f"EHLO {socket.getfqdn()}", 250)
+
+    async def login(self, user, password):
+        """Log in with AUTH PLAIN"""
+        token = base64.b64encode(f"\0{user}\0{password}".encode("utf-8")).decode("ascii")
+        try:
+            await self._command(f"AUTH PLAIN {token}", 235)
+        except smtplib.SMTPResponseException as e:
+            raise smtplib.SMTPAuthenticationError(e.smtp_code, e.smtp_error)
+
+    async def sendmail(self, sender, recipients, raw_message):
+        """
+        Send one already encoded message.
+
+        Args:
+            sender (str): Envelope sender
+            recipients (list): Envelope recipients
+            raw_message (bytes): Message with CRLF line endings
+        """
+        await self._command(f"MAIL FROM:<{sender}>", 250)
+        for recipient in recipients:
+            await self._command(f"RCPT TO:<{recipient}>", 250, 251)
+        await self._command("DATA", 354)
+        #Dot-stuffing, a line starting with "." would otherwise end the message early
+        data = re.sub(rb"(?m)^\.", b"..", raw_message)
+        if not data.endswith(b"\r\n"):
+            data += b"\r\n"
+        self._writer.write(data + b".\r\n")
+        await self._writer.drain()
+        code, text = await self._reply()
+        if code != 250:
+            raise smtplib.SMTPDataError(code, text)
+
+    async def quit(self):
+        """Say QUIT and close, ignoring a relay that already hung up"""
+        if self._writer is None:
+            return
+        try:
+            await self._command("QUIT", 221)
+        except (smtplib.SMTPException, OSError, asyncio.TimeoutError):
+            pass
+        self._writer.close()
+        try:
+            await self._writer.wait_closed()
+        except OSError:
+            pass
+
+
+class AsyncMailer:
+    """
+    Sends messages over a few reused AsyncSMTP sessions.
+
+    Attributes:
+        sessions (int): Most sessions open at once
+        bucket (TokenBucket): Pacing shared by every send
+    """
+
+    def __init__(self, sessions=DEFAULT_WORKERS, rate=DEFAULT_RATE, burst=DEFAULT_BURST):
+        """
+        Args:
+            sessions (int): Most concurrent SMTP sessions
+            rate (float): Messages per second
+            burst (int): Messages that may go out back to back
+        """
+        self.sessions = sessions
+        self.bucket = TokenBucket(rate, burst)
+        self._slots = asyncio.Semaphore(sessions)
+        #(sender, password) -> logged in sessions nobody is using right now
+        self._idle = {}
+
+    async def _open(self, sender_email, sender_password):
+        session = AsyncSMTP(email_service.SMTP_HOST, email_service.SMTP_PORT, email_service.SMTP_SSL)
+        await session.connect()
+        await session.login(sender_email, sender_password)
+        return session
+
+    async def send(self, sender_email, sender_password, recipient_email, raw_message):
+        """
+        Send one message, parking it for a retry if it can't go out.
+
+        Returns:
+            bool: True if it was sent
+        """
+        key = (sender_email, sender_password)
+        async with self._slots:
+            wait = self.bucket.reserve()
+            if wait > 0:
+                await asyncio.sleep(wait)
+            idle = self._idle.setdefault(key, [])
+            session = idle.pop() if idle else None
+            error = None
+            for attempt in range(2):
+                try:
+                    if session is None:
+                        session = await self._open(sender_email, sender_password)
+                    await session.sendmail(sender_email, [recipient_email], raw_message)
+                    idle.append(session)
+                    return True
+                except smtplib.SMTPAuthenticationError as e:
+                    error = e
+                    break
+                except (smtplib.SMTPServerDisconnected, ConnectionError, asyncio.IncompleteReadError) as e:
+                    #The relay dropped an idle session, log in again once
+                    error, session = e, None
+                except (smtplib.SMTPException, OSError, asyncio.TimeoutError) as e:
+                    error = e
+                    break
+            if session is not None:
+                await session.quit()
+        print(f"Failed to send email to {recipient_email}: {error}")
+        await asyncio.get_running_loop().run_in_executor(
+            None, partial(park, sender_email, recipient_email, raw_message, error))
+        return False
+
+    async def close(self):
+        """Log out every idle session"""
+        idle, self._idle = self._idle, {}
+        for sessions in idle.values():
+            for session in sessions:
+                await session.quit()
+
+
+class ReservationService:
+    """
+    Async create/modify/cancel/search over createReservation_logic.
+
+    Create one per event loop; the locks and mailer belong to the loop
+    they were first used on.
+
+    Attributes:
+        rooms (list): Room catalog used for lookups and alternatives
+        mailer (AsyncMailer): Sends the guest emails
+    """
+
+    def __init__(self, sender_email="", sender_password="", rooms=None, executor=None, mailer=None):
+        """
+        Args:
+            sender_email (str): Hotel email address, empty to skip the emails
+            sender_password (str): Hotel email app password
+            rooms (list): Room catalog, defaults to models.default_rooms()
+            executor (Executor): Runs the blocking storage calls, defaults to a small thread pool
+            mailer (AsyncMailer): Email sender, one is made on first use
+        """
+        self.sender_email = sender_email
+        self.sender_password = sender_password
+        self.rooms = rooms if rooms is not None else default_rooms()
+        self._executor = executor or ThreadPoolExecutor(DEFAULT_STORAGE_THREADS, thread_name_prefix="booking-io")
+        self._own_executor = executor is None
+        self.mailer = mailer
+        self._room_locks = {}
+
+    def _room_lock(self, room_id):
+        lock = self._room_locks.get(room_id)
+        if lock is None:
+            lock = self._room_locks[room_id] = asyncio.Lock()
+        return lock
+
+    async def _run(self, func, *args, **kwargs):
+        return await asyncio.get_running_loop().run_in_executor(self._executor, partial(func, *args, **kwargs))
+
+    async def _email(self, template, recipient_email, context):
+        if not self.sender_email:
+            return
+        if self.mailer is None:
+            self.mailer = AsyncMailer()
+        raw_message = get_template(template).render_message(self.sender_email, recipient_email, context)
+        await self.mailer.send(self.sender_email, self.sender_password, recipient_email, raw_message)
+
+    async def search(self, check_in, check_out, num_guests, num_beds, amenities=()):
+        """
+        Rooms free for some dates, see room_logic.get_available_rooms.
+
+        Returns:
+            list: Available Room objects
+        """
+        return await self._run(get_available_rooms, self.rooms, check_in, check_out, num_guests, num_beds,
+                               list(amenities))
+
+    async def create_reservation(self, guest_info, room, preferences, idempotency_key=None):
+        """
+        Create a reservation and email the guest, see createReservation_logic.create_reservation.
+
+        Args:
+            guest_info (dict): name, email, phone
+            room (Room): Room to book
+            preferences (dict): check_in, check_out, nights, optional room_versions and hold_id
+            idempotency_key (str): Optional key, a retry returns the first reservation without a second email
+
+        Returns:
+            dict: The saved reservation
+
+        Raises:
+            BookingConflictError: The room was taken or is held
+        """
+        if idempotency_key is not None:
+            #The lookup reads (and may compact) the key file, so it runs in the pool too
+            found, reservation = await self._run(idempotency_store.get, f"create:{idempotency_key}")
+            if found:
+                return reservation
+        async with self._room_lock(room.room_id):
+            reservation = await self._run(createReservation_logic.create_reservation, guest_info, room, preferences,
+                                          "", "", self.rooms, idempotency_key=idempotency_key)
+        await self._email("confirmation", guest_info['email'], _confirmation_context(reservation, room))
+        return reservation
+
+    async def modify_reservation(self, old_conf_num, new_guest_info, new_preferences, room, idempotency_key=None):
+        """
+        Move a reservation, see createReservation_logic.modify_reservation.
+
+        Both the old and the new room are locked (in room id order, so two
+        swaps going opposite ways can't deadlock).
+
+        Returns:
+            dict: The new reservation, or None if the old one wasn't found
+        """
+        old = await self._run(find_booking, old_conf_num)
+        if old is None:
+            return None
+        async with contextlib.AsyncExitStack() as stack:
+            for room_id in sorted({old['room_id'], room.room_id}):
+                await stack.enter_async_context(self._room_lock(room_id))
+            reservation = await self._run(createReservation_logic.modify_reservation, old_conf_num,
+                                          new_guest_info, new_preferences, room, "", "", self.rooms,
+                                          idempotency_key=idempotency_key)
+        if reservation is not None:
+            await self._email("modification", new_guest_info['email'],
+                              _email_context(reservation, old_confirmation_number=old_conf_num))
+        return reservation
+
+    async def cancel_reservation(self, conf_num, reservation):
+        """
+        Cancel a reservation and email the guest, see createReservation_logic.cancel_reservation.
+
+        Returns:
+            bool: True if it was found and cancelled
+        """
+        async with self._room_lock(reservation['room_id']):
+            context = await self._run(_cancel, conf_num, reservation)
+        if context is not None:
+            await self._email("cancellation", reservation['guest_email'], context)
+        return context is not None
+
+    async def close(self):
+        """Log out of the mail relay and stop the storage threads"""
+        if self.mailer is not None:
+            await self.mailer.close()
+        if self._own_executor:
+            self._executor.shutdown(wait=True)
@@ -0,0 +1,128 @@
+"""
+Load generator for the HTTP JSON API.
+
+Starts api_server in this process against a temporary bookings folder
+(or targets a running server with --url), then has --clients threads each
+keep one HTTP connection open and loop over a mix of requests for
+--seconds:
+    - search: GET /rooms for a random stay
+    - book: POST /reservations for a random room and stay (409s are expected)
+    - lookup: GET /reservations/<conf> for a booking made earlier
+For each kind it prints requests/second and latency percentiles.
+
+Run from the project folder:
+    python benchmarks/bench_api.py --clients 8 --seconds 10
+"""
+
+import argparse
+import http.client
+import json
+import os
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from datetime import date, timedelta
+from urllib.parse import quote, urlsplit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import api_server
+import storage
+from models import default_rooms
+
+#Share of requests of each kind
+MIX = [("search", 0.6), ("book", 0.2), ("lookup", 0.2)]
+
+
+def random_stay(rng):
+    check_in = date(2026, 1, 1) + timedelta(days=rng.randrange(365))
+    return str(check_in), str(check_in + timedelta(days=rng.randint(1, 5)))
+
+
+def client(host, port, seconds, seed, results, booked):
+    """One front desk: a kept-alive connection sending the request mix until time is up"""
+    rng = random.Random(seed)
+    rooms = [room.room_id for room in default_rooms()]
+    kinds, weights = zip(*MIX)
+    connection = http.client.HTTPConnection(host, port, timeout=30)
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        kind = rng.choices(kinds, weights)[0]
+        if kind == "lookup" and not booked:
+            kind = "search"
+        check_in, check_out = random_stay(rng)
+        if kind == "search":
+            method, path, body = "GET", f"/rooms?check_in={check_in}&check_out={check_out}&guests=1", None
+        elif kind == "book":
+            method, path = "POST", "/reservations"
+            body = json.dumps({"room_id": rng.choice(rooms), "check_in": check_in, "check_out": check_out,
+                               "name": f"Guest {seed}", "email": f"guest{seed}@example.com", "phone": "5551234567"})
+        else:
+            method, path, body = "GET", "/reservations/" + quote(rng.choice(booked)), None
+        started = time.perf_counter()
+        connection.request(method, path, body, {"Content-Type": "application/json"})
+        response = connection.getresponse()
+        data = response.read()
+        results[kind].append(time.perf_counter() - started)
+        if response.status >= 500:
+            raise RuntimeError(f"{method} {path} failed: {response.status} {data[:200]}")
+        if kind == "book" and response.status == 201:
+            booked.append(json.loads(data)["reservation"]["confirmation_number"])
+    connection.close()
+
+
+def report(kind, latencies, elapsed):
+    if not latencies:
+        return
+    latencies = sorted(latencies)
+    p50 = statistics.median(latencies) * 1000
+    p95 = latencies[int(len(latencies) * 0.95) - 1] * 1000
+    print(f"{kind:<8} {len(latencies):7d} req {len(latencies) / elapsed:9.1f} req/s   "
+          f"p50 {p50:7.2f} ms   p95 {p95:7.2f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--clients", type=int, default=8, help="Concurrent connections")
+    parser.add_argument("--seconds", type=float, default=10.0, help="How long to run")
+    parser.add_argument("--url", help="Benchmark a server that is already running instead")
+    args = parser.parse_args()
+
+    workdir = None
+    if args.url:
+        url = urlsplit(args.url)
+        host, port, server = url.hostname, url.port or 80, None
+    else:
+        workdir = tempfile.mkdtemp(prefix="bench_api_")
+        storage.BOOKINGS_DIR = workdir
+        server = api_server.start_server(no_email=True)
+        host, port = server.host, server.port
+
+    results = {kind: [] for kind, _ in MIX}
+    booked = []
+    threads = [threading.Thread(target=client, args=(host, port, args.seconds, i, results, booked))
+               for i in range(args.clients)]
+    print(f"{args.clients} clients for {args.seconds:g}s against http://{host}:{port}")
+    started = time.perf_counter()
+    try:
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+        for kind, _ in MIX:
+            report(kind, results[kind], elapsed)
+        report("total", [l for kind in results for l in results[kind]], elapsed)
+        print(f"{len(booked)} reservations made")
+    finally:
+        if server is not None:
+            server.stop()
+            shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+"""
+Email throughput benchmark against the local SMTP sink.
+
+Starts smtp_sink (in this process, or as a subprocess with --subprocess),
+points email_service at it and sends the same batch of rendered
+confirmation emails three ways:
+    - send_email: the one-call-per-message path (connect, login, send, quit)
+    - pooled: one logged-in session reused for every message
+    - dispatcher: EmailDispatcher worker pool (rate limit lifted for the run)
+For each it prints messages/second and per-message latency percentiles.
+
+Run from the project folder:
+    python benchmarks/bench_email.py --count 1000 --workers 4 --tls
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import email_retry
+import email_service
+import smtp_sink
+from email_dispatcher import EmailDispatcher
+from email_templates import get_template
+
+SENDER = "hotel@example.com"
+PASSWORD = "sink-accepts-anything"
+
+
+def build_messages(count):
+    """Render count confirmation emails, as (recipient, subject, body, encoded) tuples"""
+    template = get_template("confirmation")
+    messages = []
+    for i in range(count):
+        context = {"guest_name": f"Guest {i}", "confirmation_number": f"#BENCH{i:05d}", "room_type": "Double",
+                   "check_in": "2026-01-03", "check_out": "2026-01-05", "nights": 2, "price": 150.0,
+                   "total_price": "300.00", "amenities": "WiFi, AC"}
+        recipient = f"guest{i}@example{i % 7}.com"
+        subject, body = template.render(context)
+        messages.append((recipient, subject, body, template.render_message(SENDER, recipient, context)))
+    return messages
+
+
+class _TimedSession:
+    """Wraps an SMTP session and records how long each sendmail takes"""
+
+    def __init__(self, server, latencies):
+        self._server = server
+        self._latencies = latencies
+
+    def sendmail(self, *args):
+        started = time.perf_counter()
+        self._server.sendmail(*args)
+        self._latencies.append(time.perf_counter() - started)
+
+    def quit(self):
+        self._server.quit()
+
+
+def run_send_email(messages, latencies):
+    for recipient, subject, body, _ in messages:
+        started = time.perf_counter()
+        if not email_service.send_email(SENDER, PASSWORD, recipient, subject, body):
+            raise RuntimeError("send_email failed, is the sink running?")
+        latencies.append(time.perf_counter() - started)
+
+
+def run_pooled(messages, latencies):
+    session = _TimedSession(email_service._connect(SENDER, PASSWORD), latencies)
+    for recipient, _, _, raw in messages:
+        session.sendmail(SENDER, [recipient], raw)
+    session.quit()
+
+
+def run_dispatcher(messages, latencies, workers):
+    dispatcher = EmailDispatcher(lambda s, p: _TimedSession(email_service._connect(s, p), latencies),
+                                 rate=1e9, burst=1e9, workers=workers)
+    sent, failed = dispatcher.dispatch((SENDER, PASSWORD, recipient, raw) for recipient, _, _, raw in messages)
+    dispatcher.close()
+    if failed:
+        raise RuntimeError(f"{len(failed)} messages failed")
+
+
+def report(label, count, elapsed, latencies):
+    latencies = sorted(latencies)
+    p50 = statistics.median(latencies) * 1000
+    p95 = latencies[int(len(latencies) * 0.95) - 1] * 1000
+    print(f"{label:<12} {count / elapsed:9.1f} msg/s   p50 {p50:7.2f} ms   p95 {p95:7.2f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--count", type=int, default=500, help="Messages per mode")
+    parser.add_argument("--workers", type=int, default=4, help="Dispatcher sessions")
+    parser.add_argument("--tls", action="store_true", help="Use implicit TLS with a self-signed certificate")
+    parser.add_argument("--subprocess", action="store_true", help="Run the sink in its own process")
+    parser.add_argument("--port", type=int, default=2526, help="Sink port with --subprocess")
+    parser.add_argument("--save", action="store_true", help="Have the sink write every message to disk")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="bench_email_")
+    email_retry.RETRY_DIR = os.path.join(workdir, "outbox")
+    certfile = keyfile = None
+    if args.tls:
+        certfile, keyfile = smtp_sink.make_self_signed_cert(workdir)
+    out_dir = os.path.join(workdir, "mail") if args.save else None
+
+    if args.subprocess:
+        sink = smtp_sink.spawn_sink(args.port, out_dir or os.path.join(workdir, "mail"), certfile, keyfile)
+        port = args.port
+    else:
+        sink = smtp_sink.start_sink(out_dir=out_dir, certfile=certfile, keyfile=keyfile)
+        port = sink.port
+    email_service.SMTP_HOST, email_service.SMTP_PORT, email_service.SMTP_SSL = "127.0.0.1", port, args.tls
+
+    messages = build_messages(args.count)
+    modes = [("send_email", lambda l: run_send_email(messages, l)),
+             ("pooled", lambda l: run_pooled(messages, l)),
+             ("dispatcher", lambda l: run_dispatcher(messages, l, args.workers))]
+    print(f"{args.count} messages, {'TLS' if args.tls else 'plain'} sink "
+          f"{'subprocess' if args.subprocess else 'in-process'}")
+    try:
+        for label, run in modes:
+            latencies = []
+            started = time.perf_counter()
+            #send_email and _connect print a line per message
+            with contextlib.redirect_stdout(io.StringIO()):
+                run(latencies)
+            report(label, args.count, time.perf_counter() - started, latencies)
+    finally:
+        if args.subprocess:
+            sink.terminate()
+            sink.wait()
+        else:
+            sink.stop()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
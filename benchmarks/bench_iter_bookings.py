@@ -0,0 +1,101 @@
+"""
+Memory benchmark for streaming bookings out of storage.
+
+Writes a synthetic booking history of the requested size into a temporary
+bookings folder, then measures time and peak Python heap (tracemalloc) for:
+    - find_booking on the last record written (usually a long scan)
+    - a report style date range filter through iter_bookings
+    - load_bookings, only with --compare-load since it holds everything in memory
+
+Run from the project folder:
+    python benchmarks/bench_iter_bookings.py --size-mb 2048
+"""
+
+import argparse
+import os
+import random
+import resource
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import storage
+
+
+def generate_history(size_mb, seed=7):
+    """Fill storage.BOOKINGS_DIR with JSONL partitions until size_mb is reached"""
+    rng = random.Random(seed)
+    target = size_mb * 1024 * 1024
+    written = 0
+    count = 0
+    first_day = date(2015, 1, 1)
+    handles = {}
+    try:
+        while written < target:
+            check_in = first_day + timedelta(days=rng.randrange(365 * 10))
+            nights = rng.randint(1, 7)
+            conf = f"#S{count:010d}"
+            line = ('{"confirmation_number": "%s", "room_id": "R%03d", "guest_name": "Guest %d", '
+                    '"guest_email": "guest%d@example.com", "guest_phone": "555%07d", "room_type": "Suite", '
+                    '"check_in": "%s", "check_out": "%s", "nights": %d, "total_price": %.1f, "status": "%s"}\n'
+                    % (conf, rng.randrange(12), count, count, count, check_in.isoformat(),
+                       (check_in + timedelta(days=nights)).isoformat(), nights, nights * 150.0,
+                       "CANCELLED" if rng.random() < 0.1 else "CONFIRMED"))
+            key = check_in.strftime("%Y-%m")
+            if key not in handles:
+                handles[key] = open(os.path.join(storage.BOOKINGS_DIR, key + ".jsonl"), "a")
+            handles[key].write(line)
+            written += len(line)
+            count += 1
+    finally:
+        for handle in handles.values():
+            handle.close()
+    return count, conf
+
+
+def measure(label, func):
+    """Run func and print its wall time and peak traced heap"""
+    tracemalloc.start()
+    started = time.perf_counter()
+    result = func()
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{label:<28} {elapsed:8.2f}s  peak heap {peak / 1024 / 1024:9.2f} MB  -> {result}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--size-mb", type=int, default=2048, help="Size of the synthetic history")
+    parser.add_argument("--dir", help="Folder to generate into (default: a temp folder)")
+    parser.add_argument("--compare-load", action="store_true", help="Also time load_bookings")
+    args = parser.parse_args()
+
+    storage.BOOKINGS_DIR = args.dir or tempfile.mkdtemp(prefix="bench_bookings_")
+    os.makedirs(storage.BOOKINGS_DIR, exist_ok=True)
+    try:
+        started = time.perf_counter()
+        count, last_conf = generate_history(args.size_mb)
+        print(f"Generated {count} bookings ({args.size_mb} MB) in {time.perf_counter() - started:.1f}s")
+
+        measure("find_booking (last written)", lambda: storage.find_booking(last_conf) is not None)
+        measure("iter_bookings (one month)", lambda: sum(
+            1 for _ in storage.iter_bookings(lambda b: b['check_in'].startswith("2020-06"),
+                                             start="2020-06-01", end="2020-06-30")))
+        measure("iter_bookings (full scan)", lambda: sum(
+            1 for _ in storage.iter_bookings(lambda b: b['status'] == "CANCELLED")))
+        if args.compare_load:
+            measure("load_bookings", lambda: len(storage.load_bookings()))
+        print(f"Max RSS: {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:.1f} MB")
+    finally:
+        if not args.dir:
+            shutil.rmtree(storage.BOOKINGS_DIR, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,258 @@
+"""
+Hotel Booking System - Binary Booking Segment
+
+Optional read-only copy of the booking history in a fixed-width binary
+format for fast availability checks. The file is memory-mapped and exposed
+to NumPy with np.frombuffer, so nothing is parsed or copied when it is
+opened and every GUI/report process reading it shares the same page cache.
+
+Build it with "python resources/cli.py segment". After that the GUI room
+search and the CLI/API search (through room_logic.shared_segment) answer
+availability from it for as long as it is current; once a booking is
+written, or a partition is added, removed or archived, the hot partitions
+no longer match the segment, and searches go back to the booking index
+until it is built again.
+
+File layout (little endian):
+    header     magic, record count, room count, heap offset, signature offset
+    rooms      one uint32 heap offset per room id
+    records    RECORD_DTYPE rows (16 bytes each)
+    heap       length-prefixed UTF-8 strings (room ids, confirmation numbers)
+    signature  JSON {partition key: mtime (ns)} of the hot partitions, to the end of the file
+
+Functions:
+    write_segment: Build a segment file from the partitioned storage
+    open_segment: Memory-map a segment file
+    shared_segment: The process's mapping of the default segment, if it is current
+
+Classes:
+    BookingSegment: Zero-copy view over a segment file
+"""
+
+import json
+import mmap
+import os
+import struct
+from datetime import datetime
+
+import numpy as np
+
+import storage
+
+SEGMENT_FILE = "bookings.seg"
+MAGIC = b"BHBSEG02"
+#magic, record count, room count, heap offset, signature offset
+HEADER = struct.Struct("<8sIIQQ")
+RECORD_DTYPE = np.dtype([
+    ("room", "<u2"),
+    ("check_in", "<i4"),
+    ("check_out", "<i4"),
+    ("status", "u1"),
+    ("flags", "u1"),
+    ("heap", "<u4"),
+])
+STATUS_CODES = {"CONFIRMED": 0, "CANCELLED": 1}
+STATUS_OTHER = 255
+
+
+def segment_path():
+    """Default segment location, next to the partitions"""
+    return os.path.join(storage.BOOKINGS_DIR, SEGMENT_FILE)
+
+
+def _source_signature():
+    """Modification time of every hot partition the segment is built from, by partition key"""
+    return {key: storage._mtime(storage._hot_path(key)) for key in storage.hot_partitions()}
+
+
+def _ordinal(date_string):
+    try:
+        return datetime.strptime(date_string, "%Y-%m-%d").toordinal()
+    except (TypeError, ValueError):
+        return 0
+
+
+def write_segment(path=None, include_cold=False):
+    """
+    Build a segment file from storage.
+
+    The file is written next to the target and swapped in with os.replace,
+    so processes that still have the old one mapped keep a valid view.
+
+    Args:
+        path (str): Where to write, defaults to bookings/bookings.seg
+        include_cold (bool): Also include the archive (availability doesn't need it)
+
+    Returns:
+        int: Number of records written
+    """
+    path = path or segment_path()
+    signature = _source_signature()
+    heap = bytearray()
+
+    def intern(text):
+        offset = len(heap)
+        data = (text or "").encode("utf-8")
+        heap.extend(struct.pack("<H", len(data)))
+        heap.extend(data)
+        return offset
+
+    room_index = {}
+    rows = []
+    for booking in storage.iter_bookings(include_cold=include_cold):
+        room_id = booking.get('room_id') or ""
+        if room_id not in room_index:
+            room_index[room_id] = len(room_index)
+        rows.append((room_index[room_id], _ordinal(booking.get('check_in')), _ordinal(booking.get('check_out')),
+                     STATUS_CODES.get(booking.get('status'), STATUS_OTHER), 0,
+                     intern(booking.get('confirmation_number'))))
+    room_offsets = np.array([intern(room_id) for room_id in room_index], dtype="<u4")
+    records = np.array(rows, dtype=RECORD_DTYPE)
+
+    heap_offset = HEADER.size + room_offsets.nbytes + records.nbytes
+    signature_offset = heap_offset + len(heap)
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, len(records), len(room_offsets), heap_offset, signature_offset))
+        f.write(room_offsets.tobytes())
+        f.write(records.tobytes())
+        f.write(heap)
+        f.write(json.dumps(signature, sort_keys=True).encode("utf-8"))
+    os.replace(tmp_path, path)
+    return len(records)
+
+
+class BookingSegment:
+    """
+    Zero-copy view over a memory-mapped segment file.
+
+    Attributes:
+        records (np.ndarray): RECORD_DTYPE rows backed by the mapping
+        room_ids (list): Room id for each room index
+        source_signature (dict): Partition key -> mtime the segment was built from
+    """
+
+    def __init__(self, path):
+        """
+        Map a segment file.
+
+        Args:
+            path (str): Segment file path
+
+        Raises:
+            ValueError: If the file is not a booking segment
+        """
+        self.path = path
+        with open(path, "rb") as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, count, room_count, self._heap_offset, signature_offset = HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC:
+            self._map.close()
+            raise ValueError(f"{path} is not a booking segment")
+        self.source_signature = json.loads(bytes(self._map[signature_offset:]).decode("utf-8"))
+        room_offsets = np.frombuffer(self._map, dtype="<u4", count=room_count, offset=HEADER.size)
+        self.records = np.frombuffer(self._map, dtype=RECORD_DTYPE, count=count,
+                                     offset=HEADER.size + room_offsets.nbytes)
+        self.room_ids = [self._string(int(offset)) for offset in room_offsets]
+        self._room_index = {room_id: i for i, room_id in enumerate(self.room_ids)}
+
+    def _string(self, offset):
+        start = self._heap_offset + offset
+        (length,) = struct.unpack_from("<H", self._map, start)
+        return bytes(self._map[start + 2:start + 2 + length]).decode("utf-8")
+
+    def __len__(self):
+        return len(self.records)
+
+    def is_current(self):
+        """True if no hot partition was written, added, removed or archived since the segment was built"""
+        return self.source_signature == _source_signature()
+
+    def confirmation_number(self, row):
+        """Confirmation number of one record"""
+        return self._string(int(self.records["heap"][row]))
+
+    def _overlaps(self, check_in, check_out):
+        """Mask of CONFIRMED records overlapping the stay"""
+        start, end = _ordinal(check_in), _ordinal(check_out)
+        records = self.records
+        return ((records["status"] != STATUS_CODES["CANCELLED"])
+                & (records["check_in"] < end) & (records["check_out"] > start))
+
+    def is_room_available(self, room_id, check_in, check_out):
+        """
+        Check one room against the segment.
+
+        Args:
+            room_id (str): Room to check
+            check_in (str): Check-in date "YYYY-MM-DD"
+            check_out (str): Check-out date "YYYY-MM-DD"
+
+        Returns:
+            bool: True if no booking overlaps the stay
+        """
+        index = self._room_index.get(room_id)
+        if index is None:
+            return True
+        return not np.any(self._overlaps(check_in, check_out) & (self.records["room"] == index))
+
+    def booked_rooms(self, check_in, check_out):
+        """
+        Every room that has a booking overlapping the stay, in one pass.
+
+        Returns:
+            set: Room ids that are taken
+        """
+        taken = np.unique(self.records["room"][self._overlaps(check_in, check_out)])
+        return {self.room_ids[i] for i in taken}
+
+    def close(self):
+        """Release the mapping (drop references to records first)"""
+        self.records = None
+        self._map.close()
+
+
+def open_segment(path=None):
+    """
+    Map the segment file if there is one.
+
+    Args:
+        path (str): Segment file path, defaults to bookings/bookings.seg
+
+    Returns:
+        BookingSegment: The mapped segment, or None if the file doesn't exist
+    """
+    path = path or segment_path()
+    if not os.path.exists(path):
+        return None
+    return BookingSegment(path)
+
+
+_shared = None
+
+
+def shared_segment():
+    """
+    The process's mapping of the default segment file.
+
+    The file is mapped once and mapped again only when it is rebuilt, so
+    every search in the process shares one mapping.
+
+    Returns:
+        BookingSegment: The segment, or None if there is none or it is out of date
+    """
+    global _shared
+    path = segment_path()
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    identity = (path, stat.st_ino, stat.st_mtime_ns, stat.st_size)
+    if _shared is None or _shared[0] != identity:
+        try:
+            _shared = (identity, BookingSegment(path))
+        except (ValueError, struct.error):
+            return None
+    segment = _shared[1]
+    return segment if segment.is_current() else None
@@ -7,15 +7,33 @@ Functions:
     create_reservation: Create new reservation and send confirmation
     modify_reservation: Modify reservation and send notification
     cancel_reservation: Cancel reservation and send cancellation email
+    cancel_reservations: Cancel many reservations at once and queue the emails
+    cancel_reservations_where: Cancel every reservation for some rooms/dates
+    create_reservations_bulk: Import a batch of reservations in one commit
 """
+import bisect
+import secrets
+from contextlib import contextmanager
+from datetime import datetime
+
 #Files/methods from my teammates to make the program work
 from utils import generate_conf_number
-from utils import save_booking, find_booking, update_booking_status
+from utils import update_booking_status
+from utils import update_booking_statuses, update_statuses_where
+from utils import allocate_conf_numbers, validate_date
+
+from room_logic import get_available_rooms
+from storage import transaction, get_index, normalize_date, BookingConflictError
+from holds import hold_manager
+from idempotency import idempotent
+from pricing import quote_stay, refresh_occupancy
 
-from email_service import send_email
+from email_service import send_email, queue_message, flush_outbox
+from email_templates import get_template, render_batch
 
 #New reservation method/function when user selects that create new reservation button
-def create_reservation(guest_info, room, preferences, sender_email, sender_password):
+@idempotent("create")
+def create_reservation(guest_info, room, preferences, sender_email, sender_password, rooms=None):
     #David Guzman 11/21/2025
     """
     Create a new reservation and send confirmation email.
@@ -34,16 +52,26 @@ def create_reservation(guest_info, room, preferences, sender_email, sender_passw
             - 'check_in': Check-in date "YYYY-MM-DD"
             - 'check_out': Check-out date "YYYY-MM-DD"
             - 'nights': Number of nights (int)
-        sender_email (str): Hotel email address
+            - 'room_versions': Optional room versions taken at search time (storage.room_versions)
+            - 'hold_id': Optional hold placed on the room when it was selected, released once booked
+        sender_email (str): Hotel email address, empty to skip the email
         sender_password (str): Hotel email app password
+        rooms (list): All hotel rooms, used to suggest alternatives if this one got taken
+        idempotency_key (str): Optional key, a retried call with the same key gets this reservation back instead of booking again
         
     Returns:
         dict: Created reservation data including confirmation number
+
+    Raises:
+        BookingConflictError: Someone else booked or is holding the room, with alternatives filled in
     """
+    #Stored zero-padded, so "2026-1-4" can't slip past the string date comparisons
+    preferences = dict(preferences, check_in=normalize_date(preferences['check_in']),
+                       check_out=normalize_date(preferences['check_out']))
     #This will generate a unique confirmation number for each user that creates a reservation
     conf_num = generate_conf_number()
-    #This will calculate the total price for the reservation
-    total_price = preferences['nights'] * room.price
+    #This will calculate the total price for the reservation from the rate calendar (nights * room.price without rate rules)
+    total_price = quote_stay(room, preferences['check_in'], preferences['check_out'])
     #This will create a dictionary for the reservation with the details specifying that particular reservation....
     reservation = {
         "confirmation_number": conf_num,
@@ -56,35 +84,71 @@ def create_reservation(guest_info, room, preferences, sender_email, sender_passw
         "check_out": preferences['check_out'],
         "nights": preferences['nights'],
         "total_price": total_price,
-        "status": "CONFIRMED"}
-    #This will save the reservation reservation info to the storage
-    save_booking(reservation)
+        "status": "CONFIRMED",
+        "created_at": _now()}
+    #This will save the reservation reservation info to the storage, but only if nobody booked the room since the search
+    _reserve(reservation, room, rooms, preferences.get('room_versions', {}).get(room.room_id),
+             preferences.get('hold_id'))
     #The body of the email that the user is gonna receive; How the confirmation email looks basically
-    email_subject = "Reservation Confirmation - Best Hotel Booking"
-    email_body = f"""Dear {guest_info['name']},
+    email_subject, email_body = _confirmation_email(reservation, room)
+    #This will send out a confirmation email to the user that their reservation was made along with the unique confirmation #
+    if sender_email:
+        send_email(sender_email, sender_password, guest_info['email'], 
+                   email_subject, email_body)
+    return reservation
 
-Your reservation has been confirmed!
+def _now():
+    """Booking time stamped on new reservations, the forecast's pace curves are built from it"""
+    return datetime.now().isoformat(timespec="seconds")
 
-Confirmation Number: {conf_num}
-Room Type: {room.room_type}
-Check-in: {preferences['check_in']}
-Check-out: {preferences['check_out']}
-Number of Nights: {preferences['nights']}
-Nightly Rate: ${room.price}
-Total Price: ${total_price:.2f}
+def _email_context(reservation, **extra):
+    """Template placeholders for one reservation"""
+    context = dict(reservation)
+    context['total_price'] = f"{reservation['total_price']:.2f}"
+    context.update(extra)
+    return context
 
-Room Amenities: {', '.join(room.amenities)}
+def _confirmation_context(reservation, room):
+    return _email_context(reservation, price=room.price, amenities=', '.join(room.amenities))
 
-Thank you for reservation with us!
+def _confirmation_email(reservation, room):
+    """Build the subject and body of the confirmation email for one reservation"""
+    return get_template("confirmation").render(_confirmation_context(reservation, room))
+@contextmanager
+def _conflict_alternatives(room, preferences, rooms):
+    """Fill in BookingConflictError.alternatives with the rooms still free for those dates"""
+    try:
+        yield
+    except BookingConflictError as e:
+        if rooms:
+            free = get_available_rooms(rooms, preferences['check_in'], preferences['check_out'],
+                                       room.max_guests, room.num_beds, [])
+            e.alternatives = [r for r in free if r.room_id != room.room_id]
+        raise
 
-Best regards,
-Best Hotel Booking"""
-    #This will send out a confirmation email to the user that their reservation was made along with the unique confirmation #
-    send_email(sender_email, sender_password, guest_info['email'], 
-               email_subject, email_body)
-    return reservation
+def _check_holds(reservation, hold_id=None):
+    """Raise BookingConflictError if another guest is holding the room for these dates"""
+    held = hold_manager.conflicts(reservation['room_id'], reservation['check_in'], reservation['check_out'],
+                                  ignore=hold_id)
+    if held:
+        raise BookingConflictError(reservation['room_id'], reservation['check_in'], reservation['check_out'], held)
+
+def _renumber(bookings):
+    """Give new bookings fresh confirmation numbers when another process stored theirs first"""
+    for booking, conf_num in zip(bookings, allocate_conf_numbers(len(bookings))):
+        booking['confirmation_number'] = conf_num
+
+def _reserve(reservation, room, rooms, expected_version, hold_id=None):
+    """Commit one new reservation with the compare-and-set availability check"""
+    with _conflict_alternatives(room, reservation, rooms), transaction(_renumber) as tx:
+        _check_holds(reservation, hold_id)
+        tx.reserve(reservation, expected_version)
+    #The room is booked for real now, so the guest's hold isn't needed anymore
+    if hold_id:
+        hold_manager.release(hold_id)
 #The method/function that makes the reservation changes that the user inputs.
-def modify_reservation(old_conf_num, new_guest_info, new_preferences, room, sender_email, sender_password):
+@idempotent("modify")
+def modify_reservation(old_conf_num, new_guest_info, new_preferences, room, sender_email, sender_password, rooms=None):
     #David Guzman 11/21/2025
     """
     Modify an existing reservation and send notification email to the user. It also cancels the old reservation, creates new reservation with updated details, 
@@ -95,66 +159,64 @@ def modify_reservation(old_conf_num, new_guest_info, new_preferences, room, send
         new_guest_info (dict): Updated guest information
         new_preferences (dict): New reservation preferences
         room (Room): Room object
-        sender_email (str): Hotel email address
+        sender_email (str): Hotel email address, empty to skip the email
         sender_password (str): Hotel email app password
+        rooms (list): All hotel rooms, used to suggest alternatives if the new dates are taken
+        idempotency_key (str): Optional key, a retry with the same key returns the first result
         
     Returns:
         dict: New reservation data, or None if old reservation not found
+
+    Raises:
+        BookingConflictError: The room is taken or held for the new dates, the old reservation is left as it was
     """
-    #This will find an old reservation if it exists. If it doesn't exist it'll just return NOne.
-    old_reservation = find_booking(old_conf_num)
-    if not old_reservation:
-        print(f"ERROR: Old reservation {old_conf_num} not found")
-        return None
-    #This will update the status of that old reservation to 'Cancelled'
-    update_booking_status(old_conf_num, "CANCELLED")
-    #This will generate a new confirmation number on that reservation for the user.
-    new_conf_num = generate_conf_number()
-    #This will calculate the new total price, (hopefully they paid more than before)
-    new_total_price = new_preferences['nights'] * room.price
-    #This will create that new reservation with whatever additions/subtractions the user selected.
-    new_reservation = {
-        "confirmation_number": new_conf_num,
-        "room_id": room.room_id,
-        "guest_name": new_guest_info['name'],
-        "guest_email": new_guest_info['email'],
-        "guest_phone": new_guest_info['phone'],
-        "room_type": room.room_type,
-        "check_in": new_preferences['check_in'],
-        "check_out": new_preferences['check_out'],
-        "nights": new_preferences['nights'],
-        "total_price": new_total_price,
-        "status": "CONFIRMED"
-    }
-    
-    #This will then save that new reservation to the record for the report
-    save_booking(new_reservation)
+    new_preferences = dict(new_preferences, check_in=normalize_date(new_preferences['check_in']),
+                           check_out=normalize_date(new_preferences['check_out']))
+    #Everything below happens in one storage transaction: one read of each partition, one commit,
+    #and if anything fails the old reservation is left exactly as it was
+    with _conflict_alternatives(room, new_preferences, rooms), transaction(_renumber) as tx:
+        #This will find an old reservation if it exists. If it doesn't exist it'll just return NOne.
+        old_reservation = tx.find(old_conf_num)
+        if not old_reservation:
+            print(f"ERROR: Old reservation {old_conf_num} not found")
+            return None
+        #This will update the status of that old reservation to 'Cancelled'
+        tx.update_status(old_conf_num, "CANCELLED")
+        #This will generate a new confirmation number on that reservation for the user.
+        new_conf_num = generate_conf_number()
+        #This will calculate the new total price, (hopefully they paid more than before)
+        new_total_price = quote_stay(room, new_preferences['check_in'], new_preferences['check_out'])
+        #This will create that new reservation with whatever additions/subtractions the user selected.
+        new_reservation = {
+            "confirmation_number": new_conf_num,
+            "room_id": room.room_id,
+            "guest_name": new_guest_info['name'],
+            "guest_email": new_guest_info['email'],
+            "guest_phone": new_guest_info['phone'],
+            "room_type": room.room_type,
+            "check_in": new_preferences['check_in'],
+            "check_out": new_preferences['check_out'],
+            "nights": new_preferences['nights'],
+            "total_price": new_total_price,
+            "status": "CONFIRMED",
+            "created_at": _now()
+        }
+        
+        #This will then save that new reservation to the record for the report, checking nobody else has the room
+        _check_holds(new_reservation, new_preferences.get('hold_id'))
+        tx.reserve(new_reservation)
+    if new_preferences.get('hold_id'):
+        hold_manager.release(new_preferences['hold_id'])
     #The body of the email for that modified confirmation request from the user.
-    email_subject = "Reservation Modified - Best Hotel Booking"
-    email_body = f"""Dear {new_guest_info['name']},
-
-Your reservation has been successfully modified!
-
-Previous Confirmation Number: {old_conf_num}
-New Confirmation Number: {new_conf_num}
-
-Updated reservation Details:
-Check-in: {new_preferences['check_in']}
-Check-out: {new_preferences['check_out']}
-Number of Nights: {new_preferences['nights']}
-Total Price: ${new_total_price:.2f}
-
-The previous reservation has been cancelled.
-
-Thank you for reservation with us!
-
-Best regards,
-Best Hotel Booking"""
+    email_subject, email_body = get_template("modification").render(
+        _email_context(new_reservation, old_confirmation_number=old_conf_num))
     #This will lastly send out an email to the user for that modified reservation
-    send_email(sender_email, sender_password, new_guest_info['email'],
-               email_subject, email_body)
+    if sender_email:
+        send_email(sender_email, sender_password, new_guest_info['email'],
+                   email_subject, email_body)
     return new_reservation
 #The unfortunate method/function to cancel a reservation, maybe we should remove it so we don't lose money tho the user might sue us.                       
+@idempotent("cancel")
 def cancel_reservation(conf_num, reservation, sender_email, sender_password):
     """
     Cancel an existing reservation and send notification email.
@@ -164,36 +226,186 @@ def cancel_reservation(conf_num, reservation, sender_email, sender_password):
     Args:
         conf_num (str): Confirmation number to cancel
         reservation (dict): reservation data
-        sender_email (str): Hotel email address
+        sender_email (str): Hotel email address, empty to skip the email
         sender_password (str): Hotel email app password
+        idempotency_key (str): Optional key, a retry with the same key won't cancel or email again
         
     Returns:
         bool: True if successful, False if update failed
     """
     #Update the status of a reservation to 'Cancelled', user is too good for us apparently
     success = update_booking_status(conf_num, "CANCELLED")
-    if success:
-        #Generate cancellation confirmation number for user
-        cancel_conf_num = f"CANCEL-{generate_conf_number()}"
-        email_subject = "Reservation Cancelled - Best Hotel Booking"
-        email_body = f"""Dear {reservation['guest_name']},
+    if success and sender_email:
+        email_subject, email_body = _cancellation_email(conf_num, reservation)
+        #Send cancellation email to the user, we didn't want them anyway...
+        send_email(sender_email, sender_password, reservation['guest_email'],
+                   email_subject, email_body)
+    return success #yay
 
-Your reservation has been cancelled. We apologize for not being good enough for you!
+def _cancellation_context(conf_num, reservation):
+    #Generate cancellation confirmation number for user, only a reference for the email so it is never stored
+    return _email_context(reservation, confirmation_number=conf_num,
+                          cancel_confirmation_number=f"CANCEL-{secrets.token_hex(4).upper()}")
 
-Original Confirmation Number: {conf_num}
-Cancellation Confirmation Number: {cancel_conf_num}
+def _cancellation_email(conf_num, reservation):
+    """Build the subject and body of the cancellation email for one reservation"""
+    return get_template("cancellation").render(_cancellation_context(conf_num, reservation))
 
-Cancelled reservation Details:
-Room: {reservation['room_type']}
-Check-in: {reservation['check_in']}
-Check-out: {reservation['check_out']}
-Original Total: ${reservation['total_price']}
+#Batched version of cancel_reservation for things like closing a wing or a storm closure
+@idempotent("cancel-batch")
+def cancel_reservations(reservations, sender_email, sender_password):
+    """
+    Cancel many reservations at once and email every guest.
 
-Thank you for your understanding. We hope to see you again!
+    All the status changes are applied in one pass over storage, then the
+    cancellation emails are queued and sent together.
 
-Best regards,
-Best Hotel Booking"""
-        #Send cancellation email to the user, we didn't want them anyway...
-        send_email(sender_email, sender_password, reservation['guest_email'],
-                   email_subject, email_body)
-    return success #yay
\ No newline at end of file
+    Args:
+        reservations (dict): Confirmation number -> reservation data
+        sender_email (str): Hotel email address, empty to skip the emails
+        sender_password (str): Hotel email app password
+        idempotency_key (str): Optional key for scripts that might be re-run
+
+    Returns:
+        dict: Confirmation number -> True if cancelled, False if not found
+    """
+    results = update_booking_statuses({conf_num: "CANCELLED" for conf_num in reservations})
+    rows = ((reservations[conf_num]['guest_email'], _cancellation_context(conf_num, reservations[conf_num]))
+            for conf_num, success in results.items() if success)
+    if sender_email:
+        for recipient_email, raw_message in render_batch("cancellation", sender_email, rows):
+            queue_message(sender_email, sender_password, recipient_email, raw_message)
+        flush_outbox()
+    return results
+
+def cancel_reservations_where(sender_email, sender_password, room_ids=None, start=None, end=None):
+    """
+    Cancel every CONFIRMED reservation for some rooms over a date range.
+
+    Args:
+        sender_email (str): Hotel email address, empty to skip the emails
+        sender_password (str): Hotel email app password
+        room_ids (iterable): Rooms being closed, None means every room
+        start (str): First closed date "YYYY-MM-DD"
+        end (str): Date the rooms reopen "YYYY-MM-DD"
+
+    Returns:
+        dict: Confirmation number -> True for every reservation that was cancelled
+    """
+    cancelled = update_statuses_where("CANCELLED", room_ids=room_ids, start=start, end=end, status="CONFIRMED")
+    rows = ((reservation['guest_email'], _cancellation_context(reservation['confirmation_number'], reservation))
+            for reservation in cancelled)
+    if sender_email:
+        for recipient_email, raw_message in render_batch("cancellation", sender_email, rows):
+            queue_message(sender_email, sender_password, recipient_email, raw_message)
+        flush_outbox()
+    return {reservation['confirmation_number']: True for reservation in cancelled}
+
+def _booked_calendar(index, room_id):
+    """A room's stored stays as sorted check-ins plus the latest check-out up to each one"""
+    stays = sorted((check_in or "", check_out or "") for check_in, check_out in index.rooms.get(room_id, {}).values())
+    starts, latest = [], []
+    end = ""
+    for check_in, check_out in stays:
+        end = max(end, check_out)
+        starts.append(check_in)
+        latest.append(end)
+    return starts, latest
+
+#Group blocks and OTA feeds come in by the thousand, so they skip the one-at-a-time flow
+@idempotent("import")
+def create_reservations_bulk(records, rooms, sender_email=None, sender_password=None):
+    """
+    Import a batch of reservations with one availability pass and one commit.
+
+    Every record is checked against the booking index, room holds and the
+    records before it in the same batch (the first one in the feed wins a
+    clash), each in O(log n) with binary searches over sorted stays. The
+    accepted ones get confirmation numbers from one pre-allocated block and
+    are committed together in a single storage transaction, then the
+    confirmation emails are queued and sent in bulk.
+
+    Args:
+        records (iterable): Dicts with 'room_id', 'guest_name', 'guest_email',
+            'guest_phone', 'check_in', 'check_out' and optionally 'created_at' (see utils.read_booking_feed)
+        rooms (list): All hotel rooms, for room type and price
+        sender_email (str): Hotel email address, None to skip the emails
+        sender_password (str): Hotel email app password
+        idempotency_key (str): Optional key, re-running an import with the same key returns the first run's results
+
+    Returns:
+        tuple: (list of created reservations, list of (record, reason) pairs that were rejected)
+
+    Raises:
+        BookingConflictError: Another process booked one of the rooms during the import, nothing was saved
+    """
+    catalog = {room.room_id: room for room in rooms}
+    created, rejected = [], []
+    with transaction(_renumber) as tx:
+        index = get_index()
+        calendars = {}
+        #Feeds repeat the same few hundred dates over and over, so each is only parsed once
+        dates = {}
+        #Room id -> sorted (check_in, check_out) of the stays accepted from this batch so far
+        accepted = {}
+        #Occupancy can't change until the commit, so the rate calendar is brought up to date once
+        refresh_occupancy()
+        for record in records:
+            room = catalog.get(record.get('room_id'))
+            if room is None:
+                rejected.append((record, "unknown room"))
+                continue
+            check_in, check_out = record.get('check_in'), record.get('check_out')
+            for day in (check_in, check_out):
+                if day not in dates:
+                    dates[day] = validate_date(day)
+            check_in_date, check_out_date = dates[check_in], dates[check_out]
+            if check_in_date is None or check_out_date is None or check_out_date <= check_in_date:
+                rejected.append((record, "invalid dates"))
+                continue
+            check_in, check_out = check_in_date.strftime("%Y-%m-%d"), check_out_date.strftime("%Y-%m-%d")
+            if not record.get('guest_name') or not record.get('guest_email'):
+                rejected.append((record, "missing guest details"))
+                continue
+            if room.room_id not in calendars:
+                calendars[room.room_id] = _booked_calendar(index, room.room_id)
+            starts, latest = calendars[room.room_id]
+            i = bisect.bisect_left(starts, check_out)
+            if i and latest[i - 1] > check_in:
+                rejected.append((record, "room already booked"))
+                continue
+            if hold_manager.conflicts(room.room_id, check_in, check_out):
+                rejected.append((record, "room on hold"))
+                continue
+            taken = accepted.setdefault(room.room_id, [])
+            j = bisect.bisect_left(taken, (check_in, check_out))
+            if (j and taken[j - 1][1] > check_in) or (j < len(taken) and taken[j][0] < check_out):
+                rejected.append((record, "clashes with an earlier record in the batch"))
+                continue
+            taken.insert(j, (check_in, check_out))
+            nights = (check_out_date - check_in_date).days
+            created.append({
+                "confirmation_number": None,
+                "room_id": room.room_id,
+                "guest_name": record['guest_name'],
+                "guest_email": record['guest_email'],
+                "guest_phone": record.get('guest_phone', ""),
+                "room_type": room.room_type,
+                "check_in": check_in,
+                "check_out": check_out,
+                "nights": nights,
+                "total_price": quote_stay(room, check_in, check_out, refresh=False),
+                "status": "CONFIRMED",
+                #Feeds may carry when the guest booked with the OTA, otherwise it's booked now
+                "created_at": record.get('created_at') or _now()})
+        for reservation, conf_num in zip(created, allocate_conf_numbers(len(created))):
+            reservation['confirmation_number'] = conf_num
+            #Versions from this same index, so the commit only re-checks rooms someone else touched meanwhile
+            tx.reserve(reservation, index.room_versions.get(reservation['room_id'], 0))
+    if sender_email:
+        rows = ((reservation['guest_email'], _confirmation_context(reservation, catalog[reservation['room_id']]))
+                for reservation in created)
+        for recipient_email, raw_message in render_batch("confirmation", sender_email, rows):
+            queue_message(sender_email, sender_password, recipient_email, raw_message)
+        flush_outbox()
+    return created, rejected
\ No newline at end of file
@@ -0,0 +1,279 @@
+"""
+Hotel Booking System - Email Dispatcher
+
+Sends queued emails over a few long-lived SMTP sessions in parallel while
+staying under the relay's sending limit:
+
+- a token bucket paces every message to DEFAULT_RATE per second (with a
+  small burst), shared by all worker threads
+- each worker keeps its own logged-in session per sender and reuses it
+  until it has been idle for a while
+- pending mail is kept per recipient domain and the workers take domains
+  in round robin, so one big domain can't starve the others
+- at most max_pending messages wait in the dispatcher; submit() blocks
+  past that, which slows the producer down instead of growing memory
+
+Classes:
+    TokenBucket: Thread-safe token bucket rate limiter
+    EmailDispatcher: Worker pool that sends through the token bucket
+"""
+
+import smtplib
+import threading
+import time
+from collections import deque
+
+#Gmail allows roughly this many messages a second per account before throttling
+DEFAULT_RATE = 5.0
+DEFAULT_BURST = 10
+DEFAULT_WORKERS = 4
+DEFAULT_MAX_PENDING = 1000
+#Sessions unused for this long are logged out
+IDLE_SECONDS = 30.0
+
+
+class TokenBucket:
+    """
+    Token bucket: refills at rate tokens a second up to capacity.
+
+    Attributes:
+        rate (float): Tokens added per second
+        capacity (float): Most tokens the bucket holds (the burst size)
+    """
+
+    def __init__(self, rate, capacity=None, clock=time.monotonic, sleep=time.sleep):
+        """
+        Args:
+            rate (float): Tokens added per second
+            capacity (float): Burst size, defaults to one second worth of tokens
+            clock (callable): Time source, swappable for tests
+            sleep (callable): Sleep function, swappable for tests
+        """
+        self.rate = float(rate)
+        self.capacity = float(capacity if capacity is not None else max(1.0, rate))
+        self._tokens = self.capacity
+        self._clock = clock
+        self._sleep = sleep
+        self._updated = clock()
+        self._lock = threading.Lock()
+
+    def reserve(self, tokens=1):
+        """
+        Take tokens now without blocking.
+
+        Args:
+            tokens (int): Tokens to take
+
+        Returns:
+            float: Seconds the caller has to wait before using them (0 if available now)
+        """
+        with self._lock:
+            now = self._clock()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= tokens
+            return 0.0 if self._tokens >= 0 else -self._tokens / self.rate
+
+    def acquire(self, tokens=1):
+        """Block until tokens are available, then take them"""
+        wait = self.reserve(tokens)
+        if wait > 0:
+            self._sleep(wait)
+
+
+class _Batch:
+    """Progress of one dispatch() call"""
+
+    def __init__(self, size):
+        self.remaining = size
+        self.sent = 0
+        self.failed = []
+        self.bad_logins = set()
+        self.done = threading.Condition()
+
+    def finish(self, item, ok):
+        with self.done:
+            if ok:
+                self.sent += 1
+            else:
+                self.failed.append(item)
+            self.remaining -= 1
+            if self.remaining == 0:
+                self.done.notify_all()
+
+
+class EmailDispatcher:
+    """
+    Pool of SMTP worker threads fed from per-domain queues.
+
+    Messages are (sender, password, recipient, encoded message) tuples,
+    the same shape as email_service's outbox.
+
+    Attributes:
+        bucket (TokenBucket): Rate limiter shared by the workers
+        workers (int): Number of concurrent SMTP sessions
+        max_pending (int): Messages allowed to wait before submit() blocks
+    """
+
+    def __init__(self, connect, rate=DEFAULT_RATE, burst=DEFAULT_BURST, workers=DEFAULT_WORKERS,
+                 max_pending=DEFAULT_MAX_PENDING):
+        """
+        Args:
+            connect (callable): connect(sender, password) -> logged in smtplib.SMTP
+            rate (float): Messages per second across all workers
+            burst (int): Messages that may go out back to back
+            workers (int): Number of concurrent SMTP sessions
+            max_pending (int): Backpressure limit
+        """
+        self._connect = connect
+        self.bucket = TokenBucket(rate, burst)
+        self.workers = workers
+        self.max_pending = max_pending
+        self._domains = {}
+        self._turns = deque()
+        self._pending = 0
+        self._cond = threading.Condition()
+        self._threads = []
+        self._closed = False
+
+    def start(self):
+        """Start the worker threads (done automatically by submit)"""
+        with self._cond:
+            if self._threads:
+                return
+            self._closed = False
+            for i in range(self.workers):
+                thread = threading.Thread(target=self._work, name=f"email-worker-{i}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def submit(self, message, batch=None, timeout=None):
+        """
+        Hand one message to the workers, waiting while the dispatcher is full.
+
+        Args:
+            message (tuple): (sender, password, recipient, encoded message)
+            batch: Internal progress tracker from dispatch()
+            timeout (float): Longest to wait for room, None waits forever
+
+        Returns:
+            bool: False if there was still no room after timeout
+        """
+        self.start()
+        domain = message[2].rpartition("@")[2].lower()
+        with self._cond:
+            if not self._cond.wait_for(lambda: self._pending < self.max_pending, timeout):
+                return False
+            queue = self._domains.get(domain)
+            if queue is None:
+                queue = self._domains[domain] = deque()
+                self._turns.append(domain)
+            queue.append((message, batch))
+            self._pending += 1
+            self._cond.notify_all()
+        return True
+
+    def dispatch(self, messages):
+        """
+        Send a group of messages and wait until every one is done.
+
+        Args:
+            messages (iterable): (sender, password, recipient, encoded message) tuples
+
+        Returns:
+            tuple: (number sent, list of the messages that failed)
+        """
+        messages = list(messages)
+        if not messages:
+            return 0, []
+        batch = _Batch(len(messages))
+        for message in messages:
+            self.submit(message, batch)
+        with batch.done:
+            batch.done.wait_for(lambda: batch.remaining == 0)
+        return batch.sent, batch.failed
+
+    def _next(self):
+        """Take the next message, rotating over recipient domains"""
+        domain = self._turns.popleft()
+        queue = self._domains[domain]
+        item = queue.popleft()
+        if queue:
+            self._turns.append(domain)
+        else:
+            del self._domains[domain]
+        self._pending -= 1
+        self._cond.notify_all()
+        return item
+
+    def _work(self):
+        sessions = {}
+        try:
+            while True:
+                with self._cond:
+                    busy = self._cond.wait_for(lambda: self._turns or self._closed, IDLE_SECONDS)
+                    if busy and not self._turns:
+                        return
+                    item = self._next() if busy else None
+                if item is None:
+                    #Nothing to send for a while, don't keep the relay's connections open
+                    self._logout(sessions)
+                    continue
+                message, batch = item
+                ok = self._send(sessions, message, batch)
+                if batch is not None:
+                    batch.finish(message, ok)
+        finally:
+            self._logout(sessions)
+
+    def _send(self, sessions, message, batch):
+        """Send one message over this worker's session for its sender"""
+        sender_email, sender_password, recipient_email, raw_message = message
+        key = (sender_email, sender_password)
+        if batch is not None and key in batch.bad_logins:
+            return False
+        self.bucket.acquire()
+        for attempt in range(2):
+            try:
+                if key not in sessions:
+                    sessions[key] = self._connect(sender_email, sender_password)
+                sessions[key].sendmail(sender_email, [recipient_email], raw_message)
+                return True
+            except smtplib.SMTPAuthenticationError:
+                print(f"Login failed for {sender_email}, skipping the rest of its emails")
+                if batch is not None:
+                    batch.bad_logins.add(key)
+                return False
+            except (smtplib.SMTPServerDisconnected, ConnectionError):
+                #The relay dropped an idle session, log in again once
+                sessions.pop(key, None)
+                if attempt:
+                    print(f"Failed to send email to {recipient_email}: connection lost")
+            except (smtplib.SMTPException, OSError) as e:
+                print(f"Failed to send email to {recipient_email}: {e}")
+                return False
+            except Exception as e:
+                #Anything else still fails just this message, a dead worker would hang dispatch()
+                sessions.pop(key, None)
+                print(f"Failed to send email to {recipient_email}: {e!r}")
+                return False
+        return False
+
+    @staticmethod
+    def _logout(sessions):
+        for server in sessions.values():
+            try:
+                server.quit()
+            except (smtplib.SMTPException, OSError):
+                pass
+        sessions.clear()
+
+    def close(self):
+        """Let the workers finish what is queued, then stop them"""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+            threads, self._threads = self._threads, []
+        for thread in threads:
+            thread.join()
+
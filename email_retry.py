@@ -0,0 +1,216 @@
+"""
+Hotel Booking System - Email Retry Queue
+
+Emails that fail to send are parked here instead of being lost or retried
+on the spot. They are stored in outbox/retry.jsonl (one JSON record per
+line, written before anything else happens) and a background worker sends
+them again with exponential backoff and jitter. After MAX_ATTEMPTS tries a
+message moves to outbox/dead_letter.jsonl for someone to look at.
+
+Passwords are never written to disk. The worker sends with the hotel
+account from the user_email / user_pass environment variables (the same
+ones the app logs in with), and leaves other senders' mail parked.
+
+Functions:
+    park: Store a failed message for a later retry
+    backoff_delay: Seconds to wait before the next attempt
+    pending_retries: Messages waiting in the retry queue
+    dead_letters: Messages that ran out of attempts
+    process_retries: Send every message that is due
+    start_retry_worker: Run process_retries on a background thread
+"""
+
+import json
+import os
+import random
+import threading
+import time
+import uuid
+
+RETRY_DIR = "outbox"
+RETRY_FILE = "retry.jsonl"
+DEAD_LETTER_FILE = "dead_letter.jsonl"
+MAX_ATTEMPTS = 6
+#First retry comes after about BASE_DELAY seconds, doubling each time up to MAX_DELAY
+BASE_DELAY = 30.0
+MAX_DELAY = 3600.0
+
+_lock = threading.Lock()
+
+
+def _path(name):
+    return os.path.join(RETRY_DIR, name)
+
+
+def _read(name):
+    try:
+        with open(_path(name), "r", encoding="utf-8") as f:
+            return [json.loads(line) for line in f if line.strip()]
+    except FileNotFoundError:
+        return []
+
+
+def _append(name, entries):
+    os.makedirs(RETRY_DIR, exist_ok=True)
+    with open(_path(name), "a", encoding="utf-8") as f:
+        f.write("".join(json.dumps(entry) + "\n" for entry in entries))
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def _rewrite(name, entries):
+    tmp_path = _path(name) + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write("".join(json.dumps(entry) + "\n" for entry in entries))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, _path(name))
+
+
+def backoff_delay(attempts, rng=random):
+    """
+    Seconds to wait before the next attempt.
+
+    Exponential backoff with "equal jitter": half the delay is fixed and
+    half is random, so retries from one outage don't all land together.
+
+    Args:
+        attempts (int): Attempts made so far
+        rng: Random source, swappable for tests
+
+    Returns:
+        float: Delay in seconds
+    """
+    delay = min(MAX_DELAY, BASE_DELAY * 2 ** max(0, attempts - 1))
+    return delay / 2 + rng.uniform(0, delay / 2)
+
+
+def park(sender_email, recipient_email, raw_message, error="", attempts=1, now=None):
+    """
+    Store a message that failed to send so the retry worker picks it up.
+
+    Args:
+        sender_email (str): Address it was sent from
+        recipient_email (str): Guest email address
+        raw_message (bytes): The encoded message
+        error (str): Why the last attempt failed
+        attempts (int): Attempts made so far
+        now (float): Current time, defaults to time.time()
+    """
+    now = time.time() if now is None else now
+    entry = {
+        "id": uuid.uuid4().hex,
+        "sender": sender_email,
+        "recipient": recipient_email,
+        "message": raw_message.decode("utf-8", "surrogateescape"),
+        "attempts": attempts,
+        "next_attempt": now + backoff_delay(attempts),
+        "error": str(error),
+    }
+    with _lock:
+        _append(RETRY_FILE, [entry])
+
+
+def pending_retries():
+    """
+    Messages waiting in the retry queue.
+
+    Returns:
+        list: Entry dicts (sender, recipient, attempts, next_attempt, error, ...)
+    """
+    with _lock:
+        return _read(RETRY_FILE)
+
+
+def dead_letters():
+    """
+    Messages that ran out of attempts.
+
+    Returns:
+        list: Entry dicts like pending_retries, with the final error
+    """
+    with _lock:
+        return _read(DEAD_LETTER_FILE)
+
+
+def _credentials():
+    return os.environ.get("user_email", ""), os.environ.get("user_pass", "")
+
+
+def process_retries(dispatch=None, now=None):
+    """
+    Try every parked message whose next attempt is due.
+
+    Entries stay in the retry file while they are being sent and are only
+    removed or rescheduled afterwards, so a crash in the middle at worst
+    sends a message twice instead of losing it.
+
+    Args:
+        dispatch (callable): dispatch(messages) -> (sent, failed messages),
+            defaults to email_service's shared dispatcher
+        now (float): Current time, defaults to time.time()
+
+    Returns:
+        tuple: (number sent, number rescheduled, number moved to dead letters)
+    """
+    now = time.time() if now is None else now
+    sender_email, sender_password = _credentials()
+    with _lock:
+        due = [entry for entry in _read(RETRY_FILE)
+               if entry["next_attempt"] <= now and sender_email and entry["sender"] == sender_email]
+    if not due:
+        return 0, 0, 0
+    if dispatch is None:
+        from email_service import _get_dispatcher
+        dispatch = _get_dispatcher().dispatch
+
+    messages = {entry["id"]: (sender_email, sender_password, entry["recipient"],
+                              entry["message"].encode("utf-8", "surrogateescape")) for entry in due}
+    sent, failed = dispatch(list(messages.values()))
+    failed_ids = {id(message) for message in failed}
+    failed_ids = {entry_id for entry_id, message in messages.items() if id(message) in failed_ids}
+
+    done, rescheduled, dead = set(), {}, []
+    for entry in due:
+        done.add(entry["id"])
+        if entry["id"] not in failed_ids:
+            continue
+        entry = dict(entry, attempts=entry["attempts"] + 1, error="send failed")
+        if entry["attempts"] >= MAX_ATTEMPTS:
+            dead.append(entry)
+        else:
+            entry["next_attempt"] = now + backoff_delay(entry["attempts"])
+            rescheduled[entry["id"]] = entry
+    with _lock:
+        if dead:
+            _append(DEAD_LETTER_FILE, dead)
+        #Re-read so messages parked while we were sending are kept
+        remaining = [rescheduled.get(entry["id"], entry) for entry in _read(RETRY_FILE)
+                     if entry["id"] not in done or entry["id"] in rescheduled]
+        _rewrite(RETRY_FILE, remaining)
+    print(f"Email retries: {sent} sent, {len(rescheduled)} rescheduled, {len(dead)} dead-lettered")
+    return sent, len(rescheduled), len(dead)
+
+
+def start_retry_worker(interval_seconds=60):
+    """
+    Run process_retries every interval on a daemon thread.
+
+    Args:
+        interval_seconds (float): Seconds between passes
+
+    Returns:
+        threading.Event: Set it to stop the worker
+    """
+    stop = threading.Event()
+
+    def run():
+        while not stop.is_set():
+            try:
+                process_retries()
+            except (OSError, ValueError) as e:
+                print(f"Email retry worker failed: {e}")
+            stop.wait(interval_seconds)
+
+    threading.Thread(target=run, name="email-retry", daemon=True).start()
+    return stop
@@ -8,14 +8,45 @@ This module handles sending email notifications to guests for:
 
 #We will see if there is a way to use a different service with a dummy email account.
 Requires Gmail account with app-specific password (not regular password).
+To test without Gmail run smtp_sink.py and set SMTP_HOST/SMTP_PORT/SMTP_SSL.
 
 Functions:
     send_email: Send email notification to recipient
+    queue_email: Queue an email to be sent later in bulk
+    queue_message: Queue an already encoded message (see email_templates)
+    flush_outbox: Send every queued email through the rate-limited dispatcher
 """
 
+import os
 import smtplib
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
+import threading
+
+from email_templates import encode_message
+from email_dispatcher import EmailDispatcher
+from email_retry import park
+
+#Emails waiting for flush_outbox, as (sender, password, recipient, encoded message) tuples
+_outbox = []
+_outbox_lock = threading.Lock()
+#A bigger outbox gets flushed right away so bulk jobs wait for the relay instead of piling up mail
+OUTBOX_LIMIT = 5000
+_dispatcher = None
+#Mail relay, Gmail unless the environment points somewhere else (e.g. a local smtp_sink.py)
+SMTP_HOST = os.environ.get("SMTP_HOST", "smtp.gmail.com")
+SMTP_PORT = int(os.environ.get("SMTP_PORT", "465"))
+#"1" for implicit TLS (port 465 style), "0" for plain SMTP
+SMTP_SSL = os.environ.get("SMTP_SSL", "1") != "0"
+
+def _connect(sender_email, sender_password):
+    """Open and log in an SMTP connection to the mail relay"""
+    print(f"Connecting to {SMTP_HOST}...")
+    if SMTP_SSL:
+        server = smtplib.SMTP_SSL(SMTP_HOST, SMTP_PORT)
+    else:
+        server = smtplib.SMTP(SMTP_HOST, SMTP_PORT)
+    print(f"Logging in as {sender_email}...")
+    server.login(sender_email, sender_password)
+    return server
 
 def send_email(sender_email, sender_password, recipient_email, subject, message):
     # Javier Herrera 11/21/2025 This doesn't work as well as I want it to yet
@@ -27,39 +58,98 @@ def send_email(sender_email, sender_password, recipient_email, subject, message)
         recipient_email (str): Guest email address
         subject (str): Email subject line
         message (str): Email message body (plain text)
-        
+
     Returns:
-        bool: True if sent successfully, False otherwise
+        bool: True if sent successfully, False if it failed and was parked for a retry
     """
+    #Create email message
+    msg = encode_message(sender_email, recipient_email, subject, message)
     try:
-        #Create email message
-        msg = MIMEMultipart()
-        msg['From'] = sender_email
-        msg['To'] = recipient_email
-        msg['Subject'] = subject
-        msg.attach(MIMEText(message, 'plain'))
-        #Connect to Gmail server
-        print(f"Connecting to Gmail server...")
-        server = smtplib.SMTP_SSL('smtp.gmail.com', 465)
-    
-        #Login with credentials
-        print(f"Logging in as {sender_email}...")
-        server.login(sender_email, sender_password)
-        
+        #Connect to Gmail server and login with credentials
+        server = _connect(sender_email, sender_password)
+
         #Send email
         print(f"Sending email to {recipient_email}...")
-        server.send_message(msg)
-        
+        server.sendmail(sender_email, [recipient_email], msg)
+
         #Disconnect
         server.quit()
-        
+
         print(f"Email was sent!")
         return True
-        
-    except smtplib.SMTPAuthenticationError:
+
+    except smtplib.SMTPAuthenticationError as e:
         print("Gmail authentication failed. Check your app password.")
+        park(sender_email, recipient_email, msg, e)
         return False
-        
+
     except Exception as e:
-        print(f"Failed to send email: {e}")
+        print(f"Failed to send email: {e}, it will be retried later")
+        #Don't lose the guest's email, the retry worker sends it again later
+        park(sender_email, recipient_email, msg, e)
         return False
+
+def queue_email(sender_email, sender_password, recipient_email, subject, message):
+    """
+    Queue an email instead of sending it right away.
+
+    Used by bulk operations (e.g. mass cancellations) so the storage work
+    finishes first and the emails go out together with flush_outbox.
+
+    Args:
+        sender_email (str): Email address to send from
+        sender_password (str): Gmail app-specific password
+        recipient_email (str): Guest email address
+        subject (str): Email subject line
+        message (str): Email message body (plain text)
+    """
+    queue_message(sender_email, sender_password, recipient_email,
+                  encode_message(sender_email, recipient_email, subject, message))
+
+def queue_message(sender_email, sender_password, recipient_email, raw_message):
+    """
+    Queue a message that is already encoded, e.g. from email_templates.render_batch.
+
+    Args:
+        sender_email (str): Email address to send from
+        sender_password (str): Gmail app-specific password
+        recipient_email (str): Guest email address
+        raw_message (bytes): Complete encoded message
+    """
+    with _outbox_lock:
+        _outbox.append((sender_email, sender_password, recipient_email, raw_message))
+        full = len(_outbox) >= OUTBOX_LIMIT
+    if full:
+        flush_outbox()
+
+def _get_dispatcher():
+    """The dispatcher shared by every flush, created on first use"""
+    global _dispatcher
+    with _outbox_lock:
+        if _dispatcher is None:
+            _dispatcher = EmailDispatcher(_connect)
+        return _dispatcher
+
+def flush_outbox():
+    """
+    Send every queued email.
+
+    The emails go through the shared EmailDispatcher: a few SMTP sessions
+    in parallel, each sender logged in once per session, paced by its token
+    bucket so the relay's rate limit isn't tripped. Returns once every
+    email was sent or failed.
+
+    Returns:
+        tuple: (number sent, number failed and parked in the retry queue)
+    """
+    with _outbox_lock:
+        pending = list(_outbox)
+        _outbox.clear()
+    if not pending:
+        return 0, 0
+    sent, failed = _get_dispatcher().dispatch(pending)
+    #Failed ones are parked for the retry worker rather than retried here, so the flush keeps moving
+    for sender_email, _, recipient_email, raw_message in failed:
+        park(sender_email, recipient_email, raw_message, "send failed")
+    print(f"Outbox flushed: {sent} sent, {len(failed)} failed and parked for a retry")
+    return sent, len(failed)
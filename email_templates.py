@@ -0,0 +1,268 @@
+"""
+Hotel Booking System - Email Templates
+
+The guest emails (confirmation, modification, cancellation and general
+notices) as templates that are compiled once. Compiling splits a template
+into its literal text, already encoded to bytes with CRLF line endings, and
+the $placeholders between them, so rendering a message is just one join of
+bytes. Messages come out as complete pre-encoded RFC 5322 messages ready
+for smtplib's sendmail, with no email.mime objects built per message.
+
+Placeholders use string.Template syntax ($name or ${name}, $$ for $).
+
+Functions:
+    get_template: Compiled template by name (compiled on first use)
+    encode_message: Encode one plain-text email into raw message bytes
+    render_batch: Stream rendered messages for many recipients
+
+Classes:
+    EmailTemplate: One compiled subject + body template
+
+Attributes:
+    TEMPLATES (dict): Template name -> (subject, body) source text
+"""
+
+from email.header import Header
+from string import Template
+
+TEMPLATES = {
+    "confirmation": ("Reservation Confirmation - Best Hotel Booking", """Dear $guest_name,
+
+Your reservation has been confirmed!
+
+Confirmation Number: $confirmation_number
+Room Type: $room_type
+Check-in: $check_in
+Check-out: $check_out
+Number of Nights: $nights
+Nightly Rate: $$$price
+Total Price: $$$total_price
+
+Room Amenities: $amenities
+
+Thank you for reservation with us!
+
+Best regards,
+Best Hotel Booking"""),
+    "modification": ("Reservation Modified - Best Hotel Booking", """Dear $guest_name,
+
+Your reservation has been successfully modified!
+
+Previous Confirmation Number: $old_confirmation_number
+New Confirmation Number: $confirmation_number
+
+Updated reservation Details:
+Check-in: $check_in
+Check-out: $check_out
+Number of Nights: $nights
+Total Price: $$$total_price
+
+The previous reservation has been cancelled.
+
+Thank you for reservation with us!
+
+Best regards,
+Best Hotel Booking"""),
+    "cancellation": ("Reservation Cancelled - Best Hotel Booking", """Dear $guest_name,
+
+Your reservation has been cancelled. We apologize for not being good enough for you!
+
+Original Confirmation Number: $confirmation_number
+Cancellation Confirmation Number: $cancel_confirmation_number
+
+Cancelled reservation Details:
+Room: $room_type
+Check-in: $check_in
+Check-out: $check_out
+Original Total: $$$total_price
+
+Thank you for your understanding. We hope to see you again!
+
+Best regards,
+Best Hotel Booking"""),
+    #For bulk notices like rate changes or closures, the text goes in $message
+    "notice": ("$subject", """Dear $guest_name,
+
+$message
+
+Confirmation Number: $confirmation_number
+Check-in: $check_in
+Check-out: $check_out
+
+Best regards,
+Best Hotel Booking"""),
+}
+
+#The same for every message, so encoded once
+_MIME_HEADERS = {
+    "7bit": b"MIME-Version: 1.0\r\nContent-Type: text/plain; charset=\"us-ascii\"\r\nContent-Transfer-Encoding: 7bit\r\n",
+    "8bit": b"MIME-Version: 1.0\r\nContent-Type: text/plain; charset=\"utf-8\"\r\nContent-Transfer-Encoding: 8bit\r\n",
+}
+
+
+def _crlf(text):
+    return text.replace("\r\n", "\n").replace("\n", "\r\n")
+
+
+def _header(name, value):
+    """One encoded header line, RFC 2047 encoded only if it isn't plain ASCII"""
+    #A newline in a guest's name must not be able to start a new header
+    value = " ".join(str(value).splitlines())
+    if value.isascii():
+        return f"{name}: {value}\r\n".encode("ascii")
+    return f"{name}: {Header(value, 'utf-8').encode()}\r\n".encode("ascii")
+
+
+def _assemble(sender_email, recipient_email, subject, body):
+    """Put the headers in front of an encoded body"""
+    return b"".join((_header("From", sender_email), _header("To", recipient_email), _header("Subject", subject),
+                     _MIME_HEADERS["7bit" if body.isascii() else "8bit"], b"\r\n", body))
+
+
+def _compile(source):
+    """
+    Split template text into alternating literal bytes and placeholder names.
+
+    Returns:
+        tuple: (literals, names) where len(literals) == len(names) + 1
+    """
+    literals, names = [], []
+    text = []
+    last = 0
+    for match in Template.pattern.finditer(source):
+        text.append(source[last:match.start()])
+        last = match.end()
+        if match.group("escaped") is not None:
+            text.append("$")
+            continue
+        name = match.group("named") or match.group("braced")
+        if name is None:
+            raise ValueError(f"Invalid placeholder in template at position {match.start()}")
+        literals.append(_crlf("".join(text)).encode("utf-8"))
+        names.append(name)
+        text = []
+    text.append(source[last:])
+    literals.append(_crlf("".join(text)).encode("utf-8"))
+    return literals, names
+
+
+class EmailTemplate:
+    """
+    A compiled subject and body template.
+
+    Attributes:
+        name (str): Template name
+        fields (set): Placeholder names the template needs
+    """
+
+    def __init__(self, name, subject, body):
+        """
+        Args:
+            name (str): Template name
+            subject (str): Subject line template
+            body (str): Body template
+        """
+        self.name = name
+        self._subject = Template(subject)
+        self._literals, self._names = _compile(body)
+        subject_names = {m.group("named") or m.group("braced") for m in Template.pattern.finditer(subject)}
+        self.fields = set(self._names) | (subject_names - {None})
+
+    def _body_bytes(self, context):
+        literals, names = self._literals, self._names
+        parts = [literals[0]]
+        for name, literal in zip(names, literals[1:]):
+            parts.append(_crlf(str(context[name])).encode("utf-8"))
+            parts.append(literal)
+        return b"".join(parts)
+
+    def render(self, context):
+        """
+        Render the subject and body as text.
+
+        Args:
+            context (dict): Placeholder name -> value
+
+        Returns:
+            tuple: (subject, body)
+        """
+        return (self._subject.substitute(context),
+                self._body_bytes(context).decode("utf-8").replace("\r\n", "\n"))
+
+    def render_message(self, sender_email, recipient_email, context):
+        """
+        Render a complete, ready to send message.
+
+        Args:
+            sender_email (str): From address
+            recipient_email (str): To address
+            context (dict): Placeholder name -> value
+
+        Returns:
+            bytes: The encoded message for smtplib's sendmail
+
+        Raises:
+            KeyError: A placeholder has no value in context
+        """
+        return _assemble(sender_email, recipient_email, self._subject.substitute(context), self._body_bytes(context))
+
+
+_compiled = {}
+
+
+def get_template(name):
+    """
+    Get a compiled template, compiling it the first time it is asked for.
+
+    Args:
+        name (str): A key of TEMPLATES
+
+    Returns:
+        EmailTemplate: The compiled template
+    """
+    template = _compiled.get(name)
+    if template is None:
+        subject, body = TEMPLATES[name]
+        template = _compiled[name] = EmailTemplate(name, subject, body)
+    return template
+
+
+def encode_message(sender_email, recipient_email, subject, message):
+    """
+    Encode one plain-text email that didn't come from a template.
+
+    Args:
+        sender_email (str): From address
+        recipient_email (str): To address
+        subject (str): Subject line
+        message (str): Body text
+
+    Returns:
+        bytes: The encoded message for smtplib's sendmail
+    """
+    return _assemble(sender_email, recipient_email, subject, _crlf(message).encode("utf-8"))
+
+
+def render_batch(name, sender_email, rows):
+    """
+    Stream personalized messages for a bulk notification.
+
+    Rows are rendered one at a time as they are consumed, so thousands of
+    messages never have to sit in memory together.
+
+    Example:
+        >>> for recipient, raw in render_batch("notice", sender, rows):
+        ...     queue_message(sender, password, recipient, raw)
+
+    Args:
+        name (str): Template name
+        sender_email (str): From address
+        rows (iterable): (recipient email, context dict) pairs
+
+    Yields:
+        tuple: (recipient email, encoded message bytes)
+    """
+    template = get_template(name)
+    render = template.render_message
+    for recipient_email, context in rows:
+        yield recipient_email, render(sender_email, recipient_email, context)
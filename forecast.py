@@ -0,0 +1,348 @@
+"""
+Hotel Booking System - Occupancy Forecast From Booking Pace
+
+Projects occupancy for the coming nights with the additive pickup model:
+
+    expected(night) = on the books today(night) + typical pickup(weekday, days left)
+
+"Pickup" is how many more room nights a night gains between being L days
+away and arriving. It is learned from the nights already stayed: for each
+of them the bookings are binned by lead time (stay night minus the day the
+booking was made, from its created_at), so the room nights booked with
+fewer than L days to go are that night's pickup at L. Averaging over the
+same weekday gives the pace curve used for the future nights.
+
+The model is a nights x lead-time matrix of room night counts, filled with
+np.bincount over every stay expanded into its nights (see analytics.py),
+so years of history fit in well under a second. Each process keeps one
+shared model (get_model): it is loaded from storage the first time it is
+needed, and after that every booking this process writes is added to (or,
+once cancelled, taken out of) the matrix by storage's write hook through
+apply_changes, without re-reading storage. If another process writes,
+the partition files change underneath it and the model is loaded again.
+Bookings saved before created_at existed still count as on the books but
+can't teach the model anything about pace.
+
+Only the current status of a booking is stored, so stays cancelled later
+are missing from the history as well as from the books; the pace curves
+are net of cancellations.
+
+Example:
+    >>> model = load_model()
+    >>> for row in model.forecast().rows(): print(row)
+
+Functions:
+    load_model: Build a PaceModel from every booking in storage
+    get_model: The process's shared PaceModel, kept current as bookings are written
+    apply_changes: Update the shared model for bookings just written
+    forecast_summary: Weekly forecast rows for the admin report
+
+Classes:
+    PaceModel: Room nights by stay night and lead time, and the pickup curves learned from them
+    Forecast: Result of PaceModel.forecast
+"""
+
+import threading
+from datetime import date
+
+import numpy as np
+
+import storage
+from analytics import _day, _EPOCH
+from models import default_rooms
+
+#Nights projected ahead
+HORIZON = 90
+#Leads past this are counted together, far earlier than anyone asks a forecast for
+MAX_LEAD = 365
+#Stayed nights the pickup curves are averaged over
+HISTORY_DAYS = 2 * 365
+
+
+def _today():
+    return date.today().toordinal() - _EPOCH
+
+
+class Forecast:
+    """
+    Projected room nights per night.
+
+    Attributes:
+        nights (np.ndarray): Stay nights (datetime64[D])
+        capacity (int): Rooms available per night
+        on_books (np.ndarray): Room nights already booked
+        pickup (np.ndarray): Room nights still expected to be booked
+        expected (np.ndarray): on_books + pickup, capped at capacity
+    """
+
+    def __init__(self, nights, capacity, on_books, pickup):
+        self.nights = nights
+        self.capacity = capacity
+        self.on_books = on_books
+        self.pickup = pickup
+        self.expected = np.minimum(on_books + pickup, capacity)
+
+    @property
+    def occupancy(self):
+        """Expected occupancy per night (0-1)"""
+        return self.expected / self.capacity if self.capacity else np.zeros(len(self.nights))
+
+    def rows(self, period=1):
+        """
+        The forecast as plain dicts.
+
+        Args:
+            period (int): Nights per row, e.g. 7 for weekly rows starting at the first night
+
+        Yields:
+            dict: night, on_books, expected, on_books_occupancy, occupancy
+        """
+        for start in range(0, len(self.nights), period):
+            block = slice(start, start + period)
+            available = self.capacity * len(self.nights[block])
+            on_books, expected = float(self.on_books[block].sum()), float(self.expected[block].sum())
+            yield {"night": str(self.nights[start]), "on_books": int(on_books), "expected": round(expected, 1),
+                   "on_books_occupancy": round(on_books / available, 4) if available else 0.0,
+                   "occupancy": round(expected / available, 4) if available else 0.0}
+
+
+class PaceModel:
+    """
+    Room nights by stay night and lead time.
+
+    Attributes:
+        capacity (int): Rooms available per night
+        max_lead (int): Longest lead time kept apart, longer ones are counted in the last column
+        first (int): Day number (days since 1970-01-01) of row 0
+        counts (np.ndarray): [night, lead] room nights of bookings with a known booking time (int32)
+        undated (np.ndarray): [night] room nights of bookings without one (int32)
+    """
+
+    def __init__(self, capacity, max_lead=MAX_LEAD):
+        """
+        Args:
+            capacity (int): Rooms available per night
+            max_lead (int): Longest lead time kept apart
+        """
+        self.capacity = capacity
+        self.max_lead = max_lead
+        self.first = None
+        self.counts = np.zeros((0, max_lead + 1), dtype=np.int32)
+        self.undated = np.zeros(0, dtype=np.int32)
+        self._curves = None
+
+    def _grow(self, low, high):
+        """Make room for day numbers low .. high-1"""
+        if self.first is None:
+            self.first = low
+        before = max(0, self.first - low)
+        after = max(0, high - (self.first + len(self.undated)))
+        if before or after:
+            self.counts = np.pad(self.counts, ((before, after), (0, 0)))
+            self.undated = np.pad(self.undated, (before, after))
+            self.first -= before
+
+    def add(self, bookings, sign=1):
+        """
+        Count bookings into the matrix; only CONFIRMED stays are counted.
+
+        Args:
+            bookings (iterable): Booking dictionaries
+            sign (int): 1 to add, -1 to take out (e.g. a booking just cancelled)
+        """
+        days = {}
+        made, starts, ends = [], [], []
+        for b in bookings:
+            if b.get('status') != 'CONFIRMED':
+                continue
+            check_in, check_out = _day(b.get('check_in'), days), _day(b.get('check_out'), days)
+            if check_in < 0 or check_out <= check_in:
+                continue
+            made.append(_day(str(b.get('created_at') or "")[:10], days))
+            starts.append(check_in)
+            ends.append(check_out)
+        if not starts:
+            return
+        made = np.array(made, dtype=np.int64)
+        check_in, check_out = np.array(starts, dtype=np.int64), np.array(ends, dtype=np.int64)
+        self._grow(int(check_in.min()), int(check_out.max()))
+
+        #Every stay expanded into its nights, as in analytics.compute_kpis
+        nights = check_out - check_in
+        stay = np.repeat(np.arange(len(nights)), nights)
+        night = check_in[stay] + np.arange(len(stay)) - np.repeat(np.cumsum(nights) - nights, nights)
+        row = night - self.first
+        dated = made[stay] >= 0
+        lead = np.clip(night - made[stay], 0, self.max_lead)
+        width = self.max_lead + 1
+        cells = np.bincount(row[dated] * width + lead[dated], minlength=self.counts.size)
+        self.counts += (sign * cells).reshape(self.counts.shape).astype(np.int32)
+        self.undated += (sign * np.bincount(row[~dated], minlength=len(self.undated))).astype(np.int32)
+        self._curves = None
+
+    def remove(self, bookings):
+        """Take bookings back out, e.g. ones that were just cancelled"""
+        self.add(bookings, -1)
+
+    def pickup_curves(self, today=None, history_days=HISTORY_DAYS, horizon=HORIZON):
+        """
+        Average pickup by weekday and days left, from the nights already stayed.
+
+        Args:
+            today (int): Day number of today, defaults to the real today
+            history_days (int): Stayed nights to average over
+            horizon (int): Longest lead time wanted
+
+        Returns:
+            np.ndarray: [weekday (Monday 0), days left 0..horizon] expected room nights still to come
+        """
+        today = _today() if today is None else today
+        key = (today, history_days, horizon)
+        if self._curves is not None and self._curves[0] == key:
+            return self._curves[1]
+        curves = np.zeros((7, horizon + 1))
+        if self.first is not None:
+            low = max(self.first, today - history_days)
+            high = min(today, self.first + len(self.undated))
+            if high > low:
+                counts = self.counts[low - self.first:high - self.first, :horizon + 1]
+                #Booked with fewer than L days to go: the exclusive running sum along the lead axis
+                pickup = np.zeros((len(counts), horizon + 1))
+                pickup[:, 1:] = np.cumsum(counts[:, :horizon], axis=1)
+                #1970-01-01 was a Thursday, so Monday based weekdays are (days + 3) % 7
+                weekday = (np.arange(low, high) + 3) % 7
+                np.add.at(curves, weekday, pickup)
+                curves /= np.maximum(np.bincount(weekday, minlength=7), 1)[:, None]
+        self._curves = (key, curves)
+        return curves
+
+    def forecast(self, today=None, horizon=HORIZON, history_days=HISTORY_DAYS):
+        """
+        Project the nights from today on.
+
+        Args:
+            today (str): "YYYY-MM-DD" to forecast from, defaults to today; earlier dates
+                replay the forecast as it would have looked then (bookings made later are left out)
+            horizon (int): Nights to project
+            history_days (int): Stayed nights to learn pickup from
+
+        Returns:
+            Forecast: The projection
+        """
+        today = _today() if today is None else _day(today, {})
+        if today < 0:
+            raise ValueError("today must be a YYYY-MM-DD date")
+        curves = self.pickup_curves(today, history_days, horizon)
+        night = np.arange(today, today + horizon)
+        lead = night - today
+        on_books = np.zeros(horizon)
+        if self.first is not None:
+            row = night - self.first
+            inside = (row >= 0) & (row < len(self.undated))
+            #Booked as of today: lead time at least the days still to go
+            later = np.cumsum(self.counts[row[inside], ::-1], axis=1)[:, ::-1]
+            on_books[inside] = later[np.arange(inside.sum()), np.minimum(lead[inside], self.max_lead)]
+            on_books[inside] += self.undated[row[inside]]
+        pickup = curves[(night + 3) % 7, lead]
+        return Forecast(night.astype("datetime64[D]"), self.capacity, on_books, pickup)
+
+
+def load_model(rooms=None, include_cold=True):
+    """
+    Build a PaceModel from every booking in storage.
+
+    Args:
+        rooms (list): Room catalog for the capacity, defaults to models.default_rooms()
+        include_cold (bool): Also learn from the compressed archive
+
+    Returns:
+        PaceModel: The filled model
+    """
+    model = PaceModel(len(rooms if rooms is not None else default_rooms()))
+    model.add(storage.iter_bookings(include_cold=include_cold))
+    return model
+
+
+_model = None
+_model_signature = None
+#Set by a write that couldn't wait for the model, the next get_model loads it again
+_model_stale = False
+_model_lock = threading.RLock()
+
+
+def _signature():
+    return {path: storage._mtime(path) for path in storage._partition_paths()}
+
+
+def get_model():
+    """
+    The process's shared model over models.default_rooms(), loaded on first use.
+
+    Returns:
+        PaceModel: The model, reloaded if another process changed storage since
+    """
+    global _model, _model_signature, _model_stale
+    with _model_lock:
+        current = _signature()
+        if _model is None or _model_stale or current != _model_signature:
+            _model_stale = False
+            _model = load_model()
+            _model_signature = current
+        return _model
+
+
+def apply_changes(added=(), changed=(), stamps=None):
+    """
+    Update the shared model for bookings this process just wrote (called by storage).
+
+    Nothing happens until the model has been loaded. A file's new modification
+    time is only taken on if the model had seen it as it was just before the
+    write, so a write by another process still makes get_model reload.
+
+    Args:
+        added (iterable): New bookings
+        changed (iterable): (booking after the change, its status before) pairs
+        stamps (dict): Partition file -> (modification time before, after) for the files written
+    """
+    global _model_stale
+    #Storage's locks are held here, so never wait for a report that is using the model
+    if not _model_lock.acquire(blocking=False):
+        _model_stale = True
+        return
+    try:
+        if _model is None:
+            return
+        _model.add(added)
+        for booking, old_status in changed:
+            if booking.get('status') == old_status:
+                continue
+            #Only CONFIRMED stays are counted, so one of these is a no-op
+            _model.add([booking])
+            _model.remove([dict(booking, status=old_status)])
+        for path, (before, after) in (stamps or {}).items():
+            if _model_signature.get(path) == before:
+                _model_signature[path] = after
+    finally:
+        _model_lock.release()
+
+
+def forecast_summary(today=None, horizon=HORIZON, period=7, rooms=None):
+    """
+    Forecast rows for the admin report, one per week by default.
+
+    Uses the shared model, so only the first report of a process reads the
+    whole history.
+
+    Args:
+        today (str): "YYYY-MM-DD" to forecast from, defaults to today
+        horizon (int): Nights to project
+        period (int): Nights per row
+        rooms (list): Room catalog, defaults to models.default_rooms()
+
+    Returns:
+        list: Dicts from Forecast.rows
+    """
+    if rooms is not None:
+        return list(load_model(rooms).forecast(today, horizon).rows(period))
+    with _model_lock:
+        return list(get_model().forecast(today, horizon).rows(period))
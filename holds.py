@@ -0,0 +1,183 @@
+"""
+Hotel Booking System - Room Holds
+
+Short-lived tentative holds on a room for a date range. A hold is placed as
+soon as a guest picks a room and lasts until they confirm, go back, or the
+TTL runs out, so nobody else can grab the room while they type their details.
+
+Expirations are kept in a heap, so sweeping out expired holds costs
+O(log n) per hold removed no matter how many are active.
+
+Holds live in memory in this process (the GUI, or one shared API server).
+
+Classes:
+    Hold: One tentative hold
+    HoldManager: Places, checks, releases and expires holds
+
+Attributes:
+    hold_manager (HoldManager): The manager shared by the GUI and booking logic
+"""
+
+import heapq
+import itertools
+import threading
+import time
+
+from storage import normalize_date
+
+#How long a guest gets to fill in their details before the room is released
+DEFAULT_HOLD_SECONDS = 10 * 60
+
+
+class Hold:
+    """
+    A tentative hold on one room for a date range.
+
+    Attributes:
+        hold_id (str): Token handed back to whoever placed the hold
+        room_id (str): Held room
+        check_in (str): Check-in date "YYYY-MM-DD"
+        check_out (str): Check-out date "YYYY-MM-DD"
+        expires_at (float): Clock time the hold runs out
+    """
+
+    def __init__(self, hold_id, room_id, check_in, check_out, expires_at):
+        self.hold_id = hold_id
+        self.room_id = room_id
+        self.check_in = normalize_date(check_in)
+        self.check_out = normalize_date(check_out)
+        self.expires_at = expires_at
+
+    def overlaps(self, check_in, check_out):
+        """True if the held dates overlap the given stay"""
+        check_in, check_out = normalize_date(check_in), normalize_date(check_out)
+        return not (check_out <= self.check_in or check_in >= self.check_out)
+
+
+class HoldManager:
+    """
+    Keeps the active holds and expires them.
+
+    Attributes:
+        ttl_seconds (float): Default hold length
+    """
+
+    def __init__(self, ttl_seconds=DEFAULT_HOLD_SECONDS, clock=time.monotonic):
+        """
+        Args:
+            ttl_seconds (float): Default hold length
+            clock (callable): Time source, swappable for tests
+        """
+        self.ttl_seconds = ttl_seconds
+        self._clock = clock
+        self._holds = {}
+        self._by_room = {}
+        self._expiry_heap = []
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def sweep(self):
+        """
+        Drop every hold whose time is up.
+
+        Released and extended holds leave stale heap entries behind; those
+        are skipped when they reach the top.
+
+        Returns:
+            int: Number of holds that expired
+        """
+        now = self._clock()
+        expired = 0
+        with self._lock:
+            while self._expiry_heap and self._expiry_heap[0][0] <= now:
+                expires_at, hold_id = heapq.heappop(self._expiry_heap)
+                hold = self._holds.get(hold_id)
+                if hold is not None and hold.expires_at == expires_at:
+                    self._drop(hold)
+                    expired += 1
+        return expired
+
+    def _drop(self, hold):
+        del self._holds[hold.hold_id]
+        room_holds = self._by_room[hold.room_id]
+        del room_holds[hold.hold_id]
+        if not room_holds:
+            del self._by_room[hold.room_id]
+
+    def conflicts(self, room_id, check_in, check_out, ignore=None):
+        """
+        Active holds on a room that overlap a stay.
+
+        Args:
+            room_id (str): Room to check
+            check_in (str): Check-in date "YYYY-MM-DD"
+            check_out (str): Check-out date "YYYY-MM-DD"
+            ignore (str): Hold id to leave out (the caller's own hold)
+
+        Returns:
+            list: Ids of the overlapping holds
+        """
+        self.sweep()
+        with self._lock:
+            return [hold_id for hold_id, hold in self._by_room.get(room_id, {}).items()
+                    if hold_id != ignore and hold.overlaps(check_in, check_out)]
+
+    def place(self, room_id, check_in, check_out, ttl_seconds=None):
+        """
+        Hold a room unless someone else is already holding those dates.
+
+        Args:
+            room_id (str): Room to hold
+            check_in (str): Check-in date "YYYY-MM-DD"
+            check_out (str): Check-out date "YYYY-MM-DD"
+            ttl_seconds (float): Hold length, defaults to ttl_seconds
+
+        Returns:
+            str: Hold id, or None if the room is already held
+        """
+        self.sweep()
+        with self._lock:
+            if any(h.overlaps(check_in, check_out) for h in self._by_room.get(room_id, {}).values()):
+                return None
+            hold = Hold(f"HOLD-{next(self._ids)}", room_id, check_in, check_out,
+                        self._clock() + (ttl_seconds or self.ttl_seconds))
+            self._holds[hold.hold_id] = hold
+            self._by_room.setdefault(room_id, {})[hold.hold_id] = hold
+            heapq.heappush(self._expiry_heap, (hold.expires_at, hold.hold_id))
+            return hold.hold_id
+
+    def extend(self, hold_id, ttl_seconds=None):
+        """
+        Give a hold more time.
+
+        Returns:
+            bool: False if the hold already expired or was released
+        """
+        self.sweep()
+        with self._lock:
+            hold = self._holds.get(hold_id)
+            if hold is None:
+                return False
+            hold.expires_at = self._clock() + (ttl_seconds or self.ttl_seconds)
+            heapq.heappush(self._expiry_heap, (hold.expires_at, hold.hold_id))
+            return True
+
+    def release(self, hold_id):
+        """
+        Let go of a hold early (booking confirmed or guest went back).
+
+        Returns:
+            bool: True if the hold was still active
+        """
+        with self._lock:
+            hold = self._holds.get(hold_id)
+            if hold is None:
+                return False
+            self._drop(hold)
+            return True
+
+    def __len__(self):
+        return len(self._holds)
+
+
+hold_manager = HoldManager()
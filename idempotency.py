@@ -0,0 +1,242 @@
+"""
+Hotel Booking System - Idempotency Keys
+
+Remembers the result of a reservation call under a caller-chosen key for a
+while, so a retried click or a re-run script gets the original result back
+instead of booking, cancelling or emailing twice.
+
+Results are kept in memory with a heap of expiration times (same idea as
+holds.py) and appended to bookings/idempotency.log so they survive a
+restart. Other processes sharing bookings/ (the API server and the CLI)
+append to the same file, so new lines are read in before every lookup.
+The file is compacted, under a cross-process lock, when most of its lines
+have expired.
+
+Functions:
+    idempotent: Decorator adding an idempotency_key argument to a function
+
+Classes:
+    IdempotencyStore: Expiring key -> result index
+
+Attributes:
+    idempotency_store (IdempotencyStore): The store used by the reservation logic
+"""
+
+import functools
+import heapq
+import json
+import os
+import threading
+import time
+
+import storage
+
+#Append-only JSON lines log, kept off the .jsonl extension so it is never taken for a partition
+IDEMPOTENCY_FILE = "idempotency.log"
+#How long a retry still gets the original answer back
+DEFAULT_KEY_SECONDS = 24 * 60 * 60
+
+
+class IdempotencyStore:
+    """
+    Expiring key -> result index backed by a JSON lines file.
+
+    Attributes:
+        ttl_seconds (float): How long a key is remembered
+    """
+
+    def __init__(self, ttl_seconds=DEFAULT_KEY_SECONDS, path=None, clock=time.time):
+        """
+        Args:
+            ttl_seconds (float): How long a key is remembered
+            path (str): JSONL file, defaults to bookings/idempotency.log
+            clock (callable): Wall clock, swappable for tests
+        """
+        self.ttl_seconds = ttl_seconds
+        self._path = path
+        self._clock = clock
+        self._results = {}
+        self._expiry_heap = []
+        self._key_locks = {}
+        self._lock = threading.Lock()
+        self._loaded_from = None
+        self._file_lines = 0
+        #Bytes of the file already read, and (inode, size, mtime) when we last looked
+        self._offset = 0
+        self._file_stat = None
+
+    @property
+    def path(self):
+        return self._path or os.path.join(storage.BOOKINGS_DIR, IDEMPOTENCY_FILE)
+
+    def _file_lock(self):
+        """Cross-process lock for appending to or rewriting the file"""
+        return storage._file_locks(["idempotency-" + os.path.basename(self.path)])
+
+    def _load(self):
+        """
+        Catch up with the file, which other processes append to as well.
+
+        New lines are read from where the last read stopped. The whole file
+        is read again when BOOKINGS_DIR moved or the file was replaced (a
+        compaction, here or in another process).
+        """
+        try:
+            st = os.stat(self.path)
+            file_stat = (st.st_ino, st.st_size, st.st_mtime_ns)
+        except FileNotFoundError:
+            file_stat = None
+        if self._loaded_from == self.path and file_stat == self._file_stat:
+            return
+        #Appends only ever grow the file, anything else means it was rewritten
+        if (self._loaded_from != self.path or file_stat is None or self._file_stat is None
+                or file_stat[0] != self._file_stat[0] or file_stat[1] <= self._offset):
+            self._results.clear()
+            self._expiry_heap.clear()
+            self._file_lines = 0
+            self._offset = 0
+            self._loaded_from = self.path
+        self._file_stat = file_stat
+        if file_stat is None:
+            return
+        with open(self.path, "rb") as f:
+            f.seek(self._offset)
+            data = f.read()
+        #A line still being written is left for the next read
+        complete = data[:data.rfind(b"\n") + 1]
+        self._offset += len(complete)
+        now = self._clock()
+        for line in complete.splitlines():
+            try:
+                entry = json.loads(line.decode("utf-8"))
+            except ValueError:
+                continue
+            self._file_lines += 1
+            if entry["expires"] > now:
+                self._results[entry["key"]] = (entry["expires"], entry["result"])
+                heapq.heappush(self._expiry_heap, (entry["expires"], entry["key"]))
+
+    def _sweep(self):
+        now = self._clock()
+        while self._expiry_heap and self._expiry_heap[0][0] <= now:
+            expires, key = heapq.heappop(self._expiry_heap)
+            if key in self._results and self._results[key][0] == expires:
+                del self._results[key]
+        #Rewrite the file once expired lines make up most of it
+        if self._file_lines > 64 and self._file_lines > 2 * len(self._results):
+            self._compact()
+
+    def _compact(self):
+        with self._file_lock():
+            #Pick up whatever other processes appended since our last read
+            self._load()
+            now = self._clock()
+            tmp_path = self.path + ".tmp"
+            kept = 0
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                for key, (expires, result) in self._results.items():
+                    if expires > now:
+                        f.write(json.dumps({"key": key, "expires": expires, "result": result}) + "\n")
+                        kept += 1
+            os.replace(tmp_path, self.path)
+            st = os.stat(self.path)
+            self._file_stat = (st.st_ino, st.st_size, st.st_mtime_ns)
+            self._offset = st.st_size
+            self._file_lines = kept
+
+    def get(self, key):
+        """
+        Look up a remembered result.
+
+        Returns:
+            tuple: (True, result) if the key is known, (False, None) otherwise
+        """
+        with self._lock:
+            self._load()
+            self._sweep()
+            if key in self._results:
+                return True, self._results[key][1]
+            return False, None
+
+    def put(self, key, result, ttl_seconds=None):
+        """
+        Remember a result under a key.
+
+        Args:
+            key (str): Idempotency key
+            result: JSON serializable result of the call
+            ttl_seconds (float): How long to keep it, defaults to ttl_seconds
+        """
+        with self._lock:
+            self._load()
+            expires = self._clock() + (ttl_seconds or self.ttl_seconds)
+            self._results[key] = (expires, result)
+            heapq.heappush(self._expiry_heap, (expires, key))
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            #Under the lock so a compaction in another process can't drop the line,
+            #_load reads it back like any other process's line
+            with self._file_lock():
+                with open(self.path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps({"key": key, "expires": expires, "result": result}) + "\n")
+
+    def run(self, key, func):
+        """
+        Call func once per key and hand every retry the first result.
+
+        Concurrent calls with the same key wait for the first one to finish.
+        Calls that raise aren't remembered, so they can be retried.
+
+        Args:
+            key (str): Idempotency key, None just calls func
+            func (callable): The operation to run
+
+        Returns:
+            The result of func, or the remembered result for a repeated key
+        """
+        if key is None:
+            return func()
+        with self._lock:
+            #[lock, callers holding or waiting for it], dropped once the last one is done
+            entry = self._key_locks.setdefault(key, [threading.Lock(), 0])
+            entry[1] += 1
+        try:
+            with entry[0]:
+                found, result = self.get(key)
+                if found:
+                    return result
+                result = func()
+                self.put(key, result)
+                return result
+        finally:
+            with self._lock:
+                entry[1] -= 1
+                if not entry[1]:
+                    del self._key_locks[key]
+
+
+idempotency_store = IdempotencyStore()
+
+
+def idempotent(operation):
+    """
+    Give a function an optional idempotency_key keyword argument.
+
+    Calls made with the same key (per operation) return the first call's
+    result without running the function again.
+
+    Example:
+        >>> @idempotent("cancel")
+        ... def cancel_reservation(conf_num, ...): ...
+        >>> cancel_reservation("#4K2Z9QA7", ..., idempotency_key="click-81f3")
+
+    Args:
+        operation (str): Name that keeps keys of different operations apart
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, idempotency_key=None, **kwargs):
+            if idempotency_key is None:
+                return func(*args, **kwargs)
+            return idempotency_store.run(f"{operation}:{idempotency_key}", lambda: func(*args, **kwargs))
+        return wrapper
+    return decorator
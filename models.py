@@ -5,9 +5,72 @@ Hotel Booking System - Data Models
 This module defines the Room and Booking data structures used throughout the hotel booking application.
 
 Classes:
+    Amenity: An extra a room comes with and what it costs.
     Room: Represents a hotel room with amenities and pricing.
+
+Functions:
+    default_rooms: The hotel's room catalog
+
+Attributes:
+    AMENITIES (dict): The hotel's amenities by id
 """
 
+class Amenity:
+    """
+    An extra a room comes with, e.g. WiFi, and what it adds to a stay.
+
+    Attributes:
+        amenity_id (str): Short key, e.g. "wifi"
+        label (str): Name shown to guests, e.g. "\U0001F4F6 WiFi"
+        price (float): Price in dollars
+        per_night (bool): Charged every night (True) or once per stay (False)
+    """
+
+    def __init__(self, amenity_id, label, price, per_night=True):
+        self.amenity_id = amenity_id
+        self.label = label
+        self.price = price
+        self.per_night = per_night
+
+    @property
+    def display(self):
+        """Label with price, e.g. "\U0001F4F6 WiFi - $10" (or "- $10/stay" for a per-stay charge)"""
+        return f"{self.label} - ${self.price:g}" + ("" if self.per_night else "/stay")
+
+    def charge(self, nights):
+        """
+        What the amenity adds to a stay.
+
+        Args:
+            nights (int): Nights in the stay
+
+        Returns:
+            float: price * nights, or price once for a per-stay amenity
+        """
+        return self.price * nights if self.per_night else self.price
+
+    def matches(self, name):
+        """True if name is this amenity's id, label or display text"""
+        name = str(name).strip()
+        return name in (self.amenity_id, self.label, self.display)
+
+
+#Room prices below already include these per night, see Room.base_price
+AMENITIES = {
+    "wifi": Amenity("wifi", "\U0001F4F6 WiFi", 10.0),
+    "air_conditioning": Amenity("air_conditioning", "\U0001F321 Air Conditoning", 25.0),
+    "bathtub": Amenity("bathtub", "\U0001F6C1 Bathtub", 38.0),
+    "mini_fridge": Amenity("mini_fridge", "\U0001F37A Mini-Fridge", 52.0),
+}
+
+
+def _amenity(entry):
+    """The Amenity for a catalog entry: an Amenity already, or its id/label/display text"""
+    if isinstance(entry, Amenity):
+        return entry
+    return next((amenity for amenity in AMENITIES.values() if amenity.matches(entry)), None)
+
+
 class Room:
     """
     Programmer: Sergio Ruelas
@@ -20,8 +83,9 @@ class Room:
     Attributes:
         max_guests (int): Maximum number of guests allowed in room
         num_beds (int): Number of beds in the room
-        price (float): Nightly rate in dollars
-        amenities (list): List of available amenities (WiFi, AC, Bathtub, etc.)    
+        price (float): Nightly rate in dollars, including its per-night amenities
+        amenities (list): Amenity display strings (WiFi, AC, Bathtub, etc.)    
+        amenity_items (list): The Amenity objects behind them, for pricing
         room_id (str): Unique identifier for the room (e.g., "R001")
         room_type (str): Type of room (Single, Double, Suite)
     """
@@ -35,13 +99,49 @@ class Room:
             room_type (str): Type of room (Single/Double/Suite)
             max_guests (int): Maximum guest capacity
             num_beds (int): Number of beds
-            price (float): Nightly rate
-            amenities (list): Available amenities
+            price (float): Nightly rate, including the per-night amenities
+            amenities (list): Available amenities, Amenity objects or their display strings
         """
         self.room_id = room_id
         self.room_type = room_type
         self.max_guests = max_guests
         self.num_beds = num_beds
         self.price = price
-        self.amenities = amenities
+        items = [_amenity(entry) for entry in amenities]
+        self.amenity_items = [item for item in items if item is not None]
+        #Strings nobody priced (e.g. "None") are still shown as they are
+        self.amenities = [item.display if item is not None else entry for item, entry in zip(items, amenities)]
+
+    @property
+    def base_price(self):
+        """Nightly rate of the room alone, without its per-night amenities"""
+        return self.price - sum(item.price for item in self.amenity_items if item.per_night)
+
+    def has_amenity(self, name):
+        """True if the room has the amenity with this id, label or display text"""
+        name = str(name).strip()
+        return any(item.matches(name) for item in self.amenity_items) or name in (a.strip() for a in self.amenities)
+
+def default_rooms():
+    """
+    The hotel's room catalog, shared by the GUI and the command line tools.
+
+    Returns:
+        list: Room objects for every room in the hotel
+    """
+    return [
+        Room("R000", "Single", 1, 1, 100.0, ["None"]),
+        Room("R001", "Double", 1, 1, 150.0, ["None"]),
+        Room("R002", "Suite", 1, 1, 300.0, ["None"]),
+        Room("R003", "Single", 1, 1, 110.0, [AMENITIES["wifi"]]),
+        Room("R004", "Double", 1, 1, 125.0, [AMENITIES["air_conditioning"]]),
+        Room("R005", "Suite", 4, 2, 538.0, [AMENITIES["bathtub"]]),
+        Room("R006", "Suite", 4, 2, 552.0, [AMENITIES["mini_fridge"]]),
+        Room("R007", "Single", 1, 1, 135.0, [AMENITIES["wifi"], AMENITIES["air_conditioning"]]),
+        Room("R008", "Double", 2, 1, 223.0, [AMENITIES["wifi"], AMENITIES["air_conditioning"], AMENITIES["bathtub"]]),
+        Room("R009", "Suite", 4, 2, 340.0, [AMENITIES["bathtub"], AMENITIES["mini_fridge"]]),
+        Room("R0010", "Suite", 4, 2, 323.0, [AMENITIES["wifi"], AMENITIES["air_conditioning"], AMENITIES["bathtub"]]),
+        Room("R0011", "Suite", 4, 2, 375.0, [AMENITIES["wifi"], AMENITIES["air_conditioning"], AMENITIES["bathtub"],
+                                             AMENITIES["mini_fridge"]])
+    ]
 #```
@@ -0,0 +1,513 @@
+"""
+Hotel Booking System - Rate Calendar
+
+Nightly rates from pricing rules instead of one static Room.price:
+    SeasonRule     a yearly date range, e.g. Dec 20 - Jan 5 at 1.3x
+    WeekdayRule    some days of the week, e.g. Friday and Saturday at 1.15x
+    OccupancyRule  nights already this full, e.g. 80% booked at 1.2x (the highest threshold met applies)
+Every rule can be limited to some room types; rules that apply to the same
+night multiply.
+
+The rules are compiled into a rooms x days matrix of rate factors, so a
+stay's total is one slice-sum (Room.price x sum of the factors over its
+nights) and a whole search result is quoted in a single operation with
+quote_rooms. With no rules every factor is 1.0 and a quote is exactly
+nights * Room.price, the same as before rates existed.
+
+A guest's stay quote (quote_stays) is three parts:
+    room       the calendar rate of Room.base_price, the room without its amenities
+    amenities  each models.Amenity once per night or once per stay, never scaled by the rules
+    taxes      TAX_RATE of the two
+All rooms of a search result are quoted together: the amenity charges are
+a rooms x amenities matrix times each amenity's charge for the stay. With no
+rules and no tax the total is still exactly nights * Room.price, since the
+room prices already include their per-night amenities.
+
+Changing a rule recompiles only the days it covers, and occupancy comes
+from the daily rollups (rollups.py) with only the days whose occupancy
+moved recompiled, so the calendar stays current without being rebuilt.
+Occupancy is only read again when the rollups' version moved, and a batch
+of quotes (an import) refreshes it once up front with refresh_occupancy.
+
+Rules are read from rate_rules.json in the working folder, a JSON list like:
+    [{"kind": "season", "start": "12-20", "end": "01-05", "multiplier": 1.3},
+     {"kind": "weekday", "weekdays": [4, 5], "multiplier": 1.15, "room_types": ["Suite"]},
+     {"kind": "occupancy", "threshold": 0.8, "multiplier": 1.2}]
+
+Functions:
+    load_rules: Read pricing rules from a JSON file
+    get_calendar: The shared RateCalendar for the hotel's rooms
+    refresh_occupancy: Bring the shared calendar's occupancy up to date
+    quote_stays: Room, amenity and tax breakdown for every room of a search result
+    quote_stay: Total price of one stay
+    quote_rooms: Totals for every room of a search result
+
+Classes:
+    SeasonRule, WeekdayRule, OccupancyRule: Pricing rules
+    RateCalendar: The compiled rooms x days rate factors
+    StayQuote: Result of quote_stays
+"""
+
+import json
+import os
+import threading
+from datetime import date, datetime
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from models import default_rooms
+
+RULES_FILE = "rate_rules.json"
+#Days compiled up front from today, the calendar grows when a stay falls outside
+DEFAULT_DAYS = 2 * 365
+#Tax on room and amenities as a fraction, e.g. 0.12 for 12%
+TAX_RATE = 0.0
+_EPOCH = date(1970, 1, 1).toordinal()
+
+
+def _day_number(text):
+    try:
+        #strptime like utils.validate_date, which also takes unpadded dates such as 2026-1-4
+        return datetime.strptime(text, "%Y-%m-%d").toordinal() - _EPOCH
+    except (TypeError, ValueError):
+        raise ValueError(f"Invalid date {text!r}, expected YYYY-MM-DD")
+
+
+class _Rule:
+    def __init__(self, multiplier, room_types=None):
+        self.multiplier = float(multiplier)
+        self.room_types = set(room_types) if room_types else None
+
+    def room_mask(self, types):
+        """Which rooms (by room type array) the rule applies to"""
+        if self.room_types is None:
+            return np.ones(len(types), dtype=bool)
+        return np.isin(types, list(self.room_types))
+
+
+class SeasonRule(_Rule):
+    """
+    A multiplier for a date range that comes back every year.
+
+    Attributes:
+        start (str): First day "MM-DD"
+        end (str): Last day "MM-DD", may be before start for a range over new year
+        multiplier (float): Rate factor
+        room_types (set): Room types it applies to, None for all
+    """
+
+    def __init__(self, start, end, multiplier, room_types=None):
+        super().__init__(multiplier, room_types)
+        self.start, self.end = start, end
+
+    def day_mask(self, days, occupancy):
+        dates = days.astype("datetime64[D]")
+        months = dates.astype("datetime64[M]")
+        #Month and day as one comparable number, 12-20 -> 1220
+        month_day = (months.astype(np.int64) % 12 + 1) * 100 + (dates - months).astype(np.int64) + 1
+        start, end = (int(text[:2]) * 100 + int(text[3:5]) for text in (self.start, self.end))
+        if start <= end:
+            return (month_day >= start) & (month_day <= end)
+        return (month_day >= start) | (month_day <= end)
+
+
+class WeekdayRule(_Rule):
+    """
+    A multiplier for some days of the week.
+
+    Attributes:
+        weekdays (set): Monday is 0, Sunday is 6
+        multiplier (float): Rate factor
+        room_types (set): Room types it applies to, None for all
+    """
+
+    def __init__(self, weekdays, multiplier, room_types=None):
+        super().__init__(multiplier, room_types)
+        self.weekdays = set(weekdays)
+
+    def day_mask(self, days, occupancy):
+        #1970-01-01 was a Thursday, so Monday based weekdays are (days + 3) % 7
+        return np.isin((days + 3) % 7, list(self.weekdays))
+
+
+class OccupancyRule(_Rule):
+    """
+    A multiplier for nights that are already at least this full.
+
+    Attributes:
+        threshold (float): Hotel occupancy 0-1 from which it applies
+        multiplier (float): Rate factor
+        room_types (set): Room types it applies to, None for all
+    """
+
+    def __init__(self, threshold, multiplier, room_types=None):
+        super().__init__(multiplier, room_types)
+        self.threshold = float(threshold)
+
+    def day_mask(self, days, occupancy):
+        return occupancy >= self.threshold
+
+
+_KINDS = {"season": (SeasonRule, ("start", "end")), "weekday": (WeekdayRule, ("weekdays",)),
+          "occupancy": (OccupancyRule, ("threshold",))}
+
+
+def load_rules(path=RULES_FILE):
+    """
+    Read pricing rules from a JSON file.
+
+    Args:
+        path (str): JSON list of rules, see the module docstring
+
+    Returns:
+        list: Rule objects, empty if the file doesn't exist
+
+    Raises:
+        ValueError: A rule the file can't describe
+    """
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            entries = json.load(f)
+    except FileNotFoundError:
+        return []
+    rules = []
+    for entry in entries:
+        if entry.get("kind") not in _KINDS:
+            raise ValueError(f"Unknown rate rule kind {entry.get('kind')!r}")
+        cls, fields = _KINDS[entry["kind"]]
+        try:
+            rules.append(cls(*(entry[field] for field in fields), entry["multiplier"], entry.get("room_types")))
+        except KeyError as e:
+            raise ValueError(f"Rate rule {entry} is missing {e}")
+    return rules
+
+
+class RateCalendar:
+    """
+    Rate factors for every room and night, compiled from the rules.
+
+    The factors only depend on a room's type, so a room that isn't in the
+    catalog (or is at another price) is quoted from a row of its type.
+
+    Attributes:
+        rooms (list): Room catalog, one matrix row each
+        rules (list): Pricing rules in force
+        first (int): Day number (days since 1970-01-01) of column 0
+        factors (np.ndarray): [room, day] rate factor, the nightly rate is Room.price * factor
+        occupancy (np.ndarray): [day] hotel occupancy 0-1 the occupancy rules were compiled with
+    """
+
+    def __init__(self, rooms, rules=(), start=None, days=DEFAULT_DAYS):
+        """
+        Args:
+            rooms (list): Room catalog
+            rules (iterable): Pricing rules
+            start (str): First day "YYYY-MM-DD", defaults to today
+            days (int): Days to compile up front
+        """
+        self.rooms = list(rooms)
+        self.rules = list(rules)
+        self.row = {room.room_id: i for i, room in enumerate(self.rooms)}
+        self._types = np.array([room.room_type for room in self.rooms], dtype=object)
+        self.first = _day_number(start) if start else date.today().toordinal() - _EPOCH
+        self.factors = np.ones((len(self.rooms), 0))
+        self.occupancy = np.zeros(0)
+        self._occupancy_version = None
+        self._lock = threading.RLock()
+        self._ensure(self.first, self.first + days)
+
+    def _compile(self, columns):
+        """Recompute the factors for some column indexes"""
+        if not len(columns):
+            return
+        days = self.first + columns
+        occupancy = self.occupancy[columns]
+        factors = np.ones((len(self._types), len(columns)))
+        tier = np.ones_like(factors)
+        #Seasons and weekdays stack; of the occupancy tiers only the highest one met counts
+        for rule in sorted(self.rules, key=lambda rule: getattr(rule, "threshold", -1.0)):
+            applies = rule.room_mask(self._types)[:, None] & rule.day_mask(days, occupancy)[None, :]
+            if isinstance(rule, OccupancyRule):
+                tier = np.where(applies, rule.multiplier, tier)
+            else:
+                factors = np.where(applies, factors * rule.multiplier, factors)
+        self.factors[:, columns] = factors * tier
+
+    def _ensure(self, low, high):
+        """Grow the calendar to cover day numbers low .. high-1"""
+        before = max(0, self.first - low)
+        after = max(0, high - (self.first + self.factors.shape[1]))
+        if not before and not after:
+            return
+        self.factors = np.pad(self.factors, ((0, 0), (before, after)), constant_values=1.0)
+        self.occupancy = np.pad(self.occupancy, (before, after))
+        self.first -= before
+        width = self.factors.shape[1]
+        self._compile(np.concatenate([np.arange(before), np.arange(width - after, width)]))
+
+    def add_rule(self, rule):
+        """Put a rule in force, recompiling only the days it covers"""
+        with self._lock:
+            self.rules.append(rule)
+            self._compile(np.flatnonzero(rule.day_mask(self.first + np.arange(self.factors.shape[1]), self.occupancy)))
+
+    def remove_rule(self, rule):
+        """Take a rule out of force, recompiling only the days it covered"""
+        with self._lock:
+            self.rules.remove(rule)
+            self._compile(np.flatnonzero(rule.day_mask(self.first + np.arange(self.factors.shape[1]), self.occupancy)))
+
+    def set_occupancy(self, start, occupancy):
+        """
+        Update hotel occupancy for a run of days, recompiling the days that changed.
+
+        Args:
+            start (str): First day "YYYY-MM-DD"
+            occupancy (sequence): Occupancy 0-1 for start and the days after it
+        """
+        with self._lock:
+            first = _day_number(start)
+            occupancy = np.asarray(occupancy, dtype=np.float64)
+            self._ensure(first, first + len(occupancy))
+            offset = first - self.first
+            changed = np.flatnonzero(self.occupancy[offset:offset + len(occupancy)] != occupancy) + offset
+            self.occupancy[changed] = occupancy[changed - offset]
+            if any(isinstance(rule, OccupancyRule) for rule in self.rules):
+                self._compile(changed)
+
+    def refresh_occupancy(self):
+        """
+        Take occupancy for the calendar's days from the daily rollups (only matters with occupancy rules).
+
+        Does nothing unless the rollups changed since the last refresh.
+        """
+        if not any(isinstance(rule, OccupancyRule) for rule in self.rules):
+            return
+        import rollups
+        version = rollups.rollup_store.version()
+        with self._lock:
+            if version == self._occupancy_version:
+                return
+            days = (self.first + np.arange(self.factors.shape[1])).astype("datetime64[D]").astype(str)
+            table = rollups.rollup_store.table(days[0], str(np.datetime64(days[-1]) + 1))
+            sold = np.array([sum(values[0] for values in table.get(day, {}).values()) for day in days])
+            self.set_occupancy(days[0], sold / max(1, len(self.rooms)))
+            self._occupancy_version = version
+
+    def _span(self, check_in, check_out):
+        low, high = _day_number(check_in), _day_number(check_out)
+        if high <= low:
+            raise ValueError("check_out must be after check_in")
+        self._ensure(low, high)
+        return low - self.first, high - self.first
+
+    def _row(self, room):
+        """Matrix row priced like room: its own, or one of the same type (added if the type is new)"""
+        row = self.row.get(room.room_id)
+        if row is not None and self._types[row] == room.room_type:
+            return row
+        same_type = np.flatnonzero(self._types == room.room_type)
+        if len(same_type):
+            return int(same_type[0])
+        self._types = np.append(self._types, np.array([room.room_type], dtype=object))
+        self.factors = np.vstack([self.factors, np.ones(self.factors.shape[1])])
+        self._compile(np.arange(self.factors.shape[1]))
+        return len(self._types) - 1
+
+    def nightly_rates(self, room, check_in, check_out):
+        """
+        The rate of each night of a stay.
+
+        Returns:
+            np.ndarray: One rate per night
+        """
+        with self._lock:
+            a, b = self._span(check_in, check_out)
+            row = self._row(room)
+            return room.price * self.factors[row, a:b]
+
+    def quote(self, room, check_in, check_out):
+        """
+        Total room price of one stay.
+
+        Args:
+            room (Room): Room to quote
+            check_in (str): Check-in date "YYYY-MM-DD"
+            check_out (str): Check-out date "YYYY-MM-DD"
+
+        Returns:
+            float: The total, exactly nights * room.price when no rule applies
+        """
+        with self._lock:
+            a, b = self._span(check_in, check_out)
+            row = self._row(room)
+            return float(room.price * self.factors[row, a:b].sum())
+
+    def quote_rooms(self, rooms, check_in, check_out, prices=None):
+        """
+        Totals for many rooms over the same stay, in one operation.
+
+        Args:
+            rooms (list): Room objects
+            check_in (str): Check-in date "YYYY-MM-DD"
+            check_out (str): Check-out date "YYYY-MM-DD"
+            prices (sequence): Nightly prices to apply the factors to, defaults to each Room.price
+
+        Returns:
+            np.ndarray: Total per room, in rooms order
+        """
+        with self._lock:
+            a, b = self._span(check_in, check_out)
+            rows = np.array([self._row(room) for room in rooms], dtype=np.intp)
+            if prices is None:
+                prices = [room.price for room in rooms]
+            prices = np.asarray(prices, dtype=np.float64)
+            return prices * self.factors[rows, a:b].sum(axis=1)
+
+
+_calendar = None
+_calendar_lock = threading.Lock()
+
+
+def get_calendar():
+    """
+    The shared RateCalendar for models.default_rooms() and the rules in RULES_FILE.
+
+    Returns:
+        RateCalendar: The calendar, None without NumPy (then there can be no rules either)
+
+    Raises:
+        ValueError: RULES_FILE has rules but NumPy isn't installed
+    """
+    global _calendar
+    with _calendar_lock:
+        if _calendar is None and np is not None:
+            _calendar = RateCalendar(default_rooms(), load_rules())
+        elif np is None and os.path.exists(RULES_FILE):
+            raise ValueError(f"Rate rules in {RULES_FILE} need NumPy")
+    return _calendar
+
+
+def refresh_occupancy():
+    """Bring the shared calendar's occupancy up to date with the daily rollups, once for a batch of quotes"""
+    calendar = get_calendar()
+    if calendar is not None:
+        calendar.refresh_occupancy()
+
+
+class StayQuote:
+    """
+    Price breakdown for rooms over the same stay, one entry per room.
+
+    Attributes:
+        nights (int): Nights in the stay
+        room (np.ndarray): Room charges, the calendar rate of Room.base_price
+        amenities (np.ndarray): Amenity charges
+        taxes (np.ndarray): TAX_RATE of room + amenities
+        total (np.ndarray): room + amenities + taxes
+    Without NumPy these are plain lists.
+    """
+
+    def __init__(self, nights, room, amenities, tax_rate):
+        self.nights = nights
+        self.room = room
+        self.amenities = amenities
+        if np is None:
+            self.taxes = [(r + a) * tax_rate for r, a in zip(room, amenities)]
+            self.total = [r + a + t for r, a, t in zip(room, amenities, self.taxes)]
+        else:
+            self.taxes = (room + amenities) * tax_rate
+            self.total = room + amenities + self.taxes
+
+    def breakdown(self, i):
+        """
+        One room's quote as a plain dict.
+
+        Args:
+            i (int): Position of the room in the quoted list
+
+        Returns:
+            dict: nights, room, amenities, taxes and total
+        """
+        return {"nights": self.nights, "room": float(self.room[i]), "amenities": float(self.amenities[i]),
+                "taxes": float(self.taxes[i]), "total": float(self.total[i])}
+
+
+def _amenity_charges(rooms, nights):
+    """Amenity charge per room: a rooms x amenities matrix times each amenity's charge for the stay"""
+    catalog = {}
+    for room in rooms:
+        for item in room.amenity_items:
+            catalog.setdefault(item.amenity_id, item)
+    if not catalog:
+        return np.zeros(len(rooms))
+    column = {amenity_id: j for j, amenity_id in enumerate(catalog)}
+    has = np.zeros((len(rooms), len(catalog)))
+    for i, room in enumerate(rooms):
+        has[i, [column[item.amenity_id] for item in room.amenity_items]] = 1.0
+    charge = np.array([item.charge(nights) for item in catalog.values()])
+    return has @ charge
+
+
+def quote_stays(rooms, check_in, check_out, tax_rate=None, refresh=True):
+    """
+    Room, amenity and tax breakdown for every room of a search result over the same stay.
+
+    Args:
+        rooms (list): Room objects
+        check_in (str): Check-in date "YYYY-MM-DD"
+        check_out (str): Check-out date "YYYY-MM-DD"
+        tax_rate (float): Defaults to TAX_RATE
+        refresh (bool): Check the rollups for new occupancy first; False when
+            the caller already called refresh_occupancy for its batch
+
+    Returns:
+        StayQuote: One entry per room, in rooms order
+    """
+    tax_rate = TAX_RATE if tax_rate is None else tax_rate
+    nights = _day_number(check_out) - _day_number(check_in)
+    if nights <= 0:
+        raise ValueError("check_out must be after check_in")
+    calendar = get_calendar()
+    if calendar is None:
+        #Without NumPy there are no rules, so the same sums one room at a time
+        return StayQuote(nights, [nights * r.base_price for r in rooms],
+                         [sum(item.charge(nights) for item in r.amenity_items) for r in rooms], tax_rate)
+    if refresh:
+        calendar.refresh_occupancy()
+    room = calendar.quote_rooms(rooms, check_in, check_out, [r.base_price for r in rooms])
+    return StayQuote(nights, room, _amenity_charges(rooms, nights), tax_rate)
+
+
+def quote_stay(room, check_in, check_out, refresh=True):
+    """
+    Total price of one stay: room, amenities and taxes (see quote_stays).
+
+    Args:
+        room (Room): Room to quote
+        check_in (str): Check-in date "YYYY-MM-DD"
+        check_out (str): Check-out date "YYYY-MM-DD"
+        refresh (bool): Check the rollups for new occupancy first, see quote_stays
+
+    Returns:
+        float: The total, nights * room.price when no rule or tax applies
+    """
+    return float(quote_stays([room], check_in, check_out, refresh=refresh).total[0])
+
+
+def quote_rooms(rooms, check_in, check_out):
+    """
+    Totals for every room of a search result over the same stay.
+
+    Args:
+        rooms (list): Room objects
+        check_in (str): Check-in date "YYYY-MM-DD"
+        check_out (str): Check-out date "YYYY-MM-DD"
+
+    Returns:
+        list: Total per room, in rooms order
+    """
+    return [float(total) for total in quote_stays(rooms, check_in, check_out).total]
@@ -0,0 +1,320 @@
+"""
+Hotel Booking System - Booking Exports
+
+Writes bookings out for spreadsheets and analysis tools instead of the
+report's free text:
+    csv    one row per booking, EXPORT_FIELDS as the header
+    npz    NumPy columns (np.load), one array per field
+    arrow  Arrow IPC file (pyarrow.ipc.open_file, pandas, polars, DuckDB), when pyarrow is installed
+
+Bookings are streamed from storage.iter_bookings and written CHUNK_ROWS at
+a time, so memory stays flat however many millions of rows are exported.
+
+Layout of the .npz (every array is a plain .npy, no pickles, stored
+uncompressed so it loads at disk speed):
+    check_in, check_out            datetime64[D], NaT when missing
+    nights                         int32, -1 when missing
+    total_price                    float64, NaN when missing
+    room_id, room_type, status     int32 codes into <name>_labels
+    confirmation_number, guest_*   UTF-8 in <name>_data with <name>_offsets
+                                   (row i is data[offsets[i]:offsets[i+1]])
+read_npz turns these back into ordinary arrays.
+
+Functions:
+    available_formats: Formats that can be written with the installed packages
+    write_csv: Stream bookings into a CSV file
+    write_npz: Stream bookings into NumPy columns
+    write_arrow: Stream bookings into an Arrow IPC file
+    export_bookings: Export a date range from storage to a file
+    read_npz: Load an .npz export back into columns
+"""
+
+import csv
+import itertools
+import os
+import shutil
+import tempfile
+import zipfile
+
+import storage
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+try:
+    import pyarrow as pa
+    import pyarrow.ipc
+except ImportError:
+    pa = None
+
+EXPORT_FIELDS = ["confirmation_number", "room_id", "guest_name", "guest_email", "guest_phone", "room_type",
+                 "check_in", "check_out", "nights", "total_price", "status"]
+#Rows converted and written per step
+CHUNK_ROWS = 65536
+
+_DATE_FIELDS = ("check_in", "check_out")
+_CATEGORY_FIELDS = ("room_id", "room_type", "status")
+_TEXT_FIELDS = ("confirmation_number", "guest_name", "guest_email", "guest_phone")
+
+
+def available_formats():
+    """
+    Formats that can be written with the installed packages.
+
+    Returns:
+        list: Some of "csv", "npz", "arrow"
+    """
+    return ["csv"] + (["npz"] if np is not None else []) + (["arrow"] if pa is not None and np is not None else [])
+
+
+def _chunks(bookings, size):
+    bookings = iter(bookings)
+    while True:
+        chunk = list(itertools.islice(bookings, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def write_csv(bookings, f):
+    """
+    Stream bookings into a CSV file, one row each.
+
+    Args:
+        bookings (iterable): Booking dictionaries
+        f: Text stream opened with newline=""
+
+    Returns:
+        int: Number of bookings written
+    """
+    writer = csv.DictWriter(f, EXPORT_FIELDS, extrasaction="ignore")
+    writer.writeheader()
+    count = 0
+    for chunk in _chunks(bookings, CHUNK_ROWS):
+        writer.writerows(chunk)
+        count += len(chunk)
+    return count
+
+
+def _dates(values):
+    #Zero-padded first, NumPy reads "2025-12-5" as NaT
+    values = [storage.normalize_date(value) for value in values]
+    try:
+        return np.array([value or "NaT" for value in values], dtype="datetime64[D]")
+    except ValueError:
+        #A malformed date somewhere in the chunk, convert one at a time
+        days = []
+        for value in values:
+            try:
+                days.append(np.datetime64(value or "NaT", "D"))
+            except ValueError:
+                days.append(np.datetime64("NaT", "D"))
+        return np.array(days, dtype="datetime64[D]")
+
+
+def _numbers(values, dtype, missing):
+    values = [missing if value is None or value == "" else value for value in values]
+    try:
+        return np.array(values, dtype=dtype)
+    except (TypeError, ValueError, OverflowError):
+        converted = []
+        for value in values:
+            try:
+                converted.append(np.array(value, dtype=dtype))
+            except (TypeError, ValueError, OverflowError):
+                converted.append(missing)
+        return np.array(converted, dtype=dtype)
+
+
+def _columns(chunk, categories):
+    """Fixed width NumPy columns for one chunk; categories maps field -> {label: code} and grows"""
+    columns = {field: _dates([b.get(field) for b in chunk]) for field in _DATE_FIELDS}
+    columns["nights"] = _numbers([b.get("nights") for b in chunk], np.int32, -1)
+    columns["total_price"] = _numbers([b.get("total_price") for b in chunk], np.float64, np.nan)
+    for field in _CATEGORY_FIELDS:
+        codes = categories[field]
+        columns[field] = np.array([codes.setdefault(str(b.get(field) or ""), len(codes)) for b in chunk],
+                                  dtype=np.int32)
+    return columns
+
+
+class _Spool:
+    """One column written to a temporary file chunk by chunk, then copied into the .npz"""
+
+    def __init__(self, directory, name, dtype):
+        self.name, self.dtype, self.length = name, np.dtype(dtype), 0
+        self.file = open(os.path.join(directory, name), "w+b")
+
+    def write(self, array):
+        self.file.write(np.ascontiguousarray(array, dtype=self.dtype).tobytes())
+        self.length += len(array)
+
+    def copy_into(self, archive):
+        with archive.open(self.name + ".npy", "w", force_zip64=True) as out:
+            np.lib.format.write_array_header_1_0(out, {"descr": np.lib.format.dtype_to_descr(self.dtype),
+                                                       "fortran_order": False, "shape": (self.length,)})
+            self.file.seek(0)
+            shutil.copyfileobj(self.file, out, 1024 * 1024)
+        self.file.close()
+
+
+def write_npz(bookings, path, chunk_rows=CHUNK_ROWS):
+    """
+    Stream bookings into a NumPy .npz of columns (see the module docstring for the layout).
+
+    Each column is spooled to a temporary file next to path and the
+    archive is assembled from those at the end, so only one chunk is ever
+    held in memory.
+
+    Args:
+        bookings (iterable): Booking dictionaries
+        path (str): .npz file to write
+        chunk_rows (int): Rows converted per step
+
+    Returns:
+        int: Number of bookings written
+
+    Raises:
+        ValueError: NumPy isn't installed
+    """
+    if np is None:
+        raise ValueError("The npz export needs NumPy")
+    categories = {field: {} for field in _CATEGORY_FIELDS}
+    with tempfile.TemporaryDirectory(dir=os.path.dirname(os.path.abspath(path))) as tmp:
+        spools = {field: _Spool(tmp, field, "datetime64[D]") for field in _DATE_FIELDS}
+        spools["nights"] = _Spool(tmp, "nights", np.int32)
+        spools["total_price"] = _Spool(tmp, "total_price", np.float64)
+        spools.update((field, _Spool(tmp, field, np.int32)) for field in _CATEGORY_FIELDS)
+        ends = {}
+        for field in _TEXT_FIELDS:
+            spools[field + "_data"] = _Spool(tmp, field + "_data", np.uint8)
+            spools[field + "_offsets"] = _Spool(tmp, field + "_offsets", np.int64)
+            spools[field + "_offsets"].write(np.zeros(1, dtype=np.int64))
+            ends[field] = 0
+        count = 0
+        for chunk in _chunks(bookings, chunk_rows):
+            for field, column in _columns(chunk, categories).items():
+                spools[field].write(column)
+            for field in _TEXT_FIELDS:
+                encoded = [str(b.get(field) or "").encode("utf-8") for b in chunk]
+                offsets = ends[field] + np.cumsum(np.fromiter(map(len, encoded), np.int64, len(encoded)))
+                spools[field + "_data"].write(np.frombuffer(b"".join(encoded), dtype=np.uint8))
+                spools[field + "_offsets"].write(offsets)
+                ends[field] = int(offsets[-1])
+            count += len(chunk)
+        tmp_path = path + ".tmp"
+        with zipfile.ZipFile(tmp_path, "w", zipfile.ZIP_STORED, allowZip64=True) as archive:
+            for spool in spools.values():
+                spool.copy_into(archive)
+            for field, codes in categories.items():
+                with archive.open(field + "_labels.npy", "w") as out:
+                    np.lib.format.write_array(out, np.array(list(codes), dtype=str), allow_pickle=False)
+        os.replace(tmp_path, path)
+    return count
+
+
+def read_npz(path, text=True):
+    """
+    Load an .npz export back into one array per field.
+
+    Args:
+        path (str): File written by write_npz
+        text (bool): Also decode the free text fields (the slow part for big exports)
+
+    Returns:
+        dict: Field -> np.ndarray; room_id/room_type/status as strings, text fields as object arrays of str
+    """
+    with np.load(path, allow_pickle=False) as archive:
+        columns = {field: archive[field] for field in _DATE_FIELDS + ("nights", "total_price")}
+        for field in _CATEGORY_FIELDS:
+            labels = archive[field + "_labels"]
+            columns[field] = labels[archive[field]] if len(labels) else np.array([], dtype=str)
+        if text:
+            for field in _TEXT_FIELDS:
+                data, offsets = archive[field + "_data"].tobytes(), archive[field + "_offsets"]
+                columns[field] = np.array([data[offsets[i]:offsets[i + 1]].decode("utf-8")
+                                           for i in range(len(offsets) - 1)], dtype=object)
+    return columns
+
+
+def write_arrow(bookings, path, chunk_rows=CHUNK_ROWS):
+    """
+    Stream bookings into an Arrow IPC file, one record batch per chunk.
+
+    Args:
+        bookings (iterable): Booking dictionaries
+        path (str): .arrow file to write
+        chunk_rows (int): Rows per record batch
+
+    Returns:
+        int: Number of bookings written
+
+    Raises:
+        ValueError: pyarrow (or NumPy) isn't installed
+    """
+    if pa is None or np is None:
+        raise ValueError("The arrow export needs pyarrow and NumPy")
+    schema = pa.schema([(field, pa.string()) for field in _TEXT_FIELDS]
+                       + [(field, pa.dictionary(pa.int32(), pa.string())) for field in _CATEGORY_FIELDS]
+                       + [(field, pa.date32()) for field in _DATE_FIELDS]
+                       + [("nights", pa.int32()), ("total_price", pa.float64())])
+    count = 0
+    tmp_path = path + ".tmp"
+    with pa.OSFile(tmp_path, "wb") as sink, pa.ipc.new_file(sink, schema) as writer:
+        for chunk in _chunks(bookings, chunk_rows):
+            #Labels are per batch here, Arrow dictionaries can change between batches
+            categories = {field: {} for field in _CATEGORY_FIELDS}
+            columns = _columns(chunk, categories)
+            arrays = [pa.array([str(b.get(field) or "") for b in chunk], pa.string()) for field in _TEXT_FIELDS]
+            arrays += [pa.DictionaryArray.from_arrays(pa.array(columns[field]), pa.array(list(categories[field]), pa.string()))
+                       for field in _CATEGORY_FIELDS]
+            arrays += [pa.array(columns[field], pa.date32(), mask=np.isnat(columns[field])) for field in _DATE_FIELDS]
+            arrays += [pa.array(columns["nights"], pa.int32(), mask=columns["nights"] < 0),
+                       pa.array(columns["total_price"], pa.float64(), mask=np.isnan(columns["total_price"]))]
+            writer.write_batch(pa.RecordBatch.from_arrays(arrays, schema=schema))
+            count += len(chunk)
+    os.replace(tmp_path, path)
+    return count
+
+
+def export_bookings(path, format=None, start=None, end=None, status=None, include_cold=True):
+    """
+    Export bookings from storage to a file.
+
+    Args:
+        path (str): File to write
+        format (str): "csv", "npz" or "arrow", defaults to the file extension
+        start (str): Only bookings checking in on or after this date "YYYY-MM-DD"
+        end (str): Only bookings checking in on or before this date "YYYY-MM-DD"
+        status (str): Only bookings with this status, e.g. "CONFIRMED"
+        include_cold (bool): Also read the compressed archive
+
+    Returns:
+        int: Number of bookings written
+
+    Raises:
+        ValueError: Unknown format, or one needing a package that isn't installed
+    """
+    format = format or os.path.splitext(path)[1].lstrip(".").lower()
+    if format == "feather":
+        format = "arrow"
+
+    #Dates typed as "2025-12-5" compare correctly as strings once they are zero-padded
+    start, end = storage.normalize_date(start), storage.normalize_date(end)
+
+    def wanted(b):
+        check_in = str(storage.normalize_date(b.get('check_in')) or "")
+        if (start and check_in < start) or (end and check_in > end):
+            return False
+        return status is None or b.get('status') == status
+
+    bookings = storage.iter_bookings(wanted, include_cold, start, end)
+    if format == "csv":
+        with open(path, "w", encoding="utf-8", newline="") as f:
+            return write_csv(bookings, f)
+    if format == "npz":
+        return write_npz(bookings, path)
+    if format == "arrow":
+        return write_arrow(bookings, path)
+    raise ValueError(f"Unknown export format {format!r}, expected one of {', '.join(available_formats())}")
@@ -0,0 +1,400 @@
+"""
+Hotel Booking System - Parallel Report Jobs
+
+Reports over a long booking history are split by partition file into
+contiguous shards of about equal size. Each shard is aggregated in a worker
+process (a ProcessPoolExecutor, so every core is used and the Tk main
+thread never does the work), and the partial results are merged in shard
+order. Small histories are aggregated in process, since starting workers
+would cost more than it saves.
+
+A report holds:
+    - total / confirmed / cancelled counts and confirmed revenue
+    - by_month: room nights sold, occupancy, confirmed bookings and revenue per calendar month
+    - by_room_type: bookings, room nights and revenue per room type
+    - details: the per-booking text blocks of the admin report, if asked for
+    - forecast: expected occupancy per week for the next 90 days (forecast.py), if asked for
+
+The forecast runs on a thread of this process rather than in the pool, so
+it uses this process's shared model (forecast.get_model), which is kept
+current as bookings are written instead of being loaded for every report.
+
+Functions:
+    shard_paths: Split partition files into contiguous, size balanced shards
+    aggregate_shard: Aggregate one shard (what each worker runs)
+    merge_partials: Combine shard results into one report
+    run_report: Build a report, blocking until it is done
+    start_report_job: Build a report in the background, reporting progress through Tk's after()
+    format_report: The admin report text for a finished report
+
+Classes:
+    ReportJob: A report being built by the worker pool
+"""
+
+import calendar
+import importlib.util
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+import storage
+from models import default_rooms
+
+#Below this much booking data a report is aggregated in process
+MIN_PARALLEL_BYTES = 4 * 1024 * 1024
+#Shards per worker, more shards means smoother progress updates
+SHARDS_PER_WORKER = 4
+POLL_MS = 100
+
+_pool = None
+_forecast_pool = None
+
+
+def _get_pool():
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor()
+    return _pool
+
+
+def _get_forecast_pool():
+    global _forecast_pool
+    if _forecast_pool is None:
+        _forecast_pool = ThreadPoolExecutor(max_workers=1)
+    return _forecast_pool
+
+
+def _size(path):
+    try:
+        return os.path.getsize(path)
+    except OSError:
+        return 0
+
+
+def shard_paths(paths, shards):
+    """
+    Split partition files into contiguous runs of roughly equal total size.
+
+    Keeping each shard a contiguous run means merging the shards in order
+    lists bookings in the same order as storage.iter_bookings.
+
+    Args:
+        paths (list): Partition files in read order
+        shards (int): Number of shards wanted
+
+    Returns:
+        list: Lists of paths, none of them empty
+    """
+    sizes = [_size(path) for path in paths]
+    target = max(1, sum(sizes) / max(1, shards))
+    result, current, current_size = [], [], 0
+    for path, size in zip(paths, sizes):
+        current.append(path)
+        current_size += size
+        if current_size >= target:
+            result.append(current)
+            current, current_size = [], 0
+    if current:
+        result.append(current)
+    return result
+
+
+def _parse(day, dates):
+    parsed = dates.get(day, False)
+    if parsed is False:
+        try:
+            parsed = datetime.strptime(day, "%Y-%m-%d")
+        except (TypeError, ValueError):
+            parsed = None
+        dates[day] = parsed
+    return parsed
+
+
+def _format_booking(b):
+    return f"""   
+Confirmation #: {b.get('confirmation_number')}
+Guest: {b.get('guest_name')}
+Email: {b.get('guest_email')}
+Room: {b.get('room_type')}
+Check-In Date: {b.get('check_in')}
+Check-Out Date: {b.get('check_out')}
+Total: ${b.get('total_price')}
+Status: {b.get('status')}
+{'-'*50}"""
+
+
+def _forecast_rows():
+    #NumPy is optional for reports, the forecast section is just left out without it
+    if importlib.util.find_spec("numpy") is None:
+        return []
+    from forecast import forecast_summary
+    return forecast_summary()
+
+
+def _empty():
+    return {"total": 0, "confirmed": 0, "cancelled": 0, "revenue": 0.0,
+            "by_month": {}, "by_room_type": {}, "details": []}
+
+
+def aggregate_shard(paths, start=None, end=None, details=False):
+    """
+    Aggregate the bookings in some partition files.
+
+    Args:
+        paths (list): Partition files to read
+        start (str): Only bookings checking in on or after this date
+        end (str): Only bookings checking in on or before this date
+        details (bool): Also format each booking's report text
+
+    Returns:
+        dict: Partial report, see merge_partials
+    """
+    dates = {}
+    first = _parse(start, dates) if start else None
+    last = _parse(end, dates) if end else None
+    partial = _empty()
+    by_month, by_type = partial["by_month"], partial["by_room_type"]
+    for path in paths:
+        for b in storage._iter_partition(path):
+            check_in = _parse(b.get('check_in'), dates)
+            if (first or last) and (check_in is None or (first and check_in < first) or (last and check_in > last)):
+                continue
+            partial["total"] += 1
+            if details:
+                partial["details"].append(_format_booking(b))
+            status = b.get('status')
+            if status == 'CANCELLED':
+                partial["cancelled"] += 1
+            if status != 'CONFIRMED':
+                continue
+            partial["confirmed"] += 1
+            price = b.get('total_price', 0)
+            partial["revenue"] += price
+            check_out = _parse(b.get('check_out'), dates)
+            nights = (check_out - check_in).days if check_in and check_out and check_out > check_in else 0
+            room_type = by_type.setdefault(b.get('room_type'), {"bookings": 0, "room_nights": 0, "revenue": 0.0})
+            room_type["bookings"] += 1
+            room_type["room_nights"] += nights
+            room_type["revenue"] += price
+            if not nights:
+                continue
+            month = by_month.setdefault(check_in.strftime("%Y-%m"), {"bookings": 0, "room_nights": 0, "revenue": 0.0})
+            month["bookings"] += 1
+            month["revenue"] += price
+            #A stay over a month end counts its nights in each month
+            day = check_in
+            while day < check_out:
+                next_month = (day.replace(day=1) + timedelta(days=32)).replace(day=1)
+                stop = min(check_out, next_month)
+                key = day.strftime("%Y-%m")
+                by_month.setdefault(key, {"bookings": 0, "room_nights": 0, "revenue": 0.0})["room_nights"] += (stop - day).days
+                day = stop
+    return partial
+
+
+def merge_partials(partials, room_count=None):
+    """
+    Combine shard results, in order, into one report.
+
+    Args:
+        partials (iterable): Results of aggregate_shard
+        room_count (int): Rooms in the hotel for occupancy, defaults to the room catalog size
+
+    Returns:
+        dict: total, confirmed, cancelled, revenue, average_value, by_month
+            (with occupancy as a 0-1 fraction), by_room_type and details
+    """
+    report = _empty()
+    for partial in partials:
+        for key in ("total", "confirmed", "cancelled", "revenue"):
+            report[key] += partial[key]
+        for group in ("by_month", "by_room_type"):
+            for name, values in partial[group].items():
+                merged = report[group].setdefault(name, {"bookings": 0, "room_nights": 0, "revenue": 0.0})
+                for key, value in values.items():
+                    merged[key] += value
+        report["details"].extend(partial["details"])
+    room_count = room_count or len(default_rooms())
+    for key, month in report["by_month"].items():
+        year, number = map(int, key.split("-"))
+        month["occupancy"] = month["room_nights"] / (room_count * calendar.monthrange(year, number)[1])
+    report["by_month"] = dict(sorted(report["by_month"].items()))
+    report["average_value"] = report["revenue"] / report["confirmed"] if report["confirmed"] else 0.0
+    return report
+
+
+class ReportJob:
+    """
+    A report being built, in the worker pool or (for small histories) right away.
+
+    Attributes:
+        total (int): Number of shards
+        cancelled (bool): Whether cancel() was called
+    """
+
+    def __init__(self, start=None, end=None, details=False, include_cold=True, workers=None, forecast=False):
+        """
+        Args:
+            start (str): Only bookings checking in on or after this date "YYYY-MM-DD"
+            end (str): Only bookings checking in on or before this date "YYYY-MM-DD"
+            details (bool): Include each booking's report text
+            include_cold (bool): Also read the compressed archive
+            workers (int): Worker processes to plan shards for, defaults to the CPU count
+            forecast (bool): Add the occupancy forecast for the coming weeks
+        """
+        paths = storage._partition_paths(include_cold, start, end)
+        self._futures = []
+        self._partials = None
+        self._forecast = None
+        self.cancelled = False
+        if sum(_size(path) for path in paths) < MIN_PARALLEL_BYTES:
+            self._partials = [aggregate_shard(paths, start, end, details)]
+            self._forecast = _forecast_rows() if forecast else None
+            self.total = 1
+            return
+        shards = shard_paths(paths, (workers or os.cpu_count() or 1) * SHARDS_PER_WORKER)
+        pool = _get_pool()
+        self._futures = [pool.submit(aggregate_shard, shard, start, end, details) for shard in shards]
+        if forecast:
+            #Off the Tk thread, but in this process where the shared model lives
+            self._futures.append(_get_forecast_pool().submit(_forecast_rows))
+            self._forecast = self._futures[-1]
+        self.total = len(self._futures)
+
+    @property
+    def completed(self):
+        """Shards finished so far"""
+        if self._partials is not None:
+            return self.total
+        return sum(future.done() for future in self._futures)
+
+    def done(self):
+        """True once every shard is finished"""
+        return self.completed == self.total
+
+    def cancel(self):
+        """Drop the shards that haven't started yet"""
+        self.cancelled = True
+        for future in self._futures:
+            future.cancel()
+
+    def result(self):
+        """
+        Wait for every shard and merge them.
+
+        Returns:
+            dict: The report, see merge_partials, with "forecast" rows when asked for
+        """
+        if self._partials is None:
+            self._partials = [future.result() for future in self._futures if future is not self._forecast]
+            if self._forecast is not None:
+                self._forecast = self._forecast.result()
+        report = merge_partials(self._partials)
+        if self._forecast is not None:
+            report["forecast"] = self._forecast
+        return report
+
+
+def run_report(start=None, end=None, details=False, include_cold=True, workers=None):
+    """
+    Build a report, blocking until it is done.
+
+    Args:
+        start (str): Only bookings checking in on or after this date
+        end (str): Only bookings checking in on or before this date
+        details (bool): Include each booking's report text
+        include_cold (bool): Also read the compressed archive
+        workers (int): Worker processes to plan for
+
+    Returns:
+        dict: The report, see merge_partials
+    """
+    return ReportJob(start, end, details, include_cold, workers).result()
+
+
+def start_report_job(root, on_done, on_progress=None, start=None, end=None, details=True, forecast=True,
+                     on_error=None):
+    """
+    Build a report in the worker pool without blocking the Tk main loop.
+
+    The Tk thread checks on the job every POLL_MS with root.after, so the
+    callbacks always run on the Tk thread and can update widgets directly.
+
+    Args:
+        root (tk.Tk): Any Tk widget, used for after()
+        on_done (callable): on_done(report) once the report is ready
+        on_progress (callable): on_progress(shards done, total shards) while it runs
+        start (str): Only bookings checking in on or after this date
+        end (str): Only bookings checking in on or before this date
+        details (bool): Include each booking's report text
+        forecast (bool): Add the occupancy forecast for the coming weeks
+        on_error (callable): on_error(exception) if a shard failed, instead of on_done.
+            Without it the exception is raised in the Tk callback
+
+    Returns:
+        ReportJob: The job, cancel() it if the user leaves the screen
+    """
+    job = ReportJob(start, end, details, forecast=forecast)
+
+    def poll():
+        if job.cancelled:
+            return
+        if on_progress:
+            on_progress(job.completed, job.total)
+        if job.done():
+            try:
+                report = job.result()
+            except Exception as e:
+                #The job is over either way, drop whatever is left and stop polling
+                job.cancel()
+                if on_error is None:
+                    raise
+                on_error(e)
+                return
+            on_done(report)
+        else:
+            root.after(POLL_MS, poll)
+
+    root.after(0, poll)
+    return job
+
+
+def format_report(report, generated=None):
+    """
+    The admin report text for a finished report.
+
+    Args:
+        report (dict): Result of run_report / ReportJob.result
+        generated (datetime): Time to print as generated, defaults to now
+
+    Returns:
+        str: Report text with summary, monthly and room type sections, then the details
+    """
+    generated = generated or datetime.now()
+    text = f"""Hotel Reservation Report
+{'='*50}
+
+Generated: {generated.strftime('%Y-%m-%d %H:%M')}
+
+SUMMARY:
+Total Reservations: {report['total']}
+Confirmed Reservations: {report['confirmed']}
+Cancelled Reservations: {report['cancelled']}
+Total Revenue: ${report['revenue']:.2f}
+Average Value: ${report['average_value']:.2f}
+"""
+    if report["by_month"]:
+        text += f"\n{'='*50}\nBY MONTH:\n"
+        for key, month in report["by_month"].items():
+            text += (f"{key}  {month['room_nights']:6d} room nights  {month['occupancy']:6.1%} occupancy  "
+                     f"${month['revenue']:.2f}\n")
+    if report["by_room_type"]:
+        text += f"\n{'='*50}\nBY ROOM TYPE:\n"
+        for name, room_type in sorted(report["by_room_type"].items(), key=lambda item: str(item[0])):
+            text += f"{name}: {room_type['bookings']} bookings, {room_type['room_nights']} nights, ${room_type['revenue']:.2f}\n"
+    if report.get("forecast"):
+        text += f"\n{'='*50}\nFORECAST (week starting, on the books, expected occupancy):\n"
+        for week in report["forecast"]:
+            text += f"{week['night']}  {week['on_books_occupancy']:6.1%}  {week['occupancy']:6.1%}\n"
+    text += f"\n{'='*50}\nDETAILS:\n"
+    return text + "".join(report["details"])
@@ -0,0 +1,516 @@
+"""
+Hotel Booking System - Command Line Interface
+
+A headless front end over utils, room_logic and createReservation_logic for
+scripts and bulk work, so nothing has to go through the Tk screens.
+
+Every operation is a function that takes a dict of parameters and returns
+a JSON-friendly result dict, so the same code serves two ways of calling it:
+
+    python resources/cli.py search --check-in 2026-01-03 --check-out 2026-01-05 --guests 2
+    python resources/cli.py book --room R002 --check-in 2026-01-03 --check-out 2026-01-05 \\
+        --name "Ana Diaz" --email ana@example.com --phone 5551234567
+    python resources/cli.py cancel "#AB12CD3X"
+
+or, to pipe thousands of operations through one process (one JSON object
+per line on stdin, one result per line on stdout, in the same order):
+
+    python resources/cli.py batch < ops.jsonl > results.jsonl
+
+    {"op": "book", "id": 1, "room_id": "R002", "check_in": "2026-01-03", ...}
+    -> {"id": 1, "op": "book", "ok": true, "reservation": {...}}
+
+The booking index, room catalog and email sessions stay loaded between
+operations, so a batch pays for startup once instead of per line. A failed
+operation is reported as {"ok": false, "error": ...} (with "conflicts" and
+"alternatives" when the room was taken) and the batch carries on.
+
+Emails go out from the user_email / user_pass environment variables, like
+the app; with --no-email or no user_email set no email is sent.
+
+Functions:
+    search: Rooms free for some dates
+    book: Create one reservation
+    modify: Move a reservation to new dates or another room
+    cancel: Cancel one or more reservations
+    report: Reservation counts and revenue
+    analytics: Occupancy, ADR and RevPAR per day, week or month
+    rollups: Show, check or rebuild the daily rollup tables
+    segment: Build the binary booking segment searches read availability from
+    import_feed: Import a CSV or JSONL booking feed
+    export: Write bookings out as JSONL, CSV, NumPy columns or Arrow
+    run_batch: Run JSONL operations from one stream into another
+    main: Command line entry point
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models import default_rooms
+from utils import validate_date, find_booking, read_booking_feed
+from room_logic import get_available_rooms, shared_segment
+from createReservation_logic import (create_reservation, modify_reservation, cancel_reservation,
+                                     cancel_reservations, create_reservations_bulk)
+from storage import iter_bookings, room_versions, BookingConflictError
+from report_jobs import run_report
+from report_export import write_csv, export_bookings
+from pricing import quote_stays
+import rollups as daily_rollups
+
+_rooms = None
+
+
+def _catalog():
+    #Built once per process, batches look rooms up thousands of times
+    global _rooms
+    if _rooms is None:
+        _rooms = {room.room_id: room for room in default_rooms()}
+    return _rooms
+
+
+def _room_dict(room):
+    return {"room_id": room.room_id, "room_type": room.room_type, "max_guests": room.max_guests,
+            "num_beds": room.num_beds, "price": room.price, "amenities": list(room.amenities)}
+
+
+def _credentials(params):
+    if params.get("no_email"):
+        return "", ""
+    return os.environ.get("user_email", ""), os.environ.get("user_pass", "")
+
+
+def _dates(params):
+    """Check the stay dates, returning the number of nights"""
+    check_in, check_out = validate_date(params.get("check_in") or ""), validate_date(params.get("check_out") or "")
+    if check_in is None or check_out is None:
+        raise ValueError("check_in and check_out must be YYYY-MM-DD dates")
+    nights = (check_out - check_in).days
+    if nights <= 0:
+        raise ValueError("check_out must be after check_in")
+    return nights
+
+
+def _room(room_id):
+    room = _catalog().get(room_id)
+    if room is None:
+        raise ValueError(f"Unknown room {room_id}")
+    return room
+
+
+def search(params):
+    """
+    Rooms free for some dates.
+
+    Args:
+        params (dict): check_in, check_out, optional guests, beds and amenities (list)
+
+    Returns:
+        dict: {"rooms": [room dicts with the stay's "total" and its "quote" breakdown],
+            "room_versions": {room id: version}} where the versions can be passed back to book to
+            catch a booking made in between
+    """
+    _dates(params)
+    available = get_available_rooms(list(_catalog().values()), params["check_in"], params["check_out"],
+                                    int(params.get("guests") or 1), int(params.get("beds") or 1),
+                                    params.get("amenities") or [], segment=shared_segment())
+    quote = quote_stays(available, params["check_in"], params["check_out"])
+    rooms = []
+    for i, room in enumerate(available):
+        breakdown = quote.breakdown(i)
+        rooms.append(dict(_room_dict(room), total=breakdown["total"], quote=breakdown))
+    return {"rooms": rooms,
+            "room_versions": room_versions([room.room_id for room in available])}
+
+
+def book(params):
+    """
+    Create one reservation.
+
+    Args:
+        params (dict): room_id, check_in, check_out, name, email, phone, optional
+            idempotency_key and room_versions from search
+
+    Returns:
+        dict: {"reservation": the saved reservation}
+    """
+    nights = _dates(params)
+    room = _room(params.get("room_id"))
+    if not params.get("name") or not params.get("email"):
+        raise ValueError("name and email are required")
+    guest_info = {"name": params["name"], "email": params["email"], "phone": params.get("phone", "")}
+    preferences = {"check_in": params["check_in"], "check_out": params["check_out"], "nights": nights,
+                   "room_versions": params.get("room_versions") or {}}
+    sender_email, sender_password = _credentials(params)
+    reservation = create_reservation(guest_info, room, preferences, sender_email, sender_password,
+                                     list(_catalog().values()), idempotency_key=params.get("idempotency_key"))
+    return {"reservation": reservation}
+
+
+def modify(params):
+    """
+    Move a reservation to new dates, and optionally another room or guest details.
+
+    Args:
+        params (dict): confirmation_number, check_in, check_out, optional room_id, name, email, phone
+
+    Returns:
+        dict: {"reservation": the new reservation}
+    """
+    conf_num = params.get("confirmation_number")
+    old = find_booking(conf_num)
+    if old is None or old.get("status") != "CONFIRMED":
+        raise LookupError(f"No confirmed reservation {conf_num}")
+    nights = _dates(params)
+    room = _room(params.get("room_id") or old["room_id"])
+    guest_info = {"name": params.get("name") or old["guest_name"], "email": params.get("email") or old["guest_email"],
+                  "phone": params.get("phone") or old.get("guest_phone", "")}
+    preferences = {"check_in": params["check_in"], "check_out": params["check_out"], "nights": nights}
+    sender_email, sender_password = _credentials(params)
+    key = params.get("idempotency_key") or f"{conf_num}:{room.room_id}:{params['check_in']}:{params['check_out']}"
+    reservation = modify_reservation(conf_num, guest_info, preferences, room, sender_email, sender_password,
+                                     list(_catalog().values()), idempotency_key=key)
+    if reservation is None:
+        raise LookupError(f"No confirmed reservation {conf_num}")
+    return {"reservation": reservation}
+
+
+def cancel(params):
+    """
+    Cancel one or more reservations.
+
+    Args:
+        params (dict): confirmation_number, or confirmation_numbers (list)
+
+    Returns:
+        dict: {"cancelled": {confirmation number: True if cancelled, False if not found}}
+    """
+    conf_nums = params.get("confirmation_numbers") or [params.get("confirmation_number")]
+    sender_email, sender_password = _credentials(params)
+    reservations = {}
+    for conf_num in conf_nums:
+        reservation = find_booking(conf_num)
+        if reservation is not None and reservation.get("status") == "CONFIRMED":
+            reservations[conf_num] = reservation
+    if len(reservations) == 1:
+        conf_num, reservation = next(iter(reservations.items()))
+        results = {conf_num: cancel_reservation(conf_num, reservation, sender_email, sender_password,
+                                                idempotency_key=conf_num)}
+    elif reservations:
+        results = cancel_reservations(reservations, sender_email, sender_password)
+    else:
+        results = {}
+    return {"cancelled": {conf_num: results.get(conf_num, False) for conf_num in conf_nums}}
+
+
+def _in_range(start, end):
+    """Filter for bookings checking in between two dates, the same test the report screen uses"""
+    if not start and not end:
+        return None, None, None
+    first, last = validate_date(start or "0001-01-01"), validate_date(end or "9999-12-31")
+    if first is None or last is None:
+        raise ValueError("start and end must be YYYY-MM-DD dates")
+
+    def in_range(b):
+        check_in = validate_date(b.get('check_in'))
+        return check_in is not None and first <= check_in <= last
+    return in_range, start, end
+
+
+def report(params):
+    """
+    Reservation counts and revenue, like the admin report screen.
+
+    Args:
+        params (dict): Optional start and end check-in dates
+
+    Returns:
+        dict: total, confirmed, cancelled, revenue, average_value, by_month and by_room_type
+    """
+    _in_range(params.get("start"), params.get("end"))
+    #Big histories are aggregated across all cores, see report_jobs
+    result = run_report(params.get("start"), params.get("end"))
+    del result["details"]
+    result["revenue"] = round(result["revenue"], 2)
+    result["average_value"] = round(result["average_value"], 2)
+    return result
+
+
+def analytics(params):
+    """
+    Occupancy, ADR and RevPAR, see analytics.hotel_kpis.
+
+    Args:
+        params (dict): start, end, optional period ("day", "week" or "month") and by_room_type
+
+    Returns:
+        dict: {"rows": [one dict per period (and room type)]}
+    """
+    #NumPy is only needed for this command
+    from analytics import hotel_kpis
+    kpis = hotel_kpis(params["start"], params["end"], params.get("period") or "day",
+                      bool(params.get("by_room_type")), list(_catalog().values()))
+    return {"rows": list(kpis.rows())}
+
+
+def rollups(params):
+    """
+    Show, check or rebuild the daily rollups, see rollups.py.
+
+    Args:
+        params (dict): action ("show", "check" or "rebuild"), start and end for show
+
+    Returns:
+        dict: show -> {"days": [rows], "totals": {room type: totals}},
+            check -> {"consistent": bool, "mismatches": [...]}, rebuild -> {"days": days with activity}
+    """
+    action = params.get("action") or "show"
+    if action == "rebuild":
+        return {"days": daily_rollups.rebuild()}
+    if action == "check":
+        mismatches = [dict(zip(("date", "room_type", "field", "stored", "counted"), problem))
+                      for problem in daily_rollups.check()]
+        return {"consistent": not mismatches, "mismatches": mismatches}
+    if action != "show":
+        raise ValueError(f"Unknown rollups action {action!r}")
+    return {"days": daily_rollups.daily(params["start"], params["end"]),
+            "totals": daily_rollups.totals(params["start"], params["end"])}
+
+
+def segment(params):
+    """
+    Build the binary booking segment, see booking_segment.py.
+
+    Searches read availability from it until the next booking is written.
+
+    Args:
+        params (dict): Unused
+
+    Returns:
+        dict: {"records": bookings in the segment}
+    """
+    #NumPy is only needed for this command
+    from booking_segment import write_segment
+    return {"records": write_segment()}
+
+
+def import_feed(params):
+    """
+    Import a group/OTA feed in one availability pass and one commit.
+
+    Args:
+        params (dict): path to a .csv or .jsonl feed, optional idempotency_key
+
+    Returns:
+        dict: {"created": [reservations], "rejected": [{"record": ..., "reason": ...}]}
+    """
+    sender_email, sender_password = _credentials(params)
+    created, rejected = create_reservations_bulk(read_booking_feed(params["path"]), list(_catalog().values()),
+                                                 sender_email, sender_password,
+                                                 idempotency_key=params.get("idempotency_key"))
+    return {"created": created, "rejected": [{"record": record, "reason": reason} for record, reason in rejected]}
+
+
+def export(params, out=None):
+    """
+    Write bookings out as JSONL (default), CSV, NumPy columns (.npz) or Arrow.
+
+    Args:
+        params (dict): Optional start, end, status, format ("jsonl", "csv", "npz" or "arrow") and path;
+            npz and arrow need a path
+        out: Stream to write to when there is no path
+
+    Returns:
+        dict: {"exported": number of bookings written}
+    """
+    in_range, start, end = _in_range(params.get("start"), params.get("end"))
+    status = params.get("status")
+    path = params.get("path")
+    format = params.get("format") or "jsonl"
+    if format in ("npz", "arrow"):
+        if not path:
+            raise ValueError(f"The {format} export needs --out")
+        #Columnar writers stream in chunks, see report_export
+        return {"exported": export_bookings(path, format, start, end, status)}
+    bookings = iter_bookings(in_range, start=start, end=end)
+    if status:
+        bookings = (b for b in bookings if b.get("status") == status)
+    count = 0
+    with (open(path, "w", encoding="utf-8", newline="") if path else contextlib.nullcontext(out)) as f:
+        if format == "csv":
+            count = write_csv(bookings, f)
+        else:
+            for b in bookings:
+                f.write(json.dumps(b) + "\n")
+                count += 1
+    return {"exported": count}
+
+
+OPERATIONS = {
+    "search": search,
+    "book": book,
+    "modify": modify,
+    "cancel": cancel,
+    "report": report,
+    "analytics": analytics,
+    "rollups": rollups,
+    "segment": segment,
+    "import": import_feed,
+}
+
+
+def _run(op, params):
+    """Run one operation, turning any failure into an error result"""
+    try:
+        result = OPERATIONS[op](params)
+        result["ok"] = True
+    except BookingConflictError as e:
+        result = {"ok": False, "error": str(e), "conflicts": e.conflicts,
+                  "alternatives": [room.room_id for room in e.alternatives]}
+    except KeyError as e:
+        result = {"ok": False, "error": f"Missing field {e}" if op in OPERATIONS else f"Unknown op {op!r}"}
+    except (ValueError, LookupError, OSError) as e:
+        result = {"ok": False, "error": str(e)}
+    return result
+
+
+def run_batch(lines, out, no_email=False):
+    """
+    Run one JSON operation per line and write one JSON result per line.
+
+    Args:
+        lines (iterable): JSON objects with an "op" key (search, book, modify,
+            cancel, report, import) plus that operation's fields
+        out: Text stream to write results to, flushed after each line
+        no_email (bool): Skip the guest emails for the whole batch
+
+    Returns:
+        int: Number of operations that failed
+    """
+    failed = 0
+    for number, line in enumerate(lines, 1):
+        if not line.strip():
+            continue
+        try:
+            params = json.loads(line)
+        except ValueError as e:
+            params, result = {}, {"ok": False, "error": f"Line {number} is not JSON: {e}"}
+        else:
+            if no_email:
+                params["no_email"] = True
+            result = _run(params.get("op"), params)
+        if "id" in params:
+            result = {"id": params["id"], "op": params.get("op"), **result}
+        failed += not result["ok"]
+        out.write(json.dumps(result) + "\n")
+        out.flush()
+    return failed
+
+
+def _parser():
+    parser = argparse.ArgumentParser(description="Hotel booking command line tools")
+    parser.add_argument("--no-email", action="store_true", help="Don't send guest emails")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    def dates(command):
+        command.add_argument("--check-in", dest="check_in", required=True, help="YYYY-MM-DD")
+        command.add_argument("--check-out", dest="check_out", required=True, help="YYYY-MM-DD")
+
+    def date_range(command):
+        command.add_argument("--start", help="First check-in date to include")
+        command.add_argument("--end", help="Last check-in date to include")
+
+    command = commands.add_parser("search", help="List rooms free for some dates")
+    dates(command)
+    command.add_argument("--guests", type=int, default=1)
+    command.add_argument("--beds", type=int, default=1)
+    command.add_argument("--amenity", dest="amenities", action="append", help="Repeat for more than one")
+
+    command = commands.add_parser("book", help="Create a reservation")
+    command.add_argument("--room", dest="room_id", required=True)
+    dates(command)
+    command.add_argument("--name", required=True)
+    command.add_argument("--email", required=True)
+    command.add_argument("--phone", default="")
+    command.add_argument("--key", dest="idempotency_key", help="Idempotency key, safe to re-run with")
+
+    command = commands.add_parser("modify", help="Move a reservation to new dates or another room")
+    command.add_argument("confirmation_number")
+    dates(command)
+    command.add_argument("--room", dest="room_id", help="New room, defaults to the current one")
+    command.add_argument("--name")
+    command.add_argument("--email")
+    command.add_argument("--phone")
+
+    command = commands.add_parser("cancel", help="Cancel reservations")
+    command.add_argument("confirmation_numbers", nargs="+")
+
+    command = commands.add_parser("report", help="Reservation counts and revenue")
+    date_range(command)
+
+    command = commands.add_parser("analytics", help="Occupancy, ADR and RevPAR")
+    command.add_argument("--start", required=True, help="First night")
+    command.add_argument("--end", required=True, help="Day after the last night")
+    command.add_argument("--period", choices=["day", "week", "month"], default="day")
+    command.add_argument("--by-room-type", dest="by_room_type", action="store_true")
+
+    command = commands.add_parser("rollups", help="Show, check or rebuild the daily rollup tables")
+    command.add_argument("action", choices=["show", "check", "rebuild"])
+    command.add_argument("--start", help="First day to show")
+    command.add_argument("--end", help="Day after the last one to show")
+
+    commands.add_parser("segment", help="Build the binary booking segment searches read availability from")
+
+    command = commands.add_parser("import", help="Import a CSV or JSONL booking feed")
+    command.add_argument("path")
+    command.add_argument("--key", dest="idempotency_key", help="Idempotency key, safe to re-run with")
+
+    command = commands.add_parser("export", help="Write bookings out as JSONL, CSV, NumPy columns or Arrow")
+    date_range(command)
+    command.add_argument("--status", help="Only bookings with this status, e.g. CONFIRMED")
+    command.add_argument("--format", choices=["jsonl", "csv", "npz", "arrow"], default="jsonl")
+    command.add_argument("--out", dest="path", help="File to write, defaults to stdout")
+
+    commands.add_parser("batch", help="Read JSONL operations from stdin, write JSONL results to stdout")
+    return parser
+
+
+def main(argv=None, stdin=None, stdout=None):
+    """
+    Command line entry point.
+
+    Args:
+        argv (list): Arguments, defaults to sys.argv[1:]
+        stdin: Stream batch reads operations from, defaults to sys.stdin
+        stdout: Stream results go to, defaults to sys.stdout
+
+    Returns:
+        int: Exit status, 1 if any operation failed
+    """
+    args = _parser().parse_args(argv)
+    stdin = stdin or sys.stdin
+    stdout = stdout or sys.stdout
+    params = {key: value for key, value in vars(args).items() if value is not None}
+    #The logic modules print progress lines, keep them out of the JSON on stdout
+    with contextlib.redirect_stdout(sys.stderr):
+        if args.command == "batch":
+            return 1 if run_batch(stdin, stdout, args.no_email) else 0
+        if args.command == "export":
+            try:
+                result = export(params, stdout)
+            except (ValueError, OSError) as e:
+                print(f"Export failed: {e}")
+                return 1
+            print(f"Exported {result['exported']} bookings")
+            return 0
+        result = _run(args.command, params)
+    stdout.write(json.dumps(result, indent=2) + "\n")
+    return 0 if result["ok"] and result.get("consistent", True) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
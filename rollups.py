@@ -0,0 +1,407 @@
+"""
+Hotel Booking System - Daily Rollups
+
+Per-day, per-room-type counters kept up to date as bookings are written,
+so date range figures read one row per day instead of scanning bookings:
+
+    sold           room nights sold (CONFIRMED stays, one per night)
+    revenue        room revenue, each stay's total spread evenly over its nights
+    arrivals       CONFIRMED stays checking in that day
+    departures     CONFIRMED stays checking out that day
+    cancellations  CANCELLED stays that were due to check in that day
+
+Every storage write (save_booking, the status updates and transaction
+commits, so create/modify/cancel and imports) passes the bookings it added
+and the status changes it made to apply_changes. The difference is appended
+as one JSON line to a change log. The table itself is bookings/rollups.json
+plus the log of its generation (bookings/rollups-<generation>.log); once the
+log gets long it is folded into a new snapshot with the next generation
+number, so a crash halfway through a compaction can never apply a log twice.
+Other processes pick up new log lines the next time they read, so every
+process sees the same counters.
+
+The first time a folder is used with neither a snapshot nor a log (a fresh
+checkout, or bookings from before rollups existed) the counters are seeded
+with a full count of the bookings already stored.
+
+If the rollups ever drift from the bookings (a crash between the booking
+write and the rollup append, files edited by hand, an old bookings.json
+migrated), check() lists the differences and rebuild() recounts from
+scratch:
+    python resources/cli.py rollups check
+    python resources/cli.py rollups rebuild
+
+Functions:
+    contribution: What one booking adds to the counters
+    apply_changes: Update the counters for bookings just written
+    daily: Counter rows for a date range
+    totals: Counters summed over a date range
+    rebuild: Recount everything from the bookings
+    check: Compare the counters with a fresh count
+
+Classes:
+    RollupStore: The table, its snapshot file and its change log
+
+Attributes:
+    rollup_store (RollupStore): The store storage writes go to
+"""
+
+import json
+import os
+import threading
+from datetime import datetime, timedelta
+
+import storage
+
+ROLLUP_FILE = "rollups.json"
+#Kept off the .jsonl extension so it is never taken for a partition
+ROLLUP_LOG = "rollups-{generation}.log"
+FIELDS = ("sold", "revenue", "arrivals", "departures", "cancellations")
+#Fold the log into the snapshot once it has this many lines
+COMPACT_LINES = 5000
+#Revenue is summed in floating point, so allow for rounding when checking
+REVENUE_TOLERANCE = 0.01
+
+
+def _date(text):
+    try:
+        return datetime.strptime(text, "%Y-%m-%d")
+    except (TypeError, ValueError):
+        return None
+
+
+def contribution(booking):
+    """
+    What one booking adds to the counters.
+
+    Args:
+        booking (dict): Booking data
+
+    Returns:
+        dict: Day "YYYY-MM-DD" -> {room type: [sold, revenue, arrivals, departures, cancellations]}
+    """
+    status = booking.get('status')
+    check_in, check_out = _date(booking.get('check_in')), _date(booking.get('check_out'))
+    #JSON object keys are strings, so the counters are too
+    room_type = str(booking.get('room_type') or "")
+    if check_in is None:
+        return {}
+    if status == 'CANCELLED':
+        return {check_in.strftime("%Y-%m-%d"): {room_type: [0, 0.0, 0, 0, 1]}}
+    if status != 'CONFIRMED' or check_out is None or check_out <= check_in:
+        return {}
+    nights = (check_out - check_in).days
+    rate = (booking.get('total_price') or 0.0) / nights
+    rows = {}
+    for i in range(nights):
+        day = (check_in + timedelta(days=i)).strftime("%Y-%m-%d")
+        rows[day] = {room_type: [1, rate, 1 if i == 0 else 0, 0, 0]}
+    rows.setdefault(check_out.strftime("%Y-%m-%d"), {}).setdefault(room_type, [0, 0.0, 0, 0, 0])[3] += 1
+    return rows
+
+
+def _add(table, rows, sign=1):
+    """Add (or with sign=-1 take away) rows into table, dropping counters that reach zero"""
+    for day, types in rows.items():
+        day_row = table.setdefault(day, {})
+        for room_type, values in types.items():
+            current = day_row.setdefault(room_type, [0, 0.0, 0, 0, 0])
+            for i, value in enumerate(values):
+                current[i] += sign * value
+            if not any(current[:1] + current[2:]) and abs(current[1]) < 1e-9:
+                del day_row[room_type]
+        if not day_row:
+            del table[day]
+
+
+class RollupStore:
+    """
+    The rollup table: a JSON snapshot plus an append-only log of changes.
+
+    Attributes:
+        directory (str): Folder holding the files, defaults to storage.BOOKINGS_DIR
+    """
+
+    def __init__(self, directory=None):
+        """
+        Args:
+            directory (str): Folder for the snapshot and log, defaults to storage.BOOKINGS_DIR
+        """
+        self._directory = directory
+        self._table = {}
+        self._generation = 0
+        self._lock = threading.Lock()
+        self._loaded_from = None
+        self._snapshot_mtime = None
+        self._log_offset = 0
+        self._log_lines = 0
+        self._seeded_for = None
+        self._version = 0
+
+    @property
+    def directory(self):
+        return self._directory or storage.BOOKINGS_DIR
+
+    def _path(self, name):
+        return os.path.join(self.directory, name)
+
+    def _log_path(self, generation=None):
+        return self._path(ROLLUP_LOG.format(generation=self._generation if generation is None else generation))
+
+    def _unseeded(self):
+        """True if the folder has neither a snapshot nor a log yet"""
+        if self._seeded_for == self.directory:
+            return False
+        if os.path.exists(self._path(ROLLUP_FILE)) or os.path.exists(self._log_path(0)):
+            self._seeded_for = self.directory
+            return False
+        return True
+
+    def _seed(self):
+        """
+        Count the bookings already stored into a first snapshot, if there is none yet.
+
+        Returns:
+            bool: True if this call did the seeding
+        """
+        #Same lock order as rebuild(): storage first, so the count can't miss a write
+        with storage._lock:
+            #Lets a pending legacy migration or journal replay finish (and report its own changes) first
+            storage.hot_partitions()
+            with self._lock, storage._file_locks(["rollups"]):
+                if not self._unseeded():
+                    return False
+                self._write_snapshot(_count())
+                self._seeded_for = self.directory
+                self._refresh()
+                return True
+
+    def _refresh(self):
+        """Catch up with the files: reload after a compaction, otherwise read just the new log lines"""
+        snapshot_mtime = storage._mtime(self._path(ROLLUP_FILE))
+        if self._loaded_from != self.directory or snapshot_mtime != self._snapshot_mtime:
+            self._table, self._generation, self._log_offset, self._log_lines = {}, 0, 0, 0
+            self._loaded_from, self._snapshot_mtime = self.directory, snapshot_mtime
+            self._version += 1
+            try:
+                with open(self._path(ROLLUP_FILE), "r", encoding="utf-8") as f:
+                    snapshot = json.load(f)
+                self._table, self._generation = snapshot["days"], snapshot["generation"]
+            except (FileNotFoundError, ValueError, KeyError, TypeError):
+                pass
+        try:
+            with open(self._log_path(), "rb") as f:
+                f.seek(self._log_offset)
+                data = f.read()
+        except FileNotFoundError:
+            return
+        #A line still being written by another process is left for next time
+        complete = data[:data.rfind(b"\n") + 1]
+        for line in complete.splitlines():
+            try:
+                _add(self._table, json.loads(line))
+            except ValueError:
+                continue
+            self._log_lines += 1
+        self._log_offset += len(complete)
+        if complete:
+            self._version += 1
+
+    def _write_snapshot(self, table):
+        """Start a new generation from table, then drop the log it replaces"""
+        old_log, generation = self._log_path(), self._generation + 1
+        os.makedirs(self.directory, exist_ok=True)
+        try:
+            os.remove(self._log_path(generation))
+        except FileNotFoundError:
+            pass
+        tmp_path = self._path(ROLLUP_FILE) + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"generation": generation, "days": table}, f, sort_keys=True)
+        os.replace(tmp_path, self._path(ROLLUP_FILE))
+        try:
+            os.remove(old_log)
+        except FileNotFoundError:
+            pass
+
+    def apply(self, delta):
+        """
+        Record a change to the counters.
+
+        Args:
+            delta (dict): Rows like contribution() returns, negative values take away
+        """
+        if not delta:
+            return
+        #The first count already includes the bookings this delta is for
+        if self._unseeded() and self._seed():
+            return
+        with self._lock, storage._file_locks(["rollups"]):
+            self._refresh()
+            os.makedirs(self.directory, exist_ok=True)
+            with open(self._log_path(), "a", encoding="utf-8") as f:
+                f.write(json.dumps(delta) + "\n")
+            self._refresh()
+            if self._log_lines >= COMPACT_LINES:
+                self._write_snapshot(self._table)
+                self._refresh()
+
+    def version(self):
+        """
+        A number that moves whenever the counters change, here or in another process.
+
+        Only reads the log lines added since the last call, so callers can
+        check it often and re-read the table when it moved.
+
+        Returns:
+            int: The version
+        """
+        if self._unseeded():
+            self._seed()
+        with self._lock:
+            self._refresh()
+            return self._version
+
+    def table(self, start=None, end=None):
+        """
+        A copy of the current counters, optionally only some days.
+
+        Copied under the lock, so the write hook can keep updating the live
+        table while the caller reads.
+
+        Args:
+            start (str): First day "YYYY-MM-DD" to include
+            end (str): Day after the last one to include
+
+        Returns:
+            dict: Day -> {room type: [sold, revenue, arrivals, departures, cancellations]}
+        """
+        if self._unseeded():
+            self._seed()
+        with self._lock:
+            self._refresh()
+            return {day: {name: list(values) for name, values in row.items()}
+                    for day, row in self._table.items()
+                    if (start is None or day >= start) and (end is None or day < end)}
+
+    def replace(self, table):
+        """Swap in a freshly counted table (see rebuild)"""
+        with self._lock, storage._file_locks(["rollups"]):
+            self._write_snapshot(table)
+            self._refresh()
+
+
+rollup_store = RollupStore()
+
+
+def apply_changes(added=(), changed=()):
+    """
+    Update the counters for bookings just written.
+
+    Args:
+        added (iterable): New bookings
+        changed (iterable): (booking after the change, its status before) pairs
+    """
+    delta = {}
+    for booking in added:
+        _add(delta, contribution(booking))
+    for booking, old_status in changed:
+        if booking.get('status') == old_status:
+            continue
+        _add(delta, contribution(booking))
+        _add(delta, contribution(dict(booking, status=old_status)), -1)
+    rollup_store.apply(delta)
+
+
+def daily(start, end, room_type=None):
+    """
+    Counter rows for every day from start up to (not including) end.
+
+    Reads one row per day, however many bookings there are.
+
+    Args:
+        start (str): First day "YYYY-MM-DD"
+        end (str): Day after the last one "YYYY-MM-DD"
+        room_type (str): Only this room type, None for every type
+
+    Returns:
+        list: Dicts with date, room_type and one key per FIELDS entry, days without activity left out
+    """
+    first, last = _date(start), _date(end)
+    if first is None or last is None:
+        raise ValueError("start and end must be YYYY-MM-DD dates")
+    table = rollup_store.table(first.strftime("%Y-%m-%d"), last.strftime("%Y-%m-%d"))
+    rows = []
+    for i in range((last - first).days):
+        day = (first + timedelta(days=i)).strftime("%Y-%m-%d")
+        for name, values in sorted(table.get(day, {}).items(), key=lambda item: str(item[0])):
+            if room_type is None or name == room_type:
+                row = {"date": day, "room_type": name}
+                row.update(zip(FIELDS, values))
+                row["revenue"] = round(row["revenue"], 2)
+                rows.append(row)
+    return rows
+
+
+def totals(start, end):
+    """
+    Counters summed over a date range, per room type.
+
+    Args:
+        start (str): First day "YYYY-MM-DD"
+        end (str): Day after the last one "YYYY-MM-DD"
+
+    Returns:
+        dict: Room type -> {field: total}
+    """
+    result = {}
+    for row in daily(start, end):
+        summed = result.setdefault(row["room_type"], dict.fromkeys(FIELDS, 0))
+        for field in FIELDS:
+            summed[field] += row[field]
+    for summed in result.values():
+        summed["revenue"] = round(summed["revenue"], 2)
+    return result
+
+
+def _count():
+    table = {}
+    for booking in storage.iter_bookings():
+        _add(table, contribution(booking))
+    return table
+
+
+def rebuild():
+    """
+    Recount the counters from every booking, hot and archived.
+
+    Returns:
+        int: Number of days with activity
+    """
+    with storage._lock:
+        table = _count()
+        rollup_store.replace(table)
+    return len(table)
+
+
+def check():
+    """
+    Compare the counters with a fresh count of the bookings.
+
+    Returns:
+        list: (day, room type, field, stored value, counted value) for every difference, empty if consistent
+    """
+    with storage._lock:
+        counted = _count()
+        stored = rollup_store.table()
+    problems = []
+    zero = [0, 0.0, 0, 0, 0]
+    for day in sorted(set(counted) | set(stored)):
+        types = set(counted.get(day, {})) | set(stored.get(day, {}))
+        for name in sorted(types, key=str):
+            want, have = counted.get(day, {}).get(name, zero), stored.get(day, {}).get(name, zero)
+            for field, wanted, had in zip(FIELDS, want, have):
+                tolerance = REVENUE_TOLERANCE if field == "revenue" else 0
+                if abs(wanted - had) > tolerance:
+                    problems.append((day, name, field, had, wanted))
+    return problems
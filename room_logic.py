@@ -1,9 +1,26 @@
+import importlib.util
+
 from models import Room
-from utils import validate_date
-from utils import load_bookings
+from storage import room_conflicts
+from holds import hold_manager
+
+#The binary booking segment is read with NumPy, without it searches always use the booking index
+_HAS_NUMPY = importlib.util.find_spec("numpy") is not None
+
+#Function that hands searches the shared booking segment when there is one
+def shared_segment():
+    """The process's mapped booking segment (see booking_segment.py) if it has been built and is current
+
+    Returns:
+        BookingSegment: The segment to pass to get_available_rooms, or None to read the booking index instead
+    """
+    if not _HAS_NUMPY:
+        return None
+    from booking_segment import shared_segment as current_segment
+    return current_segment()
 
 #Function that checks for room availability   
-def is_room_available(room_id, check_in, check_out): #(WIP)
+def is_room_available(room_id, check_in, check_out, hold_id=None): #(WIP)
     #David Guzman 11/21/2025
     """Check if the room is available for any specific date that the user chooses
 
@@ -11,33 +28,23 @@ def is_room_available(room_id, check_in, check_out): #(WIP)
         room_id (str): The individual unique id for a particular room
         check_in (str): The check-in date held in Year/Month/Day Fromat
         check_out (str): The check-out date that will be held in the Year/Month/Day Format
+        hold_id (str): The caller's own hold on the room, which doesn't count against it
 
     Returns:
         bool: True if room is available and False if it isn't available
     """
-    #Variable that holds the existing reservations
-    bookings = load_bookings()
-    #Variables that will hold dates for user check-in/out
-    check_in_date = validate_date(check_in)
-    check_out_date = validate_date(check_out)
-    
-    #Check each reservation for a conflict/double-booking etc
-    for booking in bookings:
-        #Skip if its a different room or reservation is cancelled
-        if(booking.get('room_id') != room_id or booking.get('status') == 'CANCELLED'):
-            continue
-        #Variables that will hold the existing reservation dates that get checked
-        booking_in = validate_date(booking['check_in'])
-        booking_out = validate_date(booking['check_out'])
-        
-        #Check for a date overlap, room won't be available if there is an overlap
-        if not (check_out_date <= booking_in or check_in_date >= booking_out):
-            return False #Room was already taken basically
+    #Stays already in that room come straight from the in-memory booking index, no file reads
+    #Anything overlapping the dates means the room won't be available
+    if room_conflicts(room_id, check_in, check_out):
+        return False #Room was already taken basically
+    #Another guest picked this room and is still typing their details in
+    if hold_manager.conflicts(room_id, check_in, check_out, ignore=hold_id):
+        return False
     
     return True #No issues, reservation confirmed
 
 #Function to find those available rooms based on user choice
-def get_available_rooms(rooms, check_in, check_out, num_guests, num_beds, amenities):
+def get_available_rooms(rooms, check_in, check_out, num_guests, num_beds, amenities, segment=None):
     #David Guzman 11/21/2025
     """Find available rooms based on user choice criteria such as number of guests, beds, date, and amenities
 
@@ -47,20 +54,26 @@ def get_available_rooms(rooms, check_in, check_out, num_guests, num_beds, amenit
         num_guests (int): Variable for number of guests chosen by user
         num_beds (int): Variable for number of beds chosen by the user
         amenities (list): The list of amenities the user chose, assuming they selected any
+        segment (BookingSegment): Optional memory-mapped booking segment, used instead of reading storage if it is up to date
 
     Returns:
         list: GUI will show the user the list of available rooms based on their selections
     """
     #Array to hold available rooms if it passes thru the filters
     available = []  
+    #With a current binary segment every room's conflicts come out of one vectorized pass
+    taken = segment.booked_rooms(check_in, check_out) if segment is not None and segment.is_current() else None
     for room in rooms:
         #Filter for checking the guest capacity and bed capacity
         if room.max_guests < num_guests or room.num_beds < num_beds:
             continue
         #Filter for checking amenities selected, if any
-        if amenities and not any(a in room.amenities for a in amenities):
+        if amenities and not any(room.has_amenity(a) for a in amenities):
             continue
         #Filter for checking if the room is available by calling on the 'is_room_available' method
-        if is_room_available(room.room_id, check_in, check_out):
+        if taken is not None:
+            if room.room_id not in taken and not hold_manager.conflicts(room.room_id, check_in, check_out):
+                available.append(room)
+        elif is_room_available(room.room_id, check_in, check_out):
             available.append(room) #If we reach this point, it means the room passed through all filters and is available for user
     return available
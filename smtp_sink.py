@@ -0,0 +1,256 @@
+"""
+Hotel Booking System - Local SMTP Sink
+
+A tiny SMTP server that accepts every message and writes it to disk, so the
+email code can be run and benchmarked without a real relay or internet.
+It understands just enough SMTP for smtplib: EHLO/HELO, AUTH PLAIN/LOGIN
+(any password works), MAIL, RCPT, DATA, RSET, NOOP and QUIT. With a
+certificate it speaks implicit TLS like smtp.gmail.com:465.
+
+Point the app at it with environment variables, e.g.:
+    python smtp_sink.py --port 2525 --out sink_mail
+    SMTP_HOST=127.0.0.1 SMTP_PORT=2525 SMTP_SSL=0 python system.py
+
+Functions:
+    start_sink: Run a sink on a background thread in this process
+    spawn_sink: Run a sink in a separate Python process
+    make_self_signed_cert: Create a throwaway certificate with openssl
+
+Classes:
+    SMTPSink: A running in-process sink
+"""
+
+import argparse
+import os
+import socketserver
+import ssl
+import subprocess
+import sys
+import threading
+
+#Largest message the sink advertises/accepts
+MAX_MESSAGE_BYTES = 50 * 1024 * 1024
+
+
+class _SMTPHandler(socketserver.StreamRequestHandler):
+    """One SMTP conversation"""
+
+    def setup(self):
+        if isinstance(self.request, ssl.SSLSocket):
+            self.request.do_handshake()
+        super().setup()
+
+    def reply(self, line):
+        self.wfile.write(line.encode("ascii") + b"\r\n")
+        self.wfile.flush()
+
+    def readline(self):
+        line = self.rfile.readline(MAX_MESSAGE_BYTES)
+        return line.rstrip(b"\r\n").decode("utf-8", "replace") if line else None
+
+    def handle(self):
+        self.reply("220 smtp-sink ready")
+        sender, recipients = None, []
+        while True:
+            line = self.readline()
+            if line is None:
+                return
+            command, _, argument = line.partition(" ")
+            command = command.upper()
+            if command == "EHLO":
+                self.wfile.write(b"250-smtp-sink\r\n250-AUTH PLAIN LOGIN\r\n250-8BITMIME\r\n"
+                                 + f"250 SIZE {MAX_MESSAGE_BYTES}\r\n".encode("ascii"))
+                self.wfile.flush()
+            elif command == "HELO":
+                self.reply("250 smtp-sink")
+            elif command == "AUTH":
+                mechanism, _, initial = argument.partition(" ")
+                if mechanism.upper() == "LOGIN":
+                    self.reply("334 VXNlcm5hbWU6")
+                    self.readline()
+                    self.reply("334 UGFzc3dvcmQ6")
+                    self.readline()
+                elif not initial:
+                    self.reply("334 ")
+                    self.readline()
+                self.reply("235 2.7.0 Authentication successful")
+            elif command == "MAIL":
+                sender, recipients = argument, []
+                self.reply("250 OK")
+            elif command == "RCPT":
+                recipients.append(argument)
+                self.reply("250 OK")
+            elif command == "DATA":
+                if sender is None or not recipients:
+                    self.reply("503 Need MAIL and RCPT first")
+                    continue
+                self.reply("354 End data with <CR><LF>.<CR><LF>")
+                self.server.record(self.read_data())
+                sender, recipients = None, []
+                self.reply("250 OK queued")
+            elif command == "RSET":
+                sender, recipients = None, []
+                self.reply("250 OK")
+            elif command == "NOOP":
+                self.reply("250 OK")
+            elif command == "QUIT":
+                self.reply("221 Bye")
+                return
+            else:
+                self.reply("502 Command not implemented")
+
+    def read_data(self):
+        """Read DATA up to the lone dot, undoing dot-stuffing"""
+        lines = []
+        while True:
+            line = self.rfile.readline(MAX_MESSAGE_BYTES)
+            if not line or line in (b".\r\n", b".\n"):
+                return b"".join(lines)
+            lines.append(line[1:] if line.startswith(b"..") else line)
+
+
+class _SinkServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, address, out_dir=None, tls_context=None):
+        self.out_dir = out_dir
+        self.tls_context = tls_context
+        self.count = 0
+        self._count_lock = threading.Lock()
+        if out_dir:
+            os.makedirs(out_dir, exist_ok=True)
+        super().__init__(address, _SMTPHandler)
+
+    def get_request(self):
+        sock, address = super().get_request()
+        if self.tls_context is not None:
+            #The handshake happens on the handler thread, not the accept loop
+            sock = self.tls_context.wrap_socket(sock, server_side=True, do_handshake_on_connect=False)
+        return sock, address
+
+    def record(self, data):
+        with self._count_lock:
+            self.count += 1
+            number = self.count
+        if self.out_dir:
+            with open(os.path.join(self.out_dir, f"{number:08d}.eml"), "wb") as f:
+                f.write(data)
+
+
+def _tls_context(certfile, keyfile):
+    if not certfile:
+        return None
+    context = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+    context.load_cert_chain(certfile, keyfile)
+    return context
+
+
+class SMTPSink:
+    """
+    A sink running on a background thread.
+
+    Attributes:
+        host (str): Address it listens on
+        port (int): Port it listens on
+        out_dir (str): Folder messages are written to, None keeps only the count
+    """
+
+    def __init__(self, host="127.0.0.1", port=0, out_dir=None, certfile=None, keyfile=None):
+        self._server = _SinkServer((host, port), out_dir, _tls_context(certfile, keyfile))
+        self.host, self.port = self._server.server_address[:2]
+        self.out_dir = out_dir
+        self._thread = threading.Thread(target=self._server.serve_forever, name="smtp-sink", daemon=True)
+        self._thread.start()
+
+    @property
+    def count(self):
+        """Messages received so far"""
+        return self._server.count
+
+    def stop(self):
+        """Stop listening and close the socket"""
+        self._server.shutdown()
+        self._server.server_close()
+        self._thread.join()
+
+
+def start_sink(host="127.0.0.1", port=0, out_dir=None, certfile=None, keyfile=None):
+    """
+    Start a sink in this process.
+
+    Args:
+        host (str): Address to listen on
+        port (int): Port, 0 picks a free one
+        out_dir (str): Folder to write each message to as NNNNNNNN.eml
+        certfile (str): PEM certificate for implicit TLS, None for plain SMTP
+        keyfile (str): PEM private key for certfile
+
+    Returns:
+        SMTPSink: The running sink, call stop() when done
+    """
+    return SMTPSink(host, port, out_dir, certfile, keyfile)
+
+
+def spawn_sink(port, out_dir=None, certfile=None, keyfile=None):
+    """
+    Start a sink as a separate Python process.
+
+    Args:
+        port (int): Port to listen on
+        out_dir (str): Folder to write messages to
+        certfile (str): PEM certificate for implicit TLS
+        keyfile (str): PEM private key for certfile
+
+    Returns:
+        subprocess.Popen: The sink process, already listening; terminate() it when done
+    """
+    command = [sys.executable, os.path.abspath(__file__), "--port", str(port)]
+    if out_dir:
+        command += ["--out", out_dir]
+    if certfile:
+        command += ["--cert", certfile, "--key", keyfile]
+    process = subprocess.Popen(command, stdout=subprocess.PIPE, text=True)
+    #The first line is printed once the socket is bound
+    process.stdout.readline()
+    return process
+
+
+def make_self_signed_cert(directory):
+    """
+    Create a throwaway localhost certificate with the openssl command line tool.
+
+    Args:
+        directory (str): Folder to write cert.pem and key.pem into
+
+    Returns:
+        tuple: (certificate path, key path)
+    """
+    certfile, keyfile = os.path.join(directory, "cert.pem"), os.path.join(directory, "key.pem")
+    subprocess.run(["openssl", "req", "-x509", "-newkey", "rsa:2048", "-nodes", "-days", "2",
+                    "-subj", "/CN=localhost", "-keyout", keyfile, "-out", certfile],
+                   check=True, capture_output=True)
+    return certfile, keyfile
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local SMTP sink that saves every message to disk")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=2525)
+    parser.add_argument("--out", default="sink_mail", help="Folder to write messages to")
+    parser.add_argument("--cert", help="PEM certificate, turns on implicit TLS")
+    parser.add_argument("--key", help="PEM private key for --cert")
+    args = parser.parse_args()
+
+    server = _SinkServer((args.host, args.port), args.out, _tls_context(args.cert, args.key))
+    print(f"SMTP sink listening on {args.host}:{server.server_address[1]}, saving to {args.out}", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,1228 @@
+"""
+Hotel Booking System - Partitioned Booking Storage
+
+Bookings are stored one file per check-in month (e.g. bookings/2025-12.jsonl)
+with one JSON record per line. Stays that are already over get moved by the
+archiver into compressed cold partitions under bookings/archive/, so the
+availability and modify flows only ever read the hot (current and future)
+partitions while reports can still read everything.
+
+Functions:
+    partition_key: Work out which month partition a booking belongs to
+    iter_bookings: Stream bookings one at a time with an optional filter
+    load_bookings: Load bookings from the hot (and optionally cold) partitions
+    load_active_bookings: Load only the hot bookings that could overlap a stay
+    save_booking: Append a booking to its check-in month partition
+    update_booking_status: Update the status of a stored booking
+    update_booking_statuses: Update many statuses in a single pass
+    update_statuses_where: Update every booking matching rooms/dates/status
+    find_booking: Search for a booking by confirmation number
+    find_bookings_by_guest: Every booking for a guest email or phone
+    get_index: In-memory confirmation/email/phone/room index over the hot partitions
+    get_cold_index: The same lookups over the cold archive, built on first use
+    transaction: Group finds, status changes and inserts into one atomic commit
+    room_conflicts: Stays in the way of booking a room, from the index
+    room_versions: Per-room version numbers for compare-and-set reservations
+    archive_closed_stays: Move past stays into the cold tier
+    start_archiver: Run archive_closed_stays on a background thread
+
+Classes:
+    BookingIndex: Confirmation number, guest email and guest phone lookups
+    Transaction: Changes collected in memory and committed together
+    BookingConflictError: A room was booked by someone else after the search
+    ConfirmationNumberTakenError: A new booking's confirmation number was stored by someone else first
+"""
+
+import bisect
+import gzip
+import json
+import lzma
+import os
+import re
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from functools import lru_cache
+
+#All storage lives under this folder, same place bookings.json used to be
+BOOKINGS_DIR = "bookings"
+ARCHIVE_DIR = "archive"
+LEGACY_FILE = "bookings.json"
+#Holds the new contents of a multi-partition commit until it is fully applied
+JOURNAL_FILE = ".journal.json"
+#Cross-process lock files for commits, and how long one can go untouched before it counts as abandoned
+LOCK_DIR = "locks"
+LOCK_TIMEOUT = 10.0
+#Held lock files are touched this often, so a long commit or archive pass never looks abandoned
+LOCK_REFRESH = LOCK_TIMEOUT / 4
+#Commits retried with fresh confirmation numbers before giving up, see transaction()
+RENUMBER_ATTEMPTS = 3
+#Compression used for cold partitions, either "gzip" or "lzma"
+ARCHIVE_COMPRESSION = "gzip"
+#Partition used for bookings whose check-in date can't be parsed
+UNDATED_PARTITION = "undated"
+
+_HOT_EXTENSION = ".jsonl"
+_COLD_EXTENSIONS = {"gzip": ".jsonl.gz", "lzma": ".jsonl.xz"}
+
+#Guards the indexes and every read-modify-write so GUI and archiver threads don't clash.
+#Writers take their partition lock files first and this second, never the other way round
+_lock = threading.RLock()
+
+
+#Only a few thousand distinct dates ever show up, and imports call this once per booking
+@lru_cache(maxsize=4096)
+def partition_key(check_in):
+    """
+    Get the partition a booking belongs to from its check-in date.
+
+    Args:
+        check_in (str): Check-in date "YYYY-MM-DD"
+
+    Returns:
+        str: Partition key "YYYY-MM", or "undated" if the date is invalid
+    """
+    try:
+        return datetime.strptime(check_in, "%Y-%m-%d").strftime("%Y-%m")
+    except (TypeError, ValueError):
+        return UNDATED_PARTITION
+
+
+def _hot_path(key):
+    return os.path.join(BOOKINGS_DIR, key + _HOT_EXTENSION)
+
+
+def _cold_path(key, compression=None):
+    return os.path.join(BOOKINGS_DIR, ARCHIVE_DIR,
+                        key + _COLD_EXTENSIONS[compression or ARCHIVE_COMPRESSION])
+
+
+def _open(path, mode, codec_path=None):
+    """Open a partition file, picking the codec from its (or codec_path's) extension"""
+    codec_path = codec_path or path
+    if codec_path.endswith(".gz"):
+        return gzip.open(path, mode + "t", encoding="utf-8")
+    if codec_path.endswith(".xz"):
+        return lzma.open(path, mode + "t", encoding="utf-8")
+    return open(path, mode, encoding="utf-8")
+
+
+def _iter_partition(path):
+    """Yield the records of one partition file a line at a time, skipping blank/corrupt lines"""
+    if not os.path.exists(path):
+        return
+    with _open(path, "r") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line)
+            except ValueError:
+                continue
+
+
+def _read_partition(path):
+    """Read every record of one partition file"""
+    return list(_iter_partition(path))
+
+
+def _write_partition(path, records):
+    """Atomically replace a partition file, removing it if it is now empty"""
+    if not records:
+        if os.path.exists(path):
+            os.remove(path)
+        return
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + ".tmp"
+    with _open(tmp_path, "w", codec_path=path) as f:
+        for record in records:
+            f.write(json.dumps(record) + "\n")
+    os.replace(tmp_path, path)
+
+
+def _append_partition(path, records, skip_existing=False):
+    """Append records to a partition file, optionally skipping ones already in it"""
+    if skip_existing:
+        present = {b.get('confirmation_number') for b in _iter_partition(path)}
+        records = [b for b in records if b.get('confirmation_number') not in present]
+    if not records:
+        return
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with _open(path, "a") as f:
+        f.write("".join(json.dumps(record) + "\n" for record in records))
+
+
+def _commit_partitions(changes, appends=None):
+    """
+    Write several partitions as one atomic commit.
+
+    When more than one file is involved the new contents are written to a
+    journal first and flushed to disk, then each partition is replaced or
+    appended to and the journal removed. If the process dies half way,
+    _recover_journal replays the journal on the next access, so either
+    every partition changes or none of them does.
+
+    Args:
+        changes (dict): Partition file path -> complete list of records to replace it with
+        appends (dict): Partition file path -> records to add to the end of it
+    """
+    appends = {path: records for path, records in (appends or {}).items() if records}
+    if len(changes) + len(appends) == 0:
+        return
+    if len(changes) + len(appends) == 1:
+        #Replacing or appending to a single file is already atomic
+        for path, records in changes.items():
+            _write_partition(path, records)
+        for path, records in appends.items():
+            _append_partition(path, records)
+        return
+    os.makedirs(BOOKINGS_DIR, exist_ok=True)
+    journal_path = os.path.join(BOOKINGS_DIR, JOURNAL_FILE)
+    with open(journal_path + ".tmp", "w", encoding="utf-8") as f:
+        f.write(json.dumps({"rewrite": changes, "append": appends}))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(journal_path + ".tmp", journal_path)
+    for path, records in changes.items():
+        _write_partition(path, records)
+    for path, records in appends.items():
+        _append_partition(path, records)
+    os.remove(journal_path)
+
+
+def _partition_locks(paths):
+    """Cross-process locks for writing some partition files, see _file_locks"""
+    return _file_locks("partition-" + os.path.basename(path) for path in paths)
+
+
+def _recover_journal():
+    """Finish a multi-partition commit that was interrupted by a crash"""
+    journal_path = os.path.join(BOOKINGS_DIR, JOURNAL_FILE)
+    if not os.path.exists(journal_path):
+        return
+    with _lock:
+        if not os.path.exists(journal_path):
+            return
+        with open(journal_path, "r", encoding="utf-8") as f:
+            journal = json.load(f)
+        for path, records in journal.get("rewrite", {}).items():
+            _write_partition(path, records)
+        #Appends may have partly happened already, so only add what's missing
+        for path, records in journal.get("append", {}).items():
+            _append_partition(path, records, skip_existing=True)
+        os.remove(journal_path)
+
+
+#Lock files held by this process, kept fresh by the heartbeat thread
+_held_lock_files = set()
+_held_lock = threading.Lock()
+_heartbeat = None
+
+
+def _touch_held_locks():
+    """Bump the modification time of every lock file this process holds"""
+    with _held_lock:
+        paths = list(_held_lock_files)
+    for path in paths:
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+
+
+def _start_heartbeat():
+    global _heartbeat
+    with _held_lock:
+        if _heartbeat is not None:
+            return
+
+        def run():
+            while True:
+                time.sleep(LOCK_REFRESH)
+                _touch_held_locks()
+
+        _heartbeat = threading.Thread(target=run, name="lock-heartbeat", daemon=True)
+        _heartbeat.start()
+
+
+@contextmanager
+def _file_locks(names):
+    """
+    Hold cross-process lock files for a critical section.
+
+    Locks are taken in sorted order so two processes can't deadlock. While
+    they are held a heartbeat thread touches them every LOCK_REFRESH
+    seconds, so only a lock file nobody touched for LOCK_TIMEOUT (its
+    process crashed) is broken, however long the holder works.
+
+    Args:
+        names (iterable): Lock names, e.g. "room-R001" or "partition-2025-12"
+    """
+    lock_dir = os.path.join(BOOKINGS_DIR, LOCK_DIR)
+    os.makedirs(lock_dir, exist_ok=True)
+    _start_heartbeat()
+    held = []
+    try:
+        for name in sorted(set(names)):
+            path = os.path.join(lock_dir, re.sub(r"[^A-Za-z0-9_.-]", "_", name) + ".lock")
+            while True:
+                try:
+                    os.close(os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+                    held.append(path)
+                    with _held_lock:
+                        _held_lock_files.add(path)
+                    break
+                except FileExistsError:
+                    try:
+                        if time.time() - os.stat(path).st_mtime > LOCK_TIMEOUT:
+                            os.remove(path)
+                            continue
+                    except OSError:
+                        continue
+                    time.sleep(0.005)
+        yield
+    finally:
+        with _held_lock:
+            _held_lock_files.difference_update(held)
+        for path in held:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+def hot_partitions():
+    """
+    List the hot partition keys in month order.
+
+    Returns:
+        list: Partition keys like "2025-12"
+    """
+    _recover_journal()
+    _migrate_legacy()
+    if not os.path.isdir(BOOKINGS_DIR):
+        return []
+    return sorted(name[:-len(_HOT_EXTENSION)] for name in os.listdir(BOOKINGS_DIR)
+                  if name.endswith(_HOT_EXTENSION))
+
+
+def cold_partitions():
+    """
+    List the cold partition files in month order.
+
+    Returns:
+        list: (partition key, file path) tuples
+    """
+    archive_dir = os.path.join(BOOKINGS_DIR, ARCHIVE_DIR)
+    if not os.path.isdir(archive_dir):
+        return []
+    found = []
+    for name in os.listdir(archive_dir):
+        for ext in _COLD_EXTENSIONS.values():
+            if name.endswith(ext):
+                found.append((name[:-len(ext)], os.path.join(archive_dir, name)))
+    return sorted(found)
+
+
+def _migrate_legacy():
+    """
+    Split an old single-file bookings.json into month partitions.
+
+    The old file is kept next to the partitions as bookings.json.migrated.
+    """
+    legacy_path = os.path.join(BOOKINGS_DIR, LEGACY_FILE)
+    if not os.path.exists(legacy_path):
+        return
+    with _lock:
+        if not os.path.exists(legacy_path):
+            return
+        try:
+            with open(legacy_path, "r") as f:
+                legacy = json.load(f)
+        except ValueError:
+            legacy = []
+        grouped = {}
+        for booking in legacy:
+            grouped.setdefault(partition_key(booking.get('check_in')), []).append(booking)
+        for key, records in grouped.items():
+            _write_partition(_hot_path(key), _read_partition(_hot_path(key)) + records)
+        os.replace(legacy_path, legacy_path + ".migrated")
+        _record_changes(added=legacy)
+
+
+def _partition_paths(include_cold=True, start=None, end=None):
+    """
+    List partition files in read order (hot first), pruned to a check-in range.
+
+    The undated partition is always kept since its records can't be placed.
+    """
+    first_key = partition_key(start) if start else None
+    last_key = partition_key(end) if end else None
+
+    def wanted(key):
+        if key == UNDATED_PARTITION:
+            return True
+        if first_key and first_key != UNDATED_PARTITION and key < first_key:
+            return False
+        if last_key and last_key != UNDATED_PARTITION and key > last_key:
+            return False
+        return True
+
+    paths = [_hot_path(key) for key in hot_partitions() if wanted(key)]
+    if include_cold:
+        paths += [path for key, path in cold_partitions() if wanted(key)]
+    return paths
+
+
+def iter_bookings(filter=None, include_cold=True, start=None, end=None):
+    """
+    Stream bookings out of storage one record at a time.
+
+    Only one line is held in memory at a time, so callers can stop early
+    (e.g. once they found a match) without reading the rest of the history.
+
+    Args:
+        filter (callable): Optional predicate, only bookings it accepts are yielded
+        include_cold (bool): Also read the compressed archive
+        start (str): Skip partitions for check-in months before this date
+        end (str): Skip partitions for check-in months after this date
+
+    Yields:
+        dict: Booking dictionaries
+    """
+    for path in _partition_paths(include_cold, start, end):
+        for booking in _iter_partition(path):
+            if filter is None or filter(booking):
+                yield booking
+
+
+def load_bookings(include_cold=True):
+    """
+    Load bookings from storage.
+
+    Args:
+        include_cold (bool): Also read the compressed archive (reports need this)
+
+    Returns:
+        list: List of booking dictionaries, empty list if none found
+    """
+    return list(iter_bookings(include_cold=include_cold))
+
+
+def load_active_bookings(check_in=None, check_out=None):
+    """
+    Load the hot bookings that could overlap a stay.
+
+    Cold partitions only hold stays that are already over so they are never
+    read. Partitions for months after the check-out date are skipped too,
+    since nothing in them can start before the guest leaves.
+
+    Args:
+        check_in (str): Check-in date "YYYY-MM-DD" (unused, kept for symmetry)
+        check_out (str): Check-out date "YYYY-MM-DD", None reads every hot partition
+
+    Returns:
+        list: List of booking dictionaries
+    """
+    return list(iter_bookings(include_cold=False, end=check_out))
+
+
+def normalize_date(text):
+    """
+    Zero-pad a date like "2026-1-4" to "2026-01-04" so dates compare correctly as strings.
+
+    Args:
+        text (str): Date "YYYY-MM-DD", month and day may be unpadded
+
+    Returns:
+        str: The padded date, or text unchanged if it isn't a date
+    """
+    if isinstance(text, str) and len(text) == 10 and text[4] == "-" and text[7] == "-":
+        return text
+    try:
+        return datetime.strptime(text, "%Y-%m-%d").strftime("%Y-%m-%d")
+    except (TypeError, ValueError):
+        return text
+
+
+def normalize_email(email):
+    """Lowercase and trim an email so lookups don't depend on how it was typed"""
+    return str(email or "").strip().lower()
+
+
+def normalize_phone(phone):
+    """Keep only the digits of a phone number, e.g. "(555) 123-4567" -> "5551234567" """
+    text = str(phone or "").strip().lower()
+    digits = "".join(c for c in text if c.isdigit())
+    return digits or text
+
+
+class BookingIndex:
+    """
+    In-memory lookup tables over a set of partitions.
+
+    get_index() keeps one over the hot partitions, which is all availability
+    needs; get_cold_index() keeps another over the archive, only built when a
+    lookup misses the hot one. Each is built with one scan the first time it
+    is needed and kept up to date by the write functions in this module. The
+    modification time of every partition file is remembered, so writes made
+    by another process are noticed and the index gets rebuilt.
+
+    Attributes:
+        by_conf (dict): Confirmation number -> partition file holding it
+        by_email (dict): Normalized guest email -> list of confirmation numbers
+        by_phone (dict): Normalized guest phone -> list of confirmation numbers
+        rooms (dict): Room id -> {confirmation number: (check_in, check_out)} for stays that aren't cancelled
+        room_versions (dict): Room id -> counter bumped every time that room's stays change
+        mtimes (dict): Partition file -> modification time when last indexed
+    """
+
+    def __init__(self):
+        self.by_conf = {}
+        self.by_email = {}
+        self.by_phone = {}
+        self.rooms = {}
+        self.room_versions = {}
+        self.mtimes = {}
+        self._by_path = {}
+        self._keys = {}
+
+    def add(self, booking, path):
+        """Index one booking stored in path (the first copy seen wins)"""
+        conf = booking.get('confirmation_number')
+        if conf is None or conf in self.by_conf:
+            return
+        self.by_conf[conf] = path
+        self._by_path.setdefault(path, set()).add(conf)
+        email = normalize_email(booking.get('guest_email'))
+        if email:
+            self.by_email.setdefault(email, []).append(conf)
+        phone = normalize_phone(booking.get('guest_phone'))
+        if phone:
+            self.by_phone.setdefault(phone, []).append(conf)
+        room_id = booking.get('room_id')
+        if booking.get('status') != 'CANCELLED':
+            self.rooms.setdefault(room_id, {})[conf] = (normalize_date(booking.get('check_in')),
+                                                        normalize_date(booking.get('check_out')))
+            self.room_versions[room_id] = self.room_versions.get(room_id, 0) + 1
+        self._keys[conf] = (email, phone, room_id)
+
+    def remove_path(self, path):
+        """Drop every booking indexed under path"""
+        for conf in self._by_path.pop(path, ()):
+            del self.by_conf[conf]
+            email, phone, room_id = self._keys.pop(conf)
+            if email:
+                self.by_email[email].remove(conf)
+            if phone:
+                self.by_phone[phone].remove(conf)
+            if self.rooms.get(room_id, {}).pop(conf, None) is not None:
+                self.room_versions[room_id] = self.room_versions.get(room_id, 0) + 1
+
+    def reindex(self, path, records):
+        """Replace everything indexed under path with records"""
+        self.remove_path(path)
+        for booking in records:
+            self.add(booking, path)
+
+    def conflicts(self, room_id, check_in, check_out, ignore=()):
+        """
+        Stays in a room that overlap a date range.
+
+        Args:
+            room_id (str): Room to check
+            check_in (str): Check-in date "YYYY-MM-DD"
+            check_out (str): Check-out date "YYYY-MM-DD"
+            ignore (iterable): Confirmation numbers to leave out
+
+        Returns:
+            list: Confirmation numbers of the overlapping stays
+        """
+        check_in, check_out = normalize_date(check_in), normalize_date(check_out)
+        return [conf for conf, (booked_in, booked_out) in self.rooms.get(room_id, {}).items()
+                if conf not in ignore and not (check_out <= booked_in or check_in >= booked_out)]
+
+
+class BookingConflictError(Exception):
+    """
+    Raised at commit time when a room was booked by someone else after the search.
+
+    Attributes:
+        room_id (str): Room that is no longer free
+        check_in (str): Requested check-in date
+        check_out (str): Requested check-out date
+        conflicts (list): Confirmation numbers of the stays in the way
+        alternatives (list): Other rooms that are still free, filled in by the caller if it knows the room list
+    """
+
+    def __init__(self, room_id, check_in, check_out, conflicts, alternatives=None):
+        super().__init__(f"Room {room_id} is no longer available from {check_in} to {check_out}")
+        self.room_id = room_id
+        self.check_in = check_in
+        self.check_out = check_out
+        self.conflicts = conflicts
+        self.alternatives = alternatives or []
+
+
+class ConfirmationNumberTakenError(ValueError):
+    """
+    Raised at commit time when a new booking's confirmation number is already stored.
+
+    Numbers are drawn at random in each process, so two processes can draw
+    the same one; give the bookings new numbers and commit again.
+
+    Attributes:
+        bookings (list): The new bookings whose numbers are taken
+    """
+
+    def __init__(self, bookings):
+        numbers = ', '.join(str(b.get('confirmation_number')) for b in bookings)
+        super().__init__(f"Confirmation number already in use: {numbers}")
+        self.bookings = bookings
+
+
+_index = None
+_cold_index = None
+
+
+def _mtime(path):
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+
+def _is_cold(path):
+    return os.path.dirname(path) == os.path.join(BOOKINGS_DIR, ARCHIVE_DIR)
+
+
+def _build_index(signature, old=None):
+    """Index the partitions in signature (path -> mtime), carrying room versions over from old"""
+    index = BookingIndex()
+    for path in signature:
+        for booking in _iter_partition(path):
+            index.add(booking, path)
+    index.mtimes = signature
+    if old is not None:
+        index.room_versions = {
+            room_id: old.room_versions.get(room_id, 0) + (old.rooms.get(room_id) != index.rooms.get(room_id))
+            for room_id in set(old.rooms) | set(index.rooms)}
+    return index
+
+
+def get_index():
+    """
+    Get the index over the hot partitions, rebuilding it if they changed underneath it.
+
+    The cold archive is left out so availability never decompresses or even
+    stats it; see get_cold_index for lookups of archived bookings.
+
+    Room versions carry over a rebuild: rooms whose stays are unchanged
+    keep their number and the others are bumped, so a version taken before
+    another process wrote is still comparable afterwards.
+
+    Returns:
+        BookingIndex: The current index
+    """
+    global _index
+    with _lock:
+        current = {path: _mtime(path) for path in _partition_paths(include_cold=False)}
+        if _index is None or _index.mtimes != current:
+            _index = _build_index(current, _index)
+        return _index
+
+
+def get_cold_index():
+    """
+    Get the index over the cold archive, building it the first time it is asked for.
+
+    Returns:
+        BookingIndex: The current cold index
+    """
+    global _cold_index
+    with _lock:
+        current = {path: _mtime(path) for _, path in cold_partitions()}
+        if _cold_index is None or _cold_index.mtimes != current:
+            _cold_index = _build_index(current)
+        return _cold_index
+
+
+def _path_of(conf_num):
+    """Partition holding a confirmation number, looking in the archive only if it isn't hot"""
+    path = get_index().by_conf.get(conf_num)
+    if path is None:
+        path = get_cold_index().by_conf.get(conf_num)
+    return path
+
+
+def _indexed_write(path, before, added=(), records=None):
+    """
+    Tell the index about a write this process just made to path.
+
+    The file's new modification time is only adopted if the index had read
+    it as it was just before the write; otherwise another process wrote it
+    too and the whole file is indexed again, so their bookings aren't lost.
+
+    Args:
+        path (str): Partition file that was written
+        before (int): The file's modification time just before the write
+        added (iterable): Bookings appended to the file
+        records (list): Full new contents if the file was rewritten
+
+    Returns:
+        int: The file's modification time after the write
+    """
+    after = _mtime(path)
+    index = _cold_index if _is_cold(path) else _index
+    if index is None:
+        return after
+    if index.mtimes.get(path) != before:
+        index.reindex(path, _read_partition(path))
+    else:
+        if records is not None:
+            index.reindex(path, records)
+        for booking in added:
+            index.add(booking, path)
+    if after is None:
+        index.mtimes.pop(path, None)
+    else:
+        index.mtimes[path] = after
+    return after
+
+
+def room_conflicts(room_id, check_in, check_out):
+    """
+    Stays that are in the way of booking a room, straight from the index.
+
+    Args:
+        room_id (str): Room to check
+        check_in (str): Check-in date "YYYY-MM-DD"
+        check_out (str): Check-out date "YYYY-MM-DD"
+
+    Returns:
+        list: Confirmation numbers of overlapping stays that aren't cancelled
+    """
+    return get_index().conflicts(room_id, check_in, check_out)
+
+
+def room_versions(room_ids):
+    """
+    Current version of each room, to remember at search time.
+
+    Pass the number back as expected_version when reserving; if it still
+    matches at commit nothing was booked in that room in between.
+
+    Args:
+        room_ids (iterable): Rooms to look up
+
+    Returns:
+        dict: Room id -> version number
+    """
+    index = get_index()
+    return {room_id: index.room_versions.get(room_id, 0) for room_id in room_ids}
+
+
+def _record_changes(added=(), changed=(), stamps=None):
+    """
+    Pass a write that just landed on to the daily rollups and the forecast model.
+
+    Args:
+        added (iterable): New bookings
+        changed (iterable): (booking, status before the write) pairs
+        stamps (dict): Partition file -> (modification time before, after) for the files written
+    """
+    #Imported here since rollups builds on this module
+    import rollups
+    try:
+        rollups.apply_changes(added, changed)
+    except OSError as e:
+        print(f"Could not update the daily rollups, run 'rollups rebuild' later: {e}")
+    #Only a process that imported forecast (and so has NumPy) can have a model to keep current
+    forecast = sys.modules.get("forecast")
+    if forecast is not None:
+        forecast.apply_changes(added, changed, stamps)
+
+
+def save_booking(booking_dict):
+    """
+    Save a new booking by appending it to its check-in month partition.
+
+    Args:
+        booking_dict (dict): Complete booking data to save
+    """
+    _migrate_legacy()
+    os.makedirs(BOOKINGS_DIR, exist_ok=True)
+    path = _hot_path(partition_key(booking_dict.get('check_in')))
+    #Another process rewriting this partition (a status change, the archiver) must not drop the append,
+    #and the index is refreshed inside the lock so nothing they wrote before it is missed
+    with _partition_locks([path]), _lock:
+        get_index()
+        before = _mtime(path)
+        with open(path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(booking_dict) + "\n")
+        after = _indexed_write(path, before, [booking_dict])
+        _record_changes(added=[booking_dict], stamps={path: (before, after)})
+
+
+def update_booking_status(conf_num, new_status):
+    """
+    Update the status of a stored booking.
+
+    The index says which partition holds the booking so only that one file
+    is read and rewritten.
+
+    Args:
+        conf_num (str): Confirmation number of booking to update
+        new_status (str): New status ("CONFIRMED" or "CANCELLED")
+
+    Returns:
+        bool: True if a matching booking was found and updated, False otherwise.
+    """
+    while True:
+        path = _path_of(conf_num)
+        if path is None:
+            return False
+        with _partition_locks([path]), _lock:
+            #The archiver may have moved it while we waited for the lock
+            if _path_of(conf_num) != path:
+                continue
+            records = _read_partition(path)
+            booking = next((b for b in records if b.get('confirmation_number') == conf_num), None)
+            if booking is None:
+                return False
+            old_status, booking['status'] = booking.get('status'), new_status
+            before = _mtime(path)
+            _write_partition(path, records)
+            after = _indexed_write(path, before, records=records)
+            _record_changes(changed=[(booking, old_status)], stamps={path: (before, after)})
+            return True
+
+
+def update_booking_statuses(mapping):
+    """
+    Update the status of many bookings in a single pass.
+
+    Bookings are grouped by partition so each affected file is read once
+    and all of them are committed together, instead of one full rewrite
+    per booking.
+
+    Args:
+        mapping (dict): Confirmation number -> new status
+
+    Returns:
+        dict: Confirmation number -> True if updated, False if not found
+    """
+    results = {conf: False for conf in mapping}
+
+    def grouped():
+        by_path = {}
+        for conf in mapping:
+            path = _path_of(conf)
+            if path is not None:
+                by_path.setdefault(path, []).append(conf)
+        return by_path
+
+    while True:
+        by_path = grouped()
+        with _partition_locks(by_path), _lock:
+            #The archiver may have moved some of them while we waited for the locks
+            if grouped() != by_path:
+                continue
+            changes, changed = {}, []
+            for path, confs in by_path.items():
+                wanted = set(confs)
+                records = _read_partition(path)
+                for booking in records:
+                    conf = booking.get('confirmation_number')
+                    if conf in wanted:
+                        changed.append((booking, booking.get('status')))
+                        booking['status'] = mapping[conf]
+                        results[conf] = True
+                changes[path] = records
+            before = {path: _mtime(path) for path in changes}
+            _commit_partitions(changes)
+            stamps = {path: (before[path], _indexed_write(path, before[path], records=records))
+                      for path, records in changes.items()}
+            _record_changes(changed=changed, stamps=stamps)
+            return results
+
+
+def update_statuses_where(new_status, predicate=None, room_ids=None, start=None, end=None, status=None):
+    """
+    Update the status of every booking matching some criteria in one pass.
+
+    Meant for things like closing a wing: all CONFIRMED bookings for some
+    rooms whose stay overlaps a date range. Only hot partitions are looked
+    at since archived stays are already over.
+
+    Args:
+        new_status (str): Status to set
+        predicate (callable): Optional extra test a booking must pass
+        room_ids (iterable): Only bookings for these rooms
+        start (str): Only stays that check out after this date "YYYY-MM-DD"
+        end (str): Only stays that check in before this date "YYYY-MM-DD"
+        status (str): Only bookings currently in this status, e.g. "CONFIRMED"
+
+    Returns:
+        list: The updated booking dictionaries
+    """
+    room_ids = set(room_ids) if room_ids is not None else None
+    start, end = normalize_date(start), normalize_date(end)
+
+    def matches(booking):
+        if room_ids is not None and booking.get('room_id') not in room_ids:
+            return False
+        if status is not None and booking.get('status') != status:
+            return False
+        if start and not str(normalize_date(booking.get('check_out')) or "") > start:
+            return False
+        if end and not str(normalize_date(booking.get('check_in')) or "") < end:
+            return False
+        return predicate is None or predicate(booking)
+
+    while True:
+        paths = _partition_paths(include_cold=False, end=end)
+        #Every partition read is locked, a match can only be written back if nobody changed the file meanwhile
+        with _partition_locks(paths), _lock:
+            #A partition created while we waited for the locks has to be locked too
+            if _partition_paths(include_cold=False, end=end) != paths:
+                continue
+            get_index()
+            updated, changed, changes = [], [], {}
+            for path in paths:
+                records = _read_partition(path)
+                hits = [b for b in records if matches(b)]
+                for booking in hits:
+                    changed.append((booking, booking.get('status')))
+                    booking['status'] = new_status
+                if hits:
+                    changes[path] = records
+                    updated.extend(hits)
+            before = {path: _mtime(path) for path in changes}
+            _commit_partitions(changes)
+            stamps = {path: (before[path], _indexed_write(path, before[path], records=records))
+                      for path, records in changes.items()}
+            _record_changes(changed=changed, stamps=stamps)
+            return updated
+
+
+def find_booking(conf_num):
+    """
+    Find a booking by confirmation number.
+
+    The index points at the one partition to stream through.
+
+    Args:
+        conf_num (str): The confirmation number
+
+    Returns:
+        dict: Booking data if found, None otherwise
+    """
+    path = _path_of(conf_num)
+    if path is None:
+        return None
+    return next((b for b in _iter_partition(path) if b.get('confirmation_number') == conf_num), None)
+
+
+def find_bookings_by_guest(email=None, phone=None):
+    """
+    Find every reservation a guest has made, by email and/or phone.
+
+    Both are normalized (trimmed, lowercased, phone reduced to digits) so
+    "Jane@Example.com " and "jane@example.com" match. Only the partitions
+    that hold the guest's bookings are read, archived stays included.
+
+    Args:
+        email (str): Guest email address
+        phone (str): Guest phone number
+
+    Returns:
+        list: Booking dictionaries, oldest first within each partition
+    """
+    by_path = {}
+    for index in (get_index(), get_cold_index()):
+        confs = []
+        if email:
+            confs += index.by_email.get(normalize_email(email), [])
+        if phone:
+            confs += index.by_phone.get(normalize_phone(phone), [])
+        for conf in dict.fromkeys(confs):
+            by_path.setdefault(index.by_conf[conf], set()).add(conf)
+    found, seen = [], set()
+    for path, wanted in by_path.items():
+        for b in _iter_partition(path):
+            #A stay can sit in both tiers for a moment while the archiver moves it
+            if b.get('confirmation_number') in wanted and b['confirmation_number'] not in seen:
+                seen.add(b['confirmation_number'])
+                found.append(b)
+    return found
+
+
+class Transaction:
+    """
+    A group of reads and writes that is committed to storage all at once.
+
+    Partitions are read into memory the first time the transaction needs
+    them and every change is made there. On commit each touched partition
+    is written exactly once through the journal, and new bookings are
+    appended. Nothing reaches disk if the block raises. Get one with
+    storage.transaction().
+
+    Reservations made with reserve() are checked again at commit time
+    (compare-and-set): if the room's version moved since the search, the
+    commit looks for an overlapping stay and raises BookingConflictError
+    instead of double-booking.
+
+    Attributes:
+        changes (dict): Partition file path -> records read by the transaction
+    """
+
+    def __init__(self):
+        self.changes = {}
+        self._loaded_mtimes = {}
+        self._statuses = {}
+        #Confirmation number -> status before the transaction first changed it
+        self._previous = {}
+        self._inserts = {}
+        self._reserved = []
+
+    def _partition(self, path):
+        if path not in self.changes:
+            self._loaded_mtimes[path] = _mtime(path)
+            self.changes[path] = _read_partition(path)
+        return self.changes[path]
+
+    def _locate(self, conf_num):
+        for path, records in list(self._inserts.items()) + list(self.changes.items()):
+            for booking in records:
+                if booking.get('confirmation_number') == conf_num:
+                    return path, booking
+        path = _path_of(conf_num)
+        if path is None:
+            return None, None
+        return path, next((b for b in self._partition(path) if b.get('confirmation_number') == conf_num), None)
+
+    def find(self, conf_num):
+        """
+        Find a booking inside the transaction.
+
+        Args:
+            conf_num (str): The confirmation number
+
+        Returns:
+            dict: The booking as it will be committed, None if not found
+        """
+        return self._locate(conf_num)[1]
+
+    def update_status(self, conf_num, new_status):
+        """
+        Change a booking's status inside the transaction.
+
+        Returns:
+            bool: True if the booking was found
+        """
+        path, booking = self._locate(conf_num)
+        if booking is None:
+            return False
+        if not any(b is booking for b in self._inserts.get(path, ())):
+            self._previous.setdefault(conf_num, booking.get('status'))
+            self._statuses.setdefault(path, {})[conf_num] = new_status
+        booking['status'] = new_status
+        return True
+
+    def insert(self, booking_dict):
+        """Add a new booking to its check-in month partition inside the transaction"""
+        path = _hot_path(partition_key(booking_dict.get('check_in')))
+        self._inserts.setdefault(path, []).append(booking_dict)
+
+    def reserve(self, booking_dict, expected_version=None):
+        """
+        Insert a booking that must not overlap any other stay in its room.
+
+        Args:
+            booking_dict (dict): The new booking
+            expected_version (int): Room version from room_versions() at search
+                time. If it still matches at commit the check is skipped, since
+                nothing changed; None always re-checks.
+        """
+        self.insert(booking_dict)
+        self._reserved.append((booking_dict, expected_version))
+
+    def _verify(self, index):
+        """
+        Compare-and-set check of every reservation against the fresh index.
+
+        Raises:
+            BookingConflictError: A reserved room was taken since the search
+            ConfirmationNumberTakenError: A new booking's confirmation number is already stored (or used twice in it)
+        """
+        #Numbers are drawn at random in each process, so two processes can draw the same one
+        seen, taken = set(), []
+        for records in self._inserts.values():
+            for booking in records:
+                conf = booking.get('confirmation_number')
+                if conf is not None and (conf in index.by_conf or conf in seen):
+                    taken.append(booking)
+                seen.add(conf)
+        if taken:
+            raise ConfirmationNumberTakenError(taken)
+        cancelled = {conf for updates in self._statuses.values()
+                     for conf, status in updates.items() if status == 'CANCELLED'}
+        #Room id -> (check_in, check_out, confirmation number) of the reservations already accepted,
+        #sorted and never overlapping, so a bulk import checks each one with a binary search
+        accepted = {}
+        for booking, expected_version in self._reserved:
+            if booking.get('status') == 'CANCELLED':
+                continue
+            room_id = booking.get('room_id')
+            check_in, check_out = normalize_date(booking.get('check_in')), normalize_date(booking.get('check_out'))
+            taken = accepted.setdefault(room_id, [])
+            stay = (check_in, check_out, booking.get('confirmation_number') or "")
+            i = bisect.bisect_left(taken, stay)
+            clashes = [taken[i - 1][2]] if i and taken[i - 1][1] > check_in else []
+            j = i
+            while j < len(taken) and taken[j][0] < check_out:
+                clashes.append(taken[j][2])
+                j += 1
+            if expected_version is None or index.room_versions.get(room_id, 0) != expected_version:
+                clashes += index.conflicts(room_id, check_in, check_out, ignore=cancelled)
+            if clashes:
+                raise BookingConflictError(room_id, check_in, check_out, clashes)
+            taken.insert(i, stay)
+
+    def commit(self):
+        """
+        Write every touched partition in one atomic commit.
+
+        Nothing is written if it raises, so it can be called again.
+
+        Raises:
+            BookingConflictError: A reserved room was taken since the search
+            ConfirmationNumberTakenError: A new booking's number was stored first by someone else
+        """
+        locks = ["room-" + str(b.get('room_id')) for b, _ in self._reserved]
+        locks += ["partition-" + os.path.basename(path) for path in list(self._statuses) + list(self._inserts)]
+        #_lock covers reading the index, the write and updating the index, never the caller's block
+        with _file_locks(locks), _lock:
+            #Fresh index so bookings made by other processes are seen
+            self._verify(get_index())
+            rewrites, changed = {}, []
+            for path, updates in self._statuses.items():
+                records = self.changes[path]
+                if _mtime(path) != self._loaded_mtimes[path]:
+                    #Someone else wrote this partition since we read it, apply our changes to their version
+                    records = _read_partition(path)
+                    for booking in records:
+                        if booking.get('confirmation_number') in updates:
+                            self._previous[booking['confirmation_number']] = booking.get('status')
+                            booking['status'] = updates[booking['confirmation_number']]
+                changed += [(b, self._previous[b['confirmation_number']]) for b in records
+                            if b.get('confirmation_number') in updates]
+                rewrites[path] = records + self._inserts.get(path, [])
+            appends = {path: records for path, records in self._inserts.items() if path not in rewrites}
+            before = {path: _mtime(path) for path in list(rewrites) + list(appends)}
+            _commit_partitions(rewrites, appends)
+            stamps = {}
+            for path, records in rewrites.items():
+                stamps[path] = (before[path], _indexed_write(path, before[path], records=records))
+            for path, records in appends.items():
+                stamps[path] = (before[path], _indexed_write(path, before[path], added=records))
+            _record_changes([b for records in self._inserts.values() for b in records], changed, stamps)
+        self.__init__()
+
+
+@contextmanager
+def transaction(renumber=None):
+    """
+    Run a block of storage changes as one atomic commit.
+
+    Example:
+        >>> with transaction(renumber) as tx:
+        ...     tx.update_status(old_conf, "CANCELLED")
+        ...     tx.insert(new_booking)
+
+    Args:
+        renumber (callable): renumber(bookings) gives new bookings fresh confirmation numbers.
+            If set, a commit whose numbers were stored first by another process is
+            retried with new ones instead of raising ConfirmationNumberTakenError
+
+    Yields:
+        Transaction: Collects the changes, committed when the block ends
+    """
+    #No lock is held over the block, commit takes the lock files first and then _lock
+    tx = Transaction()
+    yield tx
+    for attempt in range(RENUMBER_ATTEMPTS):
+        try:
+            tx.commit()
+            return
+        except ConfirmationNumberTakenError as e:
+            if renumber is None or attempt == RENUMBER_ATTEMPTS - 1:
+                raise
+            renumber(e.bookings)
+
+
+def archive_closed_stays(today=None):
+    """
+    Move stays that are already over into compressed cold partitions.
+
+    A stay is closed once its check-out date has passed, whatever its status.
+    The cold file is written before the hot one is trimmed and records already
+    in the archive are skipped, so re-running after a crash is safe.
+
+    Args:
+        today (str): Date "YYYY-MM-DD" to archive against, defaults to today
+
+    Returns:
+        int: Number of bookings moved to the cold tier
+    """
+    today = today or datetime.now().strftime("%Y-%m-%d")
+    moved = 0
+    for key in hot_partitions():
+        hot_path, cold_path = _hot_path(key), _cold_path(key)
+        #_lock too, so an in-process count (rollups.rebuild) never sees a stay in both tiers
+        with _partition_locks([hot_path, cold_path]), _lock:
+            records = _read_partition(hot_path)
+            keep, closed = [], []
+            for booking in records:
+                check_out = normalize_date(booking.get('check_out'))
+                if partition_key(check_out) != UNDATED_PARTITION and check_out < today:
+                    closed.append(booking)
+                else:
+                    keep.append(booking)
+            if not closed:
+                continue
+            archived = _read_partition(cold_path)
+            seen = {b.get('confirmation_number') for b in archived}
+            archived.extend(b for b in closed if b.get('confirmation_number') not in seen)
+            _write_partition(cold_path, archived)
+            _write_partition(hot_path, keep)
+            moved += len(closed)
+    return moved
+
+
+def start_archiver(interval_seconds=3600):
+    """
+    Run archive_closed_stays every interval on a daemon thread.
+
+    Args:
+        interval_seconds (float): Seconds between archive passes
+
+    Returns:
+        threading.Event: Set it to stop the archiver
+    """
+    stop = threading.Event()
+
+    def run():
+        while not stop.is_set():
+            try:
+                archive_closed_stays()
+            except OSError as e:
+                print(f"Archiver failed: {e}")
+            stop.wait(interval_seconds)
+
+    threading.Thread(target=run, name="booking-archiver", daemon=True).start()
+    return stop
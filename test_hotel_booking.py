@@ -8,10 +8,16 @@ Run with: python -m pytest test_hotel_booking.py -v
 Or with unittest: python -m unittest test_hotel_booking.py
 """
 
+import csv
+import http.client
+import importlib.util
+import io
 import unittest
 import os
 import json
 import tempfile
+import time
+from contextlib import contextmanager
 from datetime import datetime, timedelta
 from unittest.mock import patch, MagicMock
 
@@ -368,6 +374,29 @@ class TestUtilityFunctions(unittest.TestCase):
         self.assertTrue(conf_num.startswith('#'))
         self.assertEqual(len(conf_num), 9)  # # + 8 characters
 
+    def test_conf_numbers_are_unique_and_checked(self):
+        """Generated numbers carry a check character and never repeat stored ones"""
+        from utils import allocate_conf_numbers, generate_conf_number, is_valid_conf_number
+        taken = {"#TAKEN001": "bookings/2025-12.jsonl"}
+
+        with patch("storage.get_index", return_value=MagicMock(by_conf=taken)):
+            block = allocate_conf_numbers(500)
+            conf_num = generate_conf_number()
+
+        self.assertEqual(len(set(block + [conf_num])), 501)
+        self.assertTrue(all(is_valid_conf_number(c) for c in block))
+        self.assertEqual(len(conf_num), 9)
+        typo = conf_num[:4] + ("0" if conf_num[4] != "0" else "1") + conf_num[5:]
+        self.assertFalse(is_valid_conf_number(typo))
+        #Numbers that made it into storage are no longer tracked in memory
+        import collections
+        with patch("utils._issued_conf_numbers", {}) as issued, patch("utils._issued_order", collections.deque()):
+            with patch("storage.get_index", return_value=MagicMock(by_conf=taken)):
+                block = allocate_conf_numbers(500)
+            with patch("storage.get_index", return_value=MagicMock(by_conf=dict.fromkeys(block))):
+                fresh = allocate_conf_numbers(1)
+            self.assertEqual(list(issued), fresh)
+
 
 class TestRefactoringImpact(unittest.TestCase):
     """Test Cases for Refactored Methods"""
@@ -414,6 +443,1266 @@ class TestRefactoringImpact(unittest.TestCase):
         self.assertIsNone(screen_updates[1]["color"])
 
 
+class TestPartitionedStorage(unittest.TestCase):
+    """Test Cases for storage.py - Month Partitions and Cold Archive"""
+
+    def setUp(self):
+        """Point storage at a throwaway bookings folder"""
+        self.tmp = tempfile.TemporaryDirectory()
+        self.dir_patch = patch("storage.BOOKINGS_DIR", self.tmp.name)
+        self.dir_patch.start()
+        self.booking = {
+            "confirmation_number": "#PART001",
+            "room_id": "R002",
+            "guest_name": "Test User",
+            "guest_email": "test@example.com",
+            "guest_phone": "555-1234",
+            "room_type": "Double",
+            "check_in": "2025-12-10",
+            "check_out": "2025-12-12",
+            "nights": 2,
+            "total_price": 300.0,
+            "status": "CONFIRMED"
+        }
+
+    def tearDown(self):
+        self.dir_patch.stop()
+        self.tmp.cleanup()
+
+    def test_save_booking_goes_to_month_partition(self):
+        """Booking is appended to the partition for its check-in month"""
+        import storage
+        storage.save_booking(self.booking)
+
+        self.assertEqual(storage.hot_partitions(), ["2025-12"])
+        self.assertEqual(storage.find_booking("#PART001")["room_id"], "R002")
+
+    def test_legacy_file_is_migrated(self):
+        """Old bookings.json gets split into month partitions"""
+        import storage
+        other = dict(self.booking, confirmation_number="#PART002", check_in="2026-01-03", check_out="2026-01-05")
+        with open(os.path.join(self.tmp.name, "bookings.json"), "w") as f:
+            json.dump([self.booking, other], f)
+
+        self.assertEqual(len(storage.load_bookings()), 2)
+        self.assertEqual(storage.hot_partitions(), ["2025-12", "2026-01"])
+
+    def test_archive_moves_past_stays_to_cold_tier(self):
+        """Past stays move to the archive but reports still see them"""
+        import storage
+        future = dict(self.booking, confirmation_number="#PART003", check_in="2026-02-01", check_out="2026-02-03")
+        storage.save_booking(self.booking)
+        storage.save_booking(future)
+
+        moved = storage.archive_closed_stays(today="2026-01-15")
+
+        self.assertEqual(moved, 1)
+        self.assertEqual([b["confirmation_number"] for b in storage.load_active_bookings()], ["#PART003"])
+        self.assertEqual(len(storage.load_bookings()), 2)
+        self.assertTrue(storage.update_booking_status("#PART001", "CANCELLED"))
+        self.assertEqual(storage.find_booking("#PART001")["status"], "CANCELLED")
+        self.assertEqual(storage.archive_closed_stays(today="2026-01-15"), 0)
+        #Availability only ever indexes the hot tier, archived bookings are still found by number and guest
+        self.assertEqual(list(storage.get_index().by_conf), ["#PART003"])
+        self.assertEqual(len(storage.find_bookings_by_guest(email="test@example.com")), 2)
+
+    def test_writes_take_partition_locks(self):
+        """Appends, status rewrites and the archiver hold the partition's cross-process lock"""
+        import storage
+        taken, file_locks = [], storage._file_locks
+
+        def spy(names):
+            names = sorted(names)
+            if names and names[0].startswith("partition-"):
+                taken.append(names)
+            return file_locks(names)
+
+        with patch("storage._file_locks", spy):
+            storage.save_booking(self.booking)
+            storage.update_booking_status("#PART001", "CANCELLED")
+            storage.update_booking_statuses({"#PART001": "CONFIRMED"})
+            storage.update_statuses_where("CANCELLED", room_ids=["R002"])
+            storage.archive_closed_stays(today="2026-01-15")
+        self.assertEqual(taken, [["partition-2025-12.jsonl"]] * 4
+                         + [["partition-2025-12.jsonl", "partition-2025-12.jsonl.gz"]])
+
+    def test_write_sees_append_made_while_waiting_for_lock(self):
+        """A booking another process appends just before we get the partition lock still reaches the index"""
+        import storage
+        storage.save_booking(self.booking)
+        path, file_locks = storage._hot_path("2025-12"), storage._file_locks
+
+        @contextmanager
+        def other_process_first(names):
+            names = list(names)
+            if names == ["partition-2025-12.jsonl"] and not storage.find_booking("#OTHER01"):
+                with open(path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(dict(self.booking, confirmation_number="#OTHER01", room_id="R009")) + "\n")
+                stamp = os.stat(path).st_mtime_ns - 10 ** 9
+                os.utime(path, ns=(stamp, stamp))
+            with file_locks(names):
+                yield
+
+        with patch("storage._file_locks", other_process_first):
+            storage.save_booking(dict(self.booking, confirmation_number="#PART002", check_in="2025-12-20",
+                                      check_out="2025-12-22"))
+        self.assertEqual(storage.room_conflicts("R009", "2025-12-10", "2025-12-12"), ["#OTHER01"])
+
+    def test_held_locks_are_kept_fresh(self):
+        """A lock held longer than LOCK_TIMEOUT is touched by its holder, so nobody breaks it"""
+        import storage
+        with storage._file_locks(["partition-2025-12.jsonl"]):
+            path, = storage._held_lock_files
+            stale = time.time() - 2 * storage.LOCK_TIMEOUT
+            os.utime(path, (stale, stale))
+            storage._touch_held_locks()
+            self.assertLess(time.time() - os.stat(path).st_mtime, storage.LOCK_TIMEOUT)
+        self.assertFalse(storage._held_lock_files)
+        self.assertTrue(storage._heartbeat.is_alive())
+
+    def test_iter_bookings_filters_and_prunes_months(self):
+        """Streaming iterator honours the filter and the check-in range"""
+        import storage
+        for i, check_in in enumerate(["2025-11-20", "2025-12-10", "2025-12-20", "2026-01-05"]):
+            storage.save_booking(dict(self.booking, confirmation_number=f"#ITER{i}", check_in=check_in))
+
+        in_december = storage.iter_bookings(start="2025-12-01", end="2025-12-31")
+        self.assertEqual([b["confirmation_number"] for b in in_december], ["#ITER1", "#ITER2"])
+        matches = storage.iter_bookings(lambda b: b["check_in"] > "2025-12-15")
+        self.assertEqual(next(matches)["confirmation_number"], "#ITER2")
+
+    def test_find_bookings_by_guest(self):
+        """Guest lookup normalizes email case and phone punctuation"""
+        import storage
+        storage.save_booking(self.booking)
+        storage.save_booking(dict(self.booking, confirmation_number="#GUEST02", check_in="2026-03-01",
+                                  guest_email="Test@Example.com ", guest_phone="(555) 1234"))
+        storage.save_booking(dict(self.booking, confirmation_number="#OTHER01", guest_email="x@y.com",
+                                  guest_phone="999"))
+
+        by_email = storage.find_bookings_by_guest(email="TEST@example.com")
+        by_phone = storage.find_bookings_by_guest(phone="555.1234")
+
+        self.assertEqual(sorted(b["confirmation_number"] for b in by_email), ["#GUEST02", "#PART001"])
+        self.assertEqual(sorted(b["confirmation_number"] for b in by_phone), ["#GUEST02", "#PART001"])
+        self.assertEqual(storage.find_bookings_by_guest(email="nobody@example.com"), [])
+
+    def test_bulk_status_updates(self):
+        """Many statuses change in one pass, with a result per booking"""
+        import storage
+        storage.save_booking(self.booking)
+        storage.save_booking(dict(self.booking, confirmation_number="#PART002", room_id="R005"))
+        storage.save_booking(dict(self.booking, confirmation_number="#PART003", check_in="2026-01-03",
+                                  check_out="2026-01-05"))
+
+        results = storage.update_booking_statuses({"#PART001": "CANCELLED", "#FAKE999": "CANCELLED"})
+        closed = storage.update_statuses_where("CANCELLED", room_ids=["R002"], start="2026-01-01",
+                                               end="2026-02-01", status="CONFIRMED")
+
+        self.assertEqual(results, {"#PART001": True, "#FAKE999": False})
+        self.assertEqual([b["confirmation_number"] for b in closed], ["#PART003"])
+        self.assertEqual(storage.find_booking("#PART002")["status"], "CONFIRMED")
+        self.assertEqual(storage.find_booking("#PART003")["status"], "CANCELLED")
+
+    def test_cancel_reservations_queues_emails(self):
+        """Batched cancel sends one email per cancelled reservation through the outbox"""
+        import storage
+        from createReservation_logic import cancel_reservations
+        storage.save_booking(self.booking)
+
+        with patch("createReservation_logic.queue_message") as queue, patch("createReservation_logic.flush_outbox") as flush:
+            results = cancel_reservations({"#PART001": self.booking, "#FAKE999": self.booking}, "hotel@example.com", "pw")
+
+        self.assertEqual(results, {"#PART001": True, "#FAKE999": False})
+        self.assertEqual(queue.call_count, 1)
+        self.assertIn(b"Original Confirmation Number: #PART001", queue.call_args[0][3])
+        flush.assert_called_once()
+
+    def test_transaction_commits_or_discards_everything(self):
+        """Changes land together on commit and not at all if the block fails"""
+        import storage
+        storage.save_booking(self.booking)
+        moved = dict(self.booking, confirmation_number="#PART002", check_in="2026-01-03", check_out="2026-01-05")
+
+        with self.assertRaises(RuntimeError):
+            with storage.transaction() as tx:
+                tx.update_status("#PART001", "CANCELLED")
+                tx.insert(moved)
+                raise RuntimeError("crash before commit")
+        self.assertEqual(storage.find_booking("#PART001")["status"], "CONFIRMED")
+        self.assertIsNone(storage.find_booking("#PART002"))
+
+        with storage.transaction() as tx:
+            tx.update_status("#PART001", "CANCELLED")
+            tx.insert(moved)
+        self.assertEqual(storage.find_booking("#PART001")["status"], "CANCELLED")
+        self.assertEqual(storage.find_booking("#PART002")["check_in"], "2026-01-03")
+
+    def test_interrupted_commit_is_replayed(self):
+        """A journal left behind by a crash is applied on the next access"""
+        import storage
+        path = os.path.join(self.tmp.name, "2025-12.jsonl")
+        appended = dict(self.booking, confirmation_number="#PART002", check_in="2026-01-03", check_out="2026-01-05")
+        storage.save_booking(appended)
+        with open(os.path.join(self.tmp.name, storage.JOURNAL_FILE), "w") as f:
+            json.dump({"rewrite": {path: [self.booking]},
+                       "append": {os.path.join(self.tmp.name, "2026-01.jsonl"): [appended]}}, f)
+
+        self.assertEqual(storage.find_booking("#PART001")["room_id"], "R002")
+        self.assertEqual(len(storage.load_bookings()), 2)
+        self.assertFalse(os.path.exists(os.path.join(self.tmp.name, storage.JOURNAL_FILE)))
+
+    def test_modify_reservation_is_one_transaction(self):
+        """Modify cancels the old booking and stores the new one together"""
+        import storage
+        from createReservation_logic import modify_reservation
+        from models import Room
+        storage.save_booking(self.booking)
+        room = Room("R002", "Double", 2, 1, 150.0, ["None"])
+        guest = {"name": "Test User", "email": "test@example.com", "phone": "555-1234", "card": "4111"}
+        prefs = {"check_in": "2026-01-03", "check_out": "2026-01-05", "nights": 2}
+
+        with patch("createReservation_logic.send_email"), patch("storage._commit_partitions",
+                                                                  wraps=storage._commit_partitions) as commit:
+            new_booking = modify_reservation("#PART001", guest, prefs, room, "hotel@example.com", "pw")
+
+        commit.assert_called_once()
+        self.assertEqual(storage.find_booking("#PART001")["status"], "CANCELLED")
+        self.assertEqual(storage.find_booking(new_booking["confirmation_number"])["check_in"], "2026-01-03")
+
+    def test_reservation_commit_rejects_double_booking(self):
+        """A room booked after the search fails the compare-and-set commit"""
+        import storage
+        search_versions = storage.room_versions(["R002"])
+        storage.save_booking(self.booking)
+        late = dict(self.booking, confirmation_number="#LATE001", check_in="2025-12-11", check_out="2025-12-13")
+
+        with self.assertRaises(storage.BookingConflictError) as raised:
+            with storage.transaction() as tx:
+                tx.reserve(late, search_versions["R002"])
+
+        self.assertEqual(raised.exception.conflicts, ["#PART001"])
+        self.assertIsNone(storage.find_booking("#LATE001"))
+        self.assertEqual(storage.room_conflicts("R002", "2025-12-12", "2025-12-14"), [])
+        with storage.transaction() as tx:
+            tx.reserve(dict(late, check_in="2025-12-12", check_out="2025-12-14"), storage.room_versions(["R002"])["R002"])
+        self.assertEqual(storage.room_conflicts("R002", "2025-12-13", "2025-12-14"), ["#LATE001"])
+
+    def test_unpadded_dates_still_conflict(self):
+        """Dates like 2026-1-4 (which validate_date accepts) are compared as dates, not strings"""
+        import storage
+        from createReservation_logic import create_reservation
+        from holds import HoldManager
+        from models import Room
+        storage.save_booking(dict(self.booking, check_in="2026-01-03", check_out="2026-01-10"))
+        self.assertEqual(storage.room_conflicts("R002", "2026-1-4", "2026-1-6"), ["#PART001"])
+        room = Room("R002", "Double", 2, 1, 150.0, ["None"])
+        guest = {"name": "Test User", "email": "test@example.com", "phone": "555-1234", "card": "4111"}
+        with self.assertRaises(storage.BookingConflictError):
+            create_reservation(guest, room, {"check_in": "2026-1-4", "check_out": "2026-1-6", "nights": 2}, "", "")
+        reservation = create_reservation(guest, room, {"check_in": "2026-1-10", "check_out": "2026-1-12", "nights": 2},
+                                         "", "")
+        self.assertEqual(reservation["check_in"], "2026-01-10")
+        holds = HoldManager()
+        holds.place("R002", "2026-01-03", "2026-01-10")
+        self.assertIsNone(holds.place("R002", "2026-1-4", "2026-1-6"))
+
+    def test_idempotent_waiters_never_run_together(self):
+        """After a failed first attempt the waiter and a newcomer with the same key still take turns"""
+        import threading
+        import time
+        from idempotency import IdempotencyStore
+        store = IdempotencyStore(path=os.path.join(self.tmp.name, "keys.log"))
+        running, most, attempts = [0], [0], []
+        release = threading.Event()
+
+        def attempt():
+            running[0] += 1
+            most[0] = max(most[0], running[0])
+            attempts.append(1)
+            if len(attempts) == 1:
+                release.wait(5)
+                running[0] -= 1
+                raise RuntimeError("first attempt fails")
+            time.sleep(0.2)
+            running[0] -= 1
+            return "done"
+
+        def call():
+            try:
+                store.run("create:k", attempt)
+            except RuntimeError:
+                pass
+
+        threads = [threading.Thread(target=call) for _ in range(3)]
+        threads[0].start()
+        time.sleep(0.05)
+        threads[1].start()
+        time.sleep(0.05)
+        release.set()
+        time.sleep(0.05)
+        threads[2].start()
+        for thread in threads:
+            thread.join(5)
+        self.assertEqual((most[0], len(attempts)), (1, 2))
+        self.assertEqual(store.get("create:k"), (True, "done"))
+
+    def test_idempotency_keys_shared_between_processes(self):
+        """Keys another process writes are seen, and its compaction keeps every live key"""
+        from idempotency import IdempotencyStore
+        path = os.path.join(self.tmp.name, "keys.log")
+        now = [1000.0]
+        api, cli = (IdempotencyStore(60, path, clock=lambda: now[0]) for _ in range(2))
+        self.assertEqual(cli.get("create:a"), (False, None))
+        api.put("create:a", "first")
+        self.assertEqual(cli.get("create:a"), (True, "first"))
+        self.assertEqual(cli.run("create:a", lambda: "second"), "first")
+        #Enough expired lines for a compaction, then a key the compacting side hasn't read yet
+        for i in range(70):
+            cli.put(f"old:{i}", i, ttl_seconds=1)
+        api.put("create:b", "kept")
+        now[0] += 30
+        self.assertEqual(cli.get("old:0"), (False, None))
+        with open(path, encoding="utf-8") as f:
+            self.assertEqual(len(f.readlines()), 2)
+        api.put("create:c", "after")
+        self.assertEqual(api.get("create:b"), (True, "kept"))
+        self.assertEqual(cli.get("create:c"), (True, "after"))
+        self.assertEqual(IdempotencyStore(60, path, clock=lambda: now[0]).get("create:a"), (True, "first"))
+
+    def test_commit_rejects_stored_confirmation_number(self):
+        """A confirmation number another process already stored can't be committed again"""
+        import storage
+        storage.save_booking(self.booking)
+        with self.assertRaises(ValueError):
+            with storage.transaction() as tx:
+                tx.reserve(dict(self.booking, room_id="R003"))
+        self.assertEqual(len(storage.load_bookings()), 1)
+        #With a renumber callback the clashing booking gets a new number and the commit goes through
+        renumbered = dict(self.booking, room_id="R003")
+        with storage.transaction(lambda bookings: bookings[0].update(confirmation_number="#PART009")) as tx:
+            tx.reserve(renumbered)
+        self.assertEqual(storage.find_booking("#PART009")["room_id"], "R003")
+
+    def test_bulk_import_commits_once(self):
+        """Bulk import rejects clashes inside the batch and with storage, then commits once"""
+        import storage
+        from createReservation_logic import create_reservations_bulk
+        from models import Room
+        from utils import read_booking_feed
+        storage.save_booking(self.booking)
+        rooms = [Room("R002", "Double", 2, 1, 150.0, ["None"]), Room("R003", "Double", 2, 1, 150.0, ["None"])]
+        feed = os.path.join(self.tmp.name, "feed.csv")
+        with open(feed, "w") as f:
+            f.write("room_id,guest_name,guest_email,guest_phone,check_in,check_out\n"
+                    "R002,Group A,a@example.com,555,2025-12-11,2025-12-13\n"
+                    "R003,Group B,b@example.com,555,2025-12-11,2025-12-13\n"
+                    "R003,Group C,c@example.com,555,2025-12-12,2025-12-14\n"
+                    "R003,Group D,d@example.com,555,2026-01-02,2026-01-04\n"
+                    "R999,Group E,e@example.com,555,2026-01-02,2026-01-04\n")
+
+        with patch("storage._commit_partitions", wraps=storage._commit_partitions) as commit:
+            created, rejected = create_reservations_bulk(read_booking_feed(feed), rooms)
+
+        commit.assert_called_once()
+        self.assertEqual([b["guest_name"] for b in created], ["Group B", "Group D"])
+        self.assertEqual([reason for _, reason in rejected],
+                         ["room already booked", "clashes with an earlier record in the batch", "unknown room"])
+        self.assertEqual(created[1]["total_price"], 300.0)
+        self.assertEqual(storage.find_booking(created[1]["confirmation_number"])["check_in"], "2026-01-02")
+
+    def test_idempotency_key_makes_retries_safe(self):
+        """A retried create with the same key returns the first booking and sends no second email"""
+        import storage
+        from createReservation_logic import create_reservation
+        from idempotency import IdempotencyStore
+        from models import Room
+        room = Room("R002", "Double", 2, 1, 150.0, ["None"])
+        guest = {"name": "Test User", "email": "test@example.com", "phone": "555-1234", "card": "4111"}
+        prefs = {"check_in": "2026-01-03", "check_out": "2026-01-05", "nights": 2}
+
+        with patch("createReservation_logic.send_email") as send:
+            first = create_reservation(guest, room, prefs, "hotel@example.com", "pw", idempotency_key="click-1")
+            retry = create_reservation(guest, room, prefs, "hotel@example.com", "pw", idempotency_key="click-1")
+
+        self.assertEqual(retry["confirmation_number"], first["confirmation_number"])
+        self.assertEqual(send.call_count, 1)
+        self.assertEqual(len(storage.load_bookings()), 1)
+        #A fresh process still remembers the key
+        self.assertEqual(IdempotencyStore().get("create:click-1"), (True, first))
+
+@unittest.skipUnless(importlib.util.find_spec("numpy"), "NumPy not installed")
+class TestBookingSegment(unittest.TestCase):
+    """Test Cases for booking_segment.py - Memory-Mapped Availability"""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.dir_patch = patch("storage.BOOKINGS_DIR", self.tmp.name)
+        self.dir_patch.start()
+        import storage
+        base = {"room_type": "Double", "guest_name": "Test User", "nights": 2, "total_price": 300.0}
+        storage.save_booking(dict(base, confirmation_number="#SEG001", room_id="R001",
+                                  check_in="2025-12-10", check_out="2025-12-12", status="CONFIRMED"))
+        storage.save_booking(dict(base, confirmation_number="#SEG002", room_id="R002",
+                                  check_in="2025-12-10", check_out="2025-12-12", status="CANCELLED"))
+
+    def tearDown(self):
+        self.dir_patch.stop()
+        self.tmp.cleanup()
+
+    def test_segment_matches_storage(self):
+        """Segment answers availability the same way the JSONL scan does"""
+        import booking_segment
+        self.assertEqual(booking_segment.write_segment(), 2)
+        segment = booking_segment.open_segment()
+
+        self.assertTrue(segment.is_current())
+        self.assertEqual(segment.confirmation_number(0), "#SEG001")
+        self.assertFalse(segment.is_room_available("R001", "2025-12-11", "2025-12-13"))
+        self.assertTrue(segment.is_room_available("R001", "2025-12-12", "2025-12-14"))
+        self.assertTrue(segment.is_room_available("R002", "2025-12-10", "2025-12-12"))
+        self.assertEqual(segment.booked_rooms("2025-12-01", "2025-12-31"), {"R001"})
+        segment.close()
+
+    def test_search_reads_current_segment(self):
+        """Once built, searches answer from the segment until a booking is written"""
+        import booking_segment
+        import storage
+        from resources import cli
+        self.assertIsNone(booking_segment.shared_segment())
+        self.assertEqual(cli._run("segment", {}), {"records": 2, "ok": True})
+        self.assertIs(booking_segment.shared_segment(), booking_segment.shared_segment())
+        with patch("room_logic.room_conflicts", side_effect=AssertionError("read the index")):
+            found = cli.search({"check_in": "2025-12-10", "check_out": "2025-12-12"})
+        self.assertNotIn("R001", [room["room_id"] for room in found["rooms"]])
+        storage.save_booking({"confirmation_number": "#SEG003", "room_id": "R003", "room_type": "Double",
+                              "check_in": "2025-12-10", "check_out": "2025-12-12", "status": "CONFIRMED"})
+        self.assertIsNone(booking_segment.shared_segment())
+
+    def test_removed_partition_makes_segment_stale(self):
+        """Dropping a partition older than the newest one still takes the segment out of use"""
+        import booking_segment
+        import storage
+        storage.save_booking({"confirmation_number": "#SEG003", "room_id": "R003", "room_type": "Double",
+                              "check_in": "2026-01-10", "check_out": "2026-01-12", "status": "CONFIRMED"})
+        booking_segment.write_segment()
+        self.assertIsNotNone(booking_segment.shared_segment())
+        os.remove(storage._hot_path("2025-12"))
+        self.assertIsNone(booking_segment.shared_segment())
+
+
+class TestRoomHolds(unittest.TestCase):
+    """Test Cases for holds.py - Tentative Room Holds"""
+
+    def setUp(self):
+        from holds import HoldManager
+        self.now = [0.0]
+        self.holds = HoldManager(ttl_seconds=60, clock=lambda: self.now[0])
+
+    def test_hold_blocks_overlap_until_expiry(self):
+        """A hold keeps the dates for its TTL and then disappears"""
+        hold_id = self.holds.place("R001", "2025-12-10", "2025-12-12")
+
+        self.assertIsNotNone(hold_id)
+        self.assertIsNone(self.holds.place("R001", "2025-12-11", "2025-12-13"))
+        self.assertIsNotNone(self.holds.place("R001", "2025-12-12", "2025-12-14"))
+        self.assertEqual(self.holds.conflicts("R001", "2025-12-10", "2025-12-11", ignore=hold_id), [])
+
+        self.now[0] = 61
+        self.assertEqual(self.holds.sweep(), 2)
+        self.assertEqual(len(self.holds), 0)
+
+    def test_release_and_extend(self):
+        """Released holds free the room; extended ones outlive their first expiry"""
+        first = self.holds.place("R001", "2025-12-10", "2025-12-12")
+        self.assertTrue(self.holds.release(first))
+        self.assertFalse(self.holds.release(first))
+
+        second = self.holds.place("R001", "2025-12-10", "2025-12-12")
+        self.now[0] = 50
+        self.assertTrue(self.holds.extend(second))
+        self.now[0] = 100
+        self.assertEqual(self.holds.conflicts("R001", "2025-12-10", "2025-12-12"), [second])
+
+    def test_held_room_is_not_available(self):
+        """Availability search and booking both respect another guest's hold"""
+        from models import Room
+        from room_logic import get_available_rooms
+        from createReservation_logic import create_reservation
+        from storage import BookingConflictError
+        room = Room("R001", "Single", 1, 1, 100.0, ["None"])
+        hold_id = self.holds.place("R001", "2025-12-10", "2025-12-12")
+        guest = {"name": "Test User", "email": "test@example.com", "phone": "555-1234", "card": "4111"}
+        prefs = {"check_in": "2025-12-10", "check_out": "2025-12-12", "nights": 2}
+
+        with tempfile.TemporaryDirectory() as tmp, patch("storage.BOOKINGS_DIR", tmp), \
+                patch("room_logic.hold_manager", self.holds), patch("createReservation_logic.hold_manager", self.holds), \
+                patch("createReservation_logic.send_email"):
+            self.assertEqual(get_available_rooms([room], "2025-12-10", "2025-12-12", 1, 1, []), [])
+            with self.assertRaises(BookingConflictError):
+                create_reservation(guest, room, prefs, "hotel@example.com", "pw")
+            booking = create_reservation(guest, room, dict(prefs, hold_id=hold_id), "hotel@example.com", "pw")
+
+        self.assertEqual(booking["room_id"], "R001")
+        self.assertEqual(len(self.holds), 0)
+
+
+class TestEmailTemplates(unittest.TestCase):
+    """Test Cases for email_templates.py - Compiled Email Templates"""
+
+    def test_render_matches_template_text(self):
+        """Rendering fills every placeholder and keeps literal dollar signs"""
+        from email_templates import get_template
+        template = get_template("modification")
+        subject, body = template.render({"guest_name": "Test User", "old_confirmation_number": "#OLD0001",
+                                         "confirmation_number": "#NEW0001", "check_in": "2026-01-03",
+                                         "check_out": "2026-01-05", "nights": 2, "total_price": "300.00"})
+
+        self.assertIs(get_template("modification"), template)
+        self.assertEqual(subject, "Reservation Modified - Best Hotel Booking")
+        self.assertIn("New Confirmation Number: #NEW0001\n", body)
+        self.assertIn("Total Price: $300.00", body)
+
+    def test_render_batch_produces_parseable_messages(self):
+        """Batch rendering yields complete messages that the email package can read back"""
+        from email import message_from_bytes
+        from email_templates import render_batch
+        rows = [(f"guest{i}@example.com", {"subject": "Pool closed", "guest_name": name, "message": "The pool is closed.",
+                                           "confirmation_number": f"#G{i}", "check_in": "2026-01-03",
+                                           "check_out": "2026-01-05"})
+                for i, name in enumerate(["Ann Lee", "Zoë Ruiz"])]
+
+        messages = list(render_batch("notice", "hotel@example.com", rows))
+
+        self.assertEqual([recipient for recipient, _ in messages], ["guest0@example.com", "guest1@example.com"])
+        parsed = message_from_bytes(messages[1][1])
+        self.assertEqual(parsed["Subject"], "Pool closed")
+        self.assertIn("Dear Zoë Ruiz,", parsed.get_payload(decode=True).decode("utf-8"))
+        self.assertIn(b"Content-Transfer-Encoding: 7bit", messages[0][1])
+
+
+class TestEmailDispatcher(unittest.TestCase):
+    """Test Cases for email_dispatcher.py - Rate-Limited Sending"""
+
+    def test_token_bucket_paces_after_burst(self):
+        """Once the burst is used up callers wait 1/rate seconds per token"""
+        from email_dispatcher import TokenBucket
+        now = [0.0]
+        sleeps = []
+
+        def sleep(seconds):
+            sleeps.append(seconds)
+            now[0] += seconds
+
+        bucket = TokenBucket(rate=2, capacity=1, clock=lambda: now[0], sleep=sleep)
+        for _ in range(3):
+            bucket.acquire()
+
+        self.assertEqual(sleeps, [0.5, 0.5])
+
+    def test_domains_take_turns(self):
+        """A small domain isn't stuck behind a big one and sessions are reused"""
+        import threading
+        from email_dispatcher import EmailDispatcher
+        gate = threading.Event()
+        sent = []
+        server = MagicMock()
+        server.sendmail.side_effect = lambda sender, to, raw: (gate.wait(5), sent.append(to[0]))
+        connect = MagicMock(return_value=server)
+        dispatcher = EmailDispatcher(connect, rate=1000, burst=1000, workers=1)
+        messages = [("hotel@example.com", "pw", f"guest{i}@big.com", b"x") for i in range(6)]
+        messages += [("hotel@example.com", "pw", f"guest{i}@small.com", b"x") for i in range(2)]
+        result = []
+
+        worker = threading.Thread(target=lambda: result.append(dispatcher.dispatch(messages)))
+        worker.start()
+        while dispatcher._pending < len(messages) - 1:
+            threading.Event().wait(0.01)
+        gate.set()
+        worker.join(5)
+        dispatcher.close()
+
+        self.assertEqual(result, [(8, [])])
+        self.assertEqual(sum(r.endswith("small.com") for r in sent[:5]), 2)
+        connect.assert_called_once_with("hotel@example.com", "pw")
+
+    def test_failed_login_fails_the_senders_mail(self):
+        """A bad password fails that sender's messages without logging in again for each one"""
+        import smtplib
+        from email_dispatcher import EmailDispatcher
+        connect = MagicMock(side_effect=smtplib.SMTPAuthenticationError(535, b"bad password"))
+        dispatcher = EmailDispatcher(connect, rate=1000, burst=1000, workers=2)
+        messages = [("hotel@example.com", "pw", f"guest{i}@example.com", b"x") for i in range(10)]
+
+        sent, failed = dispatcher.dispatch(messages)
+        dispatcher.close()
+
+        self.assertEqual((sent, len(failed)), (0, 10))
+        self.assertLessEqual(connect.call_count, 2)
+
+    def test_unexpected_error_fails_one_message(self):
+        """An unexpected exception fails that message and the worker goes on with the rest"""
+        from email_dispatcher import EmailDispatcher
+        server = MagicMock()
+        server.sendmail.side_effect = [TypeError("bad message"), None, None]
+        dispatcher = EmailDispatcher(MagicMock(return_value=server), rate=1000, burst=1000, workers=1)
+        messages = [("hotel@example.com", "pw", f"guest{i}@example.com", b"x") for i in range(3)]
+
+        sent, failed = dispatcher.dispatch(messages)
+        dispatcher.close()
+
+        self.assertEqual((sent, failed), (2, messages[:1]))
+
+
+class TestEmailRetry(unittest.TestCase):
+    """Test Cases for email_retry.py - Durable Retry Queue"""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.dir_patch = patch("email_retry.RETRY_DIR", self.tmp.name)
+        self.dir_patch.start()
+        self.env_patch = patch.dict(os.environ, {"user_email": "hotel@example.com", "user_pass": "secret-pw"})
+        self.env_patch.start()
+
+    def tearDown(self):
+        self.env_patch.stop()
+        self.dir_patch.stop()
+        self.tmp.cleanup()
+
+    def test_failed_send_is_parked_without_password(self):
+        """send_email parks the message on failure and never writes the password"""
+        import email_retry
+        from email_service import send_email
+        with patch("email_service._connect", side_effect=OSError("network down")):
+            self.assertFalse(send_email("hotel@example.com", "secret-pw", "guest@example.com", "Hi", "Body"))
+
+        parked = email_retry.pending_retries()
+        self.assertEqual([(e["recipient"], e["attempts"]) for e in parked], [("guest@example.com", 1)])
+        with open(os.path.join(self.tmp.name, email_retry.RETRY_FILE)) as f:
+            self.assertNotIn("secret-pw", f.read())
+
+    def test_backoff_then_dead_letter(self):
+        """Failures are rescheduled further out each time and dead-lettered after MAX_ATTEMPTS"""
+        import email_retry
+        email_retry.park("hotel@example.com", "guest@example.com", b"Subject: Hi\r\n\r\nBody", now=0)
+        self.assertEqual(email_retry.process_retries(dispatch=MagicMock(), now=0), (0, 0, 0))
+
+        calls = []
+
+        def failing(messages):
+            calls.append(messages)
+            return 0, list(messages)
+
+        delays = []
+        for _ in range(email_retry.MAX_ATTEMPTS - 1):
+            now = email_retry.pending_retries()[0]["next_attempt"]
+            result = email_retry.process_retries(dispatch=failing, now=now)
+            if email_retry.pending_retries():
+                delays.append(email_retry.pending_retries()[0]["next_attempt"] - now)
+
+        self.assertEqual(result, (0, 0, 1))
+        self.assertEqual(calls[0][0][1], "secret-pw")
+        self.assertTrue(all(later >= earlier for earlier, later in zip(delays, delays[1:])))
+        self.assertEqual(email_retry.pending_retries(), [])
+        self.assertEqual(email_retry.dead_letters()[0]["attempts"], email_retry.MAX_ATTEMPTS)
+
+    def test_successful_retry_leaves_queue(self):
+        """A message that goes through on retry is removed from the queue"""
+        import email_retry
+        email_retry.park("hotel@example.com", "guest@example.com", b"Subject: Hi\r\n\r\nBody", now=0)
+        email_retry.park("other@example.com", "guest@example.com", b"Subject: Hi\r\n\r\nBody", now=0)
+
+        result = email_retry.process_retries(dispatch=lambda messages: (len(messages), []), now=10 ** 6)
+
+        self.assertEqual(result, (1, 0, 0))
+        #Mail from a sender we have no password for stays parked
+        self.assertEqual([e["sender"] for e in email_retry.pending_retries()], ["other@example.com"])
+
+
+class TestSMTPSink(unittest.TestCase):
+    """Test Cases for smtp_sink.py - Offline Email Delivery"""
+
+    def test_send_email_reaches_sink(self):
+        """send_email delivers to the local sink, which saves the message to disk"""
+        import smtp_sink
+        from email_service import send_email
+        with tempfile.TemporaryDirectory() as out_dir:
+            sink = smtp_sink.start_sink(out_dir=out_dir)
+            try:
+                with patch("email_service.SMTP_HOST", "127.0.0.1"), patch("email_service.SMTP_PORT", sink.port), \
+                        patch("email_service.SMTP_SSL", False):
+                    self.assertTrue(send_email("hotel@example.com", "pw", "guest@example.com", "Hello", "..dotted\nBody"))
+            finally:
+                sink.stop()
+
+            self.assertEqual(sink.count, 1)
+            with open(os.path.join(out_dir, "00000001.eml"), "rb") as f:
+                saved = f.read()
+        self.assertIn(b"Subject: Hello", saved)
+        self.assertIn(b"\r\n..dotted\r\nBody", saved)
+
+
+class TestCommandLine(unittest.TestCase):
+    """Test Cases for resources/cli.py - Headless Bulk Operations"""
+
+    def setUp(self):
+        """Load the CLI module and point storage at a throwaway bookings folder"""
+        spec = importlib.util.spec_from_file_location(
+            "cli", os.path.join(os.path.dirname(os.path.abspath(__file__)), "resources", "cli.py"))
+        self.cli = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(self.cli)
+        self.tmp = tempfile.TemporaryDirectory()
+        self.dir_patch = patch("storage.BOOKINGS_DIR", self.tmp.name)
+        self.dir_patch.start()
+
+    def tearDown(self):
+        self.dir_patch.stop()
+        self.tmp.cleanup()
+
+    def test_batch_streams_one_result_per_line(self):
+        """A JSONL batch books, reports the clash with alternatives, cancels and reports, all in one run"""
+        stay = {"room_id": "R002", "check_in": "2026-01-03", "check_out": "2026-01-05",
+                "name": "Test User", "email": "test@example.com", "phone": "555-1234"}
+        ops = [dict(stay, op="book", id=1), dict(stay, op="book", id=2, name="Second Guest"),
+               {"op": "search", "id": 3, "check_in": "2026-01-03", "check_out": "2026-01-05", "guests": 4},
+               "not json", {"op": "fly", "id": 5}]
+        lines = [op if isinstance(op, str) else json.dumps(op) for op in ops]
+        out = io.StringIO()
+        with patch("createReservation_logic.send_email") as send:
+            failed = self.cli.run_batch(lines, out, no_email=True)
+        results = [json.loads(line) for line in out.getvalue().splitlines()]
+
+        self.assertEqual(failed, 3)
+        self.assertEqual(send.call_count, 0)
+        self.assertTrue(results[0]["ok"])
+        conf_num = results[0]["reservation"]["confirmation_number"]
+        self.assertEqual(results[1]["conflicts"], [conf_num])
+        self.assertIn("R003", results[1]["alternatives"])
+        self.assertEqual([room["room_id"] for room in results[2]["rooms"]], ["R005", "R006", "R009", "R0010", "R0011"])
+        self.assertFalse(results[3]["ok"])
+        self.assertEqual(results[4], {"id": 5, "op": "fly", "ok": False, "error": "Unknown op 'fly'"})
+
+        out = io.StringIO()
+        self.cli.run_batch([json.dumps({"op": "cancel", "confirmation_number": conf_num}),
+                            json.dumps({"op": "report"})], out, no_email=True)
+        cancelled, report = [json.loads(line) for line in out.getvalue().splitlines()]
+        self.assertEqual(cancelled["cancelled"], {conf_num: True})
+        self.assertEqual((report["total"], report["cancelled"], report["revenue"]), (1, 1, 0.0))
+
+    def test_export_csv(self):
+        """export writes a CSV with a header row and one row per booking"""
+        import storage
+        storage.save_booking({"confirmation_number": "#CLI0001", "room_id": "R002", "guest_name": "Test User",
+                              "guest_email": "test@example.com", "guest_phone": "555-1234", "room_type": "Double",
+                              "check_in": "2026-01-03", "check_out": "2026-01-05", "nights": 2,
+                              "total_price": 300.0, "status": "CONFIRMED"})
+        out = io.StringIO()
+        self.assertEqual(self.cli.main(["export", "--format", "csv"], stdout=out), 0)
+        rows = list(csv.DictReader(io.StringIO(out.getvalue())))
+        self.assertEqual([row["confirmation_number"] for row in rows], ["#CLI0001"])
+
+
+class TestAPIServer(unittest.TestCase):
+    """Test Cases for api_server.py - HTTP JSON Endpoints"""
+
+    def setUp(self):
+        """Start the API on a free port over a throwaway bookings folder"""
+        import api_server
+        self.tmp = tempfile.TemporaryDirectory()
+        self.dir_patch = patch("storage.BOOKINGS_DIR", self.tmp.name)
+        self.dir_patch.start()
+        self.server = api_server.start_server(no_email=True)
+        self.connection = http.client.HTTPConnection(self.server.host, self.server.port, timeout=10)
+
+    def tearDown(self):
+        self.connection.close()
+        self.server.stop()
+        self.dir_patch.stop()
+        self.tmp.cleanup()
+
+    def call(self, method, path, body=None):
+        self.connection.request(method, path, json.dumps(body) if body is not None else None)
+        response = self.connection.getresponse()
+        return response.status, json.loads(response.read())
+
+    def test_reservation_lifecycle(self):
+        """Book, clash (409), look up, cancel and look up a missing booking over one connection"""
+        stay = {"room_id": "R002", "check_in": "2026-01-03", "check_out": "2026-01-05",
+                "name": "Test User", "email": "test@example.com", "phone": "555-1234"}
+        status, created = self.call("POST", "/reservations", stay)
+        self.assertEqual(status, 201)
+        conf_num = created["reservation"]["confirmation_number"]
+
+        status, clash = self.call("POST", "/reservations", dict(stay, name="Second Guest"))
+        self.assertEqual((status, clash["conflicts"]), (409, [conf_num]))
+
+        status, search = self.call("GET", "/rooms?check_in=2026-01-03&check_out=2026-01-05")
+        self.assertNotIn("R002", [room["room_id"] for room in search["rooms"]])
+
+        status, found = self.call("GET", "/reservations/" + conf_num.lstrip("#"))
+        self.assertEqual((status, found["reservation"]["guest_name"]), (200, "Test User"))
+        self.assertEqual(self.call("DELETE", "/reservations/%23" + conf_num[1:])[0], 200)
+        self.assertEqual(self.call("DELETE", "/reservations/%23" + conf_num[1:])[0], 404)
+        self.assertEqual(self.call("GET", "/reservations/NOPE0000")[0], 404)
+        self.assertEqual(self.call("POST", "/reservations", dict(stay, check_out="soon"))[0], 400)
+
+    def test_unexpected_error_is_500(self):
+        """An unexpected exception answers 500 and the kept-alive connection still works"""
+        with patch("resources.cli.search", side_effect=RuntimeError("boom")), patch("sys.stderr", io.StringIO()):
+            status, body = self.call("GET", "/rooms?check_in=2026-01-03&check_out=2026-01-05")
+        self.assertEqual((status, body), (500, {"error": "Internal server error"}))
+        self.assertEqual(self.call("GET", "/health")[0], 200)
+
+
+class TestAsyncService(unittest.TestCase):
+    """Test Cases for async_service.py - Asyncio Reservation Facade"""
+
+    def test_concurrent_bookings_one_winner_per_room(self):
+        """Many coroutines booking the same rooms at once: one wins per room, each winner gets one email"""
+        import asyncio
+        import smtp_sink
+        from async_service import ReservationService
+        from models import default_rooms
+        from storage import BookingConflictError
+        rooms = default_rooms()[:3]
+        prefs = {"check_in": "2026-01-03", "check_out": "2026-01-05", "nights": 2}
+
+        async def scenario():
+            service = ReservationService("hotel@example.com", "pw", rooms=rooms)
+            attempts = [service.create_reservation({"name": f"Guest {i}", "email": f"guest{i}@example.com",
+                                                    "phone": "555-1234"}, rooms[i % 3], prefs)
+                        for i in range(12)]
+            results = await asyncio.gather(*attempts, return_exceptions=True)
+            await service.close()
+            return results
+
+        with tempfile.TemporaryDirectory() as tmp, patch("storage.BOOKINGS_DIR", tmp):
+            sink = smtp_sink.start_sink()
+            try:
+                with patch("email_service.SMTP_HOST", "127.0.0.1"), patch("email_service.SMTP_PORT", sink.port), \
+                        patch("email_service.SMTP_SSL", False):
+                    results = asyncio.run(scenario())
+            finally:
+                sink.stop()
+
+        booked = [r for r in results if isinstance(r, dict)]
+        self.assertEqual(sorted(r["room_id"] for r in booked), ["R000", "R001", "R002"])
+        self.assertTrue(all(isinstance(r, BookingConflictError) for r in results if not isinstance(r, dict)))
+        self.assertEqual(sink.count, 3)
+
+    def test_key_lookup_and_cancel_stay_off_the_loop(self):
+        """The idempotency lookup and the cancel (with its email context) run in the storage threads"""
+        import asyncio
+        import threading
+        from async_service import ReservationService
+        threads = []
+
+        def record(result):
+            return lambda *args, **kwargs: threads.append(threading.current_thread()) or result
+
+        async def scenario():
+            service = ReservationService(rooms=[])
+            found = await service.create_reservation({}, None, {}, idempotency_key="click-1")
+            cancelled = await service.cancel_reservation("#CANCEL01", {"room_id": "R001", "guest_email": ""})
+            await service.close()
+            return found, cancelled
+
+        with patch("idempotency.idempotency_store.get", record((True, "first"))), \
+                patch("createReservation_logic.cancel_reservation", record(False)):
+            self.assertEqual(asyncio.run(scenario()), ("first", False))
+        self.assertEqual(len(threads), 2)
+        self.assertNotIn(threading.main_thread(), threads)
+
+
+class TestReportJobs(unittest.TestCase):
+    """Test Cases for report_jobs.py - Sharded Multi-Process Reports"""
+
+    def setUp(self):
+        """Fill a throwaway bookings folder with stays over a few months"""
+        import storage
+        self.tmp = tempfile.TemporaryDirectory()
+        self.dir_patch = patch("storage.BOOKINGS_DIR", self.tmp.name)
+        self.dir_patch.start()
+        stays = [("2026-01-30", "2026-02-02", "CONFIRMED", "Double", 450.0),
+                 ("2026-02-10", "2026-02-12", "CONFIRMED", "Suite", 600.0),
+                 ("2026-03-01", "2026-03-04", "CANCELLED", "Double", 450.0),
+                 ("2026-04-05", "2026-04-06", "CONFIRMED", "Single", 100.0)]
+        for i, (check_in, check_out, status, room_type, price) in enumerate(stays):
+            storage.save_booking({"confirmation_number": f"#REP{i:04d}", "room_id": "R001", "guest_name": "Guest",
+                                  "guest_email": "guest@example.com", "room_type": room_type, "check_in": check_in,
+                                  "check_out": check_out, "total_price": price, "status": status})
+
+    def tearDown(self):
+        self.dir_patch.stop()
+        self.tmp.cleanup()
+
+    def test_pool_matches_in_process(self):
+        """The worker pool gives the same report, details in the same order, as aggregating in process"""
+        import report_jobs
+        inline = report_jobs.run_report(details=True)
+        with patch("report_jobs.MIN_PARALLEL_BYTES", 0):
+            pooled = report_jobs.run_report(details=True, workers=2)
+        self.assertEqual(pooled, inline)
+        self.assertEqual((inline["total"], inline["confirmed"], inline["cancelled"]), (4, 3, 1))
+        self.assertEqual(inline["revenue"], 1150.0)
+        self.assertIn("#REP0000", inline["details"][0])
+
+    def test_month_split_and_range(self):
+        """Nights are counted in the month they fall in, and a date range only keeps check-ins inside it"""
+        import report_jobs
+        report = report_jobs.run_report()
+        self.assertEqual(report["by_month"]["2026-01"]["room_nights"], 2)
+        self.assertEqual(report["by_month"]["2026-02"]["room_nights"], 3)
+        self.assertAlmostEqual(report["by_month"]["2026-02"]["occupancy"], 3 / (12 * 28))
+        self.assertEqual(report["by_room_type"]["Suite"], {"bookings": 1, "room_nights": 2, "revenue": 600.0})
+        ranged = report_jobs.run_report("2026-02-01", "2026-03-31")
+        self.assertEqual((ranged["total"], ranged["confirmed"]), (2, 1))
+
+    def test_failed_shard_reaches_on_error(self):
+        """A shard that raises goes to on_error, on_done is never called and the job stops"""
+        import report_jobs
+
+        class Root:
+            def after(self, ms, func):
+                func()
+
+        done, errors = [], []
+        with patch("report_jobs.merge_partials", side_effect=OSError("disk gone")):
+            job = report_jobs.start_report_job(Root(), done.append, on_error=errors.append, forecast=False)
+        self.assertEqual(done, [])
+        self.assertEqual([str(e) for e in errors], ["disk gone"])
+        self.assertTrue(job.cancelled)
+
+
+@unittest.skipUnless(importlib.util.find_spec("numpy"), "NumPy not installed")
+class TestAnalytics(unittest.TestCase):
+    """Test Cases for analytics.py - Occupancy, ADR and RevPAR"""
+
+    def setUp(self):
+        from models import Room
+        self.rooms = [Room("R1", "Single", 1, 1, 100.0, []), Room("R2", "Single", 1, 1, 100.0, []),
+                      Room("R3", "Suite", 4, 2, 300.0, [])]
+        self.bookings = [
+            {"room_id": "R1", "check_in": "2026-01-30", "check_out": "2026-02-02", "total_price": 300.0, "status": "CONFIRMED"},
+            {"room_id": "R3", "check_in": "2026-02-01", "check_out": "2026-02-03", "total_price": 600.0, "status": "CONFIRMED"},
+            {"room_id": "R2", "check_in": "2026-02-01", "check_out": "2026-02-05", "total_price": 400.0, "status": "CANCELLED"},
+        ]
+
+    def test_daily_by_room_type(self):
+        """Stays are expanded night by night, cancelled ones don't count"""
+        from analytics import BookingColumns, compute_kpis
+        columns = BookingColumns.from_bookings(self.bookings, self.rooms)
+        kpis = compute_kpis(columns, "2026-01-31", "2026-02-03", "day", by_room_type=True, rooms=self.rooms)
+        rows = {(row["period"], row["room_type"]): row for row in kpis.rows()}
+        self.assertEqual(rows[("2026-02-01", "Single")]["sold"], 1)
+        self.assertEqual(rows[("2026-02-01", "Single")]["occupancy"], 0.5)
+        self.assertEqual(rows[("2026-02-02", "Single")]["sold"], 0)
+        self.assertEqual(rows[("2026-02-02", "Suite")]["adr"], 300.0)
+
+    def test_monthly_hotel_totals(self):
+        """Months sum their days; RevPAR is revenue over every room night available"""
+        from analytics import BookingColumns, compute_kpis
+        columns = BookingColumns.from_bookings(self.bookings, self.rooms)
+        kpis = compute_kpis(columns, "2026-01-01", "2026-03-01", "month", rooms=self.rooms)
+        january, february = kpis.rows()
+        self.assertEqual((january["period"], january["sold"], january["available"]), ("2026-01-01", 2, 93))
+        self.assertEqual((february["sold"], february["revenue"]), (3, 700.0))
+        self.assertEqual(february["revpar"], round(700.0 / 84, 2))
+        weeks = compute_kpis(columns, "2026-01-26", "2026-02-09", "week", rooms=self.rooms)
+        self.assertEqual([str(day) for day in weeks.starts], ["2026-01-26", "2026-02-02"])
+
+    def test_hotel_kpis_read_rollups(self):
+        """Stored bookings give the same KPIs from the daily rollups as from a scan"""
+        import storage
+        from analytics import BookingColumns, compute_kpis, hotel_kpis
+        types = {"R1": "Single", "R2": "Single", "R3": "Suite"}
+        with tempfile.TemporaryDirectory() as tmp, patch("storage.BOOKINGS_DIR", tmp):
+            for i, booking in enumerate(self.bookings):
+                storage.save_booking(dict(booking, confirmation_number=f"#KPI{i}", room_type=types[booking["room_id"]]))
+            with patch("storage.iter_bookings") as scan:
+                kpis = list(hotel_kpis("2026-01-01", "2026-03-01", "week", by_room_type=True, rooms=self.rooms).rows())
+            scan.assert_not_called()
+        columns = BookingColumns.from_bookings(self.bookings, self.rooms)
+        self.assertEqual(kpis, list(compute_kpis(columns, "2026-01-01", "2026-03-01", "week", True, self.rooms).rows()))
+
+
+class TestRollups(unittest.TestCase):
+    """Test Cases for rollups.py - Daily Rollups Kept Up To Date On Write"""
+
+    def setUp(self):
+        import storage
+        self.tmp = tempfile.TemporaryDirectory()
+        self.dir_patch = patch("storage.BOOKINGS_DIR", self.tmp.name)
+        self.dir_patch.start()
+        for i, (room_id, check_in, check_out) in enumerate([("R1", "2026-03-01", "2026-03-03"),
+                                                            ("R2", "2026-03-02", "2026-03-05")]):
+            storage.save_booking({"confirmation_number": f"#ROL{i}", "room_id": room_id, "room_type": "Double",
+                                  "check_in": check_in, "check_out": check_out, "total_price": 100.0 * i + 200.0,
+                                  "status": "CONFIRMED"})
+
+    def tearDown(self):
+        self.dir_patch.stop()
+        self.tmp.cleanup()
+
+    def test_counters_follow_writes(self):
+        """Saves, cancels and a transaction move the counters the same way a full recount does"""
+        import rollups
+        import storage
+        day = {row["date"]: row for row in rollups.daily("2026-03-01", "2026-03-06")}
+        self.assertEqual((day["2026-03-02"]["sold"], day["2026-03-02"]["revenue"], day["2026-03-02"]["arrivals"]),
+                         (2, 200.0, 1))
+        self.assertEqual(day["2026-03-03"]["departures"], 1)
+        storage.update_booking_status("#ROL0", "CANCELLED")
+        with storage.transaction() as tx:
+            tx.update_status("#ROL1", "CANCELLED")
+            tx.insert({"confirmation_number": "#ROL2", "room_id": "R2", "room_type": "Double",
+                       "check_in": "2026-03-04", "check_out": "2026-03-05", "total_price": 120.0,
+                       "status": "CONFIRMED"})
+        totals = rollups.totals("2026-03-01", "2026-03-06")["Double"]
+        self.assertEqual((totals["sold"], totals["revenue"], totals["cancellations"]), (1, 120.0, 2))
+        self.assertEqual(rollups.check(), [])
+
+    def test_compaction_and_rebuild(self):
+        """A compacted table reads the same, and rebuild repairs counters that drifted"""
+        import rollups
+        before = rollups.daily("2026-03-01", "2026-03-06")
+        rollups.rollup_store.replace(rollups.rollup_store.table())
+        self.assertEqual(rollups.daily("2026-03-01", "2026-03-06"), before)
+        held = rollups.rollup_store.table("2026-03-01", "2026-03-02")
+        rollups.rollup_store.apply({"2026-03-01": {"Double": [5, 0.0, 0, 0, 0]}})
+        #Callers get a copy, later writes don't change it under them
+        self.assertEqual((list(held), held["2026-03-01"]["Double"][0]), (["2026-03-01"], 1))
+        self.assertEqual(rollups.check(), [("2026-03-01", "Double", "sold", 6, 1)])
+        rollups.rebuild()
+        self.assertEqual(rollups.check(), [])
+        self.assertEqual(rollups.daily("2026-03-01", "2026-03-06"), before)
+
+    def test_seeded_from_existing_bookings(self):
+        """A folder with bookings but no rollup files yet is counted on first use"""
+        import rollups
+        with tempfile.TemporaryDirectory() as tmp, patch("storage.BOOKINGS_DIR", tmp):
+            with open(os.path.join(tmp, "2026-03.jsonl"), "w") as f:
+                f.write(json.dumps({"confirmation_number": "#OLD1", "room_id": "R1", "room_type": "Double",
+                                    "check_in": "2026-03-01", "check_out": "2026-03-03", "total_price": 200.0,
+                                    "status": "CONFIRMED"}) + "\n")
+            self.assertEqual(rollups.totals("2026-03-01", "2026-03-04")["Double"]["sold"], 2)
+            self.assertEqual(rollups.check(), [])
+
+
+class TestReportExport(unittest.TestCase):
+    """Test Cases for report_export.py - Streaming CSV and Columnar Exports"""
+
+    def setUp(self):
+        import storage
+        self.tmp = tempfile.TemporaryDirectory()
+        self.dir_patch = patch("storage.BOOKINGS_DIR", os.path.join(self.tmp.name, "bookings"))
+        self.dir_patch.start()
+        stays = [("2026-01-10", "2026-01-12", "CONFIRMED", "Zoë"), ("2026-02-01", "2026-02-04", "CANCELLED", "Ana"),
+                 ("2026-03-05", "not a date", "CONFIRMED", "Bo")]
+        for i, (check_in, check_out, status, name) in enumerate(stays):
+            storage.save_booking({"confirmation_number": f"#EXP{i}", "room_id": f"R00{i}", "guest_name": name,
+                                  "guest_email": "guest@example.com", "room_type": "Double", "check_in": check_in,
+                                  "check_out": check_out, "nights": 2, "total_price": 150.0 * (i + 1),
+                                  "status": status})
+
+    def tearDown(self):
+        self.dir_patch.stop()
+        self.tmp.cleanup()
+
+    def test_csv_date_range(self):
+        """CSV export keeps only the check-in range asked for"""
+        from report_export import export_bookings
+        path = os.path.join(self.tmp.name, "out.csv")
+        self.assertEqual(export_bookings(path, start="2026-02-01", end="2026-03-31"), 2)
+        with open(path, newline="", encoding="utf-8") as f:
+            rows = list(csv.DictReader(f))
+        self.assertEqual([row["confirmation_number"] for row in rows], ["#EXP1", "#EXP2"])
+        #Unpadded dates as typed in the GUI mean the same days
+        self.assertEqual(export_bookings(path, start="2026-1-1", end="2026-2-1"), 2)
+
+    @unittest.skipUnless(importlib.util.find_spec("numpy"), "NumPy is not installed")
+    def test_npz_round_trip(self):
+        """Columns written a chunk at a time read back as typed arrays"""
+        import numpy as np
+        import storage
+        from report_export import write_npz, read_npz
+        path = os.path.join(self.tmp.name, "out.npz")
+        self.assertEqual(write_npz(storage.iter_bookings(), path, chunk_rows=2), 3)
+        columns = read_npz(path)
+        self.assertEqual(list(columns["guest_name"]), ["Zoë", "Ana", "Bo"])
+        self.assertEqual(list(columns["status"]), ["CONFIRMED", "CANCELLED", "CONFIRMED"])
+        self.assertEqual(columns["check_in"][1], np.datetime64("2026-02-01"))
+        self.assertTrue(np.isnat(columns["check_out"][2]))
+        self.assertEqual(columns["total_price"].tolist(), [150.0, 300.0, 450.0])
+        from report_export import _dates
+        self.assertEqual(_dates(["2026-3-5"])[0], np.datetime64("2026-03-05"))
+
+
+@unittest.skipUnless(importlib.util.find_spec("numpy"), "NumPy is not installed")
+class TestForecast(unittest.TestCase):
+    """Test Cases for forecast.py - Occupancy Forecast From Booking Pace"""
+
+    def stays(self, first, days, lead):
+        """One-night stays, two per night, one booked `lead` days ahead and one the day before"""
+        start = datetime.strptime(first, "%Y-%m-%d")
+        bookings = []
+        for i in range(days):
+            night = start + timedelta(days=i)
+            for ahead in (lead, 1):
+                bookings.append({"check_in": night.strftime("%Y-%m-%d"),
+                                 "check_out": (night + timedelta(days=1)).strftime("%Y-%m-%d"),
+                                 "created_at": (night - timedelta(days=ahead)).strftime("%Y-%m-%dT09:00:00"),
+                                 "status": "CONFIRMED"})
+        return bookings
+
+    def test_pickup_from_history(self):
+        """Nights 10 days out have one booking on the books and pick up the late one"""
+        from forecast import PaceModel
+        model = PaceModel(capacity=4)
+        model.add(self.stays("2026-01-01", 120, lead=20))
+        result = model.forecast("2026-03-01", horizon=30)
+        self.assertEqual(result.on_books[10], 1)
+        self.assertAlmostEqual(result.expected[10], 2.0)
+        self.assertEqual((result.on_books[0], result.expected[25]), (2, 2.0))
+        self.assertAlmostEqual(result.occupancy[10], 0.5)
+        model.remove(self.stays("2026-03-11", 1, lead=20))
+        self.assertEqual(model.forecast("2026-03-01", horizon=30).on_books[10], 0)
+
+    def test_report_forecast_section(self):
+        """New reservations carry created_at, and the admin report gets weekly forecast rows"""
+        import report_jobs
+        from createReservation_logic import create_reservation
+        from models import Room
+        room = Room("R900", "Single", 1, 1, 100.0, [])
+        check_in = (datetime.now() + timedelta(days=3)).strftime("%Y-%m-%d")
+        check_out = (datetime.now() + timedelta(days=5)).strftime("%Y-%m-%d")
+        with tempfile.TemporaryDirectory() as tmp, patch("storage.BOOKINGS_DIR", tmp):
+            reservation = create_reservation({"name": "Guest", "email": "g@example.com", "phone": ""}, room,
+                                             {"check_in": check_in, "check_out": check_out, "nights": 2}, "", "")
+            self.assertTrue(reservation["created_at"].startswith(datetime.now().strftime("%Y-%m-%d")))
+            report = report_jobs.ReportJob(forecast=True).result()
+        self.assertEqual(len(report["forecast"]), 13)
+        self.assertEqual(report["forecast"][0]["on_books"], 2)
+        self.assertIn("FORECAST", report_jobs.format_report(report))
+
+    def test_shared_model_follows_writes(self):
+        """Bookings written by this process are counted into the shared model without reloading it"""
+        import forecast
+        import storage
+        check_in = (datetime.now() + timedelta(days=3)).strftime("%Y-%m-%d")
+        check_out = (datetime.now() + timedelta(days=4)).strftime("%Y-%m-%d")
+        booking = {"confirmation_number": "FC0001", "room_id": "R900", "room_type": "Single",
+                   "check_in": check_in, "check_out": check_out, "status": "CONFIRMED",
+                   "created_at": datetime.now().strftime("%Y-%m-%dT%H:%M:%S")}
+        with tempfile.TemporaryDirectory() as tmp, patch("storage.BOOKINGS_DIR", tmp):
+            self.assertEqual(forecast.forecast_summary()[0]["on_books"], 0)
+            with patch("forecast.load_model", side_effect=AssertionError("reloaded")):
+                storage.save_booking(booking)
+                self.assertEqual(forecast.forecast_summary()[0]["on_books"], 1)
+                storage.update_booking_status("FC0001", "CANCELLED")
+                self.assertEqual(forecast.forecast_summary()[0]["on_books"], 0)
+            #Another process wrote the file before us, so our write's stamp isn't taken on and the model reloads
+            path = storage._hot_path(storage.partition_key(check_in))
+            seen = storage._mtime(path)
+            os.utime(path, ns=(seen + 2 * 10 ** 9, seen + 2 * 10 ** 9))
+            forecast.apply_changes(stamps={path: (seen + 10 ** 9, seen + 2 * 10 ** 9)})
+            with patch("forecast.load_model", wraps=forecast.load_model) as load:
+                forecast.get_model()
+            load.assert_called_once()
+
+
+@unittest.skipUnless(importlib.util.find_spec("numpy"), "NumPy is not installed")
+class TestPricing(unittest.TestCase):
+    """Test Cases for pricing.py - Rate Calendar"""
+
+    def setUp(self):
+        from models import default_rooms
+        self.rooms = default_rooms()
+
+    def test_no_rules_is_nights_times_price(self):
+        """Without rules every quote matches the old nights * price, one room or the whole list"""
+        from models import Room
+        from pricing import RateCalendar
+        calendar = RateCalendar(self.rooms, start="2026-01-01", days=30)
+        for room in self.rooms:
+            self.assertEqual(calendar.quote(room, "2026-01-10", "2026-01-13"), 3 * room.price)
+        #Outside the compiled days, and a room the catalog doesn't have
+        self.assertEqual(calendar.quote(Room("R900", "Loft", 2, 1, 110.1, []), "2026-05-01", "2026-05-04"), 3 * 110.1)
+        totals = calendar.quote_rooms(self.rooms, "2026-01-10", "2026-01-12")
+        self.assertEqual(totals.tolist(), [2 * room.price for room in self.rooms])
+        #Unpadded dates, which the GUI's validate_date accepts
+        self.assertEqual(calendar.quote(self.rooms[3], "2026-1-10", "2026-1-13"), 330.0)
+
+    def test_rules_compile_incrementally(self):
+        """Seasons and weekdays stack, the highest occupancy tier wins, removing a rule restores the rates"""
+        from pricing import RateCalendar, SeasonRule, WeekdayRule, OccupancyRule
+        single, suite = self.rooms[0], self.rooms[5]
+        calendar = RateCalendar(self.rooms, start="2025-12-01", days=60)
+        holidays = SeasonRule("12-30", "01-02", 2.0)
+        calendar.add_rule(holidays)
+        calendar.add_rule(WeekdayRule([4], 1.5, room_types=["Suite"]))
+        #2026-01-01 is a Thursday, 2026-01-02 a Friday
+        self.assertEqual(calendar.nightly_rates(suite, "2026-01-01", "2026-01-04").tolist(), [1076.0, 1614.0, 538.0])
+        self.assertEqual(calendar.quote(single, "2026-01-01", "2026-01-04"), 500.0)
+        calendar.add_rule(OccupancyRule(0.5, 1.2))
+        calendar.add_rule(OccupancyRule(0.8, 1.4))
+        calendar.set_occupancy("2026-01-10", [0.6, 0.9, 0.2])
+        self.assertEqual(calendar.nightly_rates(single, "2026-01-09", "2026-01-13").tolist(), [100.0, 120.0, 140.0, 100.0])
+        calendar.remove_rule(holidays)
+        self.assertEqual(calendar.quote(single, "2026-01-01", "2026-01-04"), 300.0)
+
+    def test_occupancy_read_once_per_rollup_change(self):
+        """Occupancy rules re-read the rollups only after a booking moved them"""
+        import rollups
+        import storage
+        from pricing import RateCalendar, OccupancyRule
+        calendar = RateCalendar(self.rooms, start="2026-01-01", days=30, rules=[OccupancyRule(0.05, 2.0)])
+        with tempfile.TemporaryDirectory() as tmp, patch("storage.BOOKINGS_DIR", tmp):
+            with patch.object(rollups.rollup_store, "table", wraps=rollups.rollup_store.table) as table:
+                calendar.refresh_occupancy()
+                calendar.refresh_occupancy()
+                self.assertEqual(table.call_count, 1)
+                storage.save_booking({"confirmation_number": "#OCC1", "room_id": "R001", "room_type": "Single",
+                                      "check_in": "2026-01-10", "check_out": "2026-01-11", "status": "CONFIRMED"})
+                calendar.refresh_occupancy()
+                calendar.refresh_occupancy()
+                self.assertEqual(table.call_count, 2)
+        self.assertEqual(calendar.quote(self.rooms[0], "2026-01-10", "2026-01-11"), 2 * self.rooms[0].price)
+
+
+class TestAmenityQuotes(unittest.TestCase):
+    """Test Cases for structured amenities and the room + amenities + taxes stay quote"""
+
+    def test_catalog_amenities(self):
+        """Rooms keep their display strings, price without amenities, and match amenities by id or text"""
+        from models import Room, Amenity, AMENITIES, default_rooms
+        from room_logic import get_available_rooms
+        rooms = {room.room_id: room for room in default_rooms()}
+        self.assertEqual(rooms["R008"].base_price, 150.0)
+        self.assertEqual(rooms["R003"].amenities, ["\U0001F4F6 WiFi - $10"])
+        self.assertTrue(rooms["R003"].has_amenity("wifi") and rooms["R003"].has_amenity("\U0001F4F6 WiFi - $10 "))
+        plain = Room("R900", "Single", 1, 1, 90.0, ["None"])
+        self.assertEqual((plain.amenities, plain.amenity_items, plain.base_price), (["None"], [], 90.0))
+        self.assertEqual(Amenity("parking", "Parking", 15.0, per_night=False).charge(3), 15.0)
+        self.assertEqual(AMENITIES["bathtub"].charge(3), 114.0)
+        with tempfile.TemporaryDirectory() as tmp, patch("storage.BOOKINGS_DIR", tmp):
+            found = get_available_rooms(list(rooms.values()), "2026-12-01", "2026-12-03", 1, 1, ["mini_fridge"])
+        self.assertEqual([room.room_id for room in found], ["R006", "R009", "R0011"])
+
+    @unittest.skipUnless(importlib.util.find_spec("numpy"), "NumPy is not installed")
+    def test_quote_breakdown(self):
+        """One batch quote splits room, amenities and taxes; without tax it is still nights * price"""
+        from models import Room, Amenity, AMENITIES, default_rooms
+        from pricing import quote_stays
+        rooms = default_rooms()
+        quote = quote_stays(rooms, "2026-12-01", "2026-12-04")
+        self.assertEqual(quote.total.tolist(), [3 * room.price for room in rooms])
+        parking = Amenity("parking", "Parking", 15.0, per_night=False)
+        room = Room("R900", "Double", 2, 1, 160.0, [AMENITIES["wifi"], parking])
+        self.assertEqual(quote_stays([room], "2026-12-01", "2026-12-04", tax_rate=0.1).breakdown(0),
+                         {"nights": 3, "room": 450.0, "amenities": 45.0, "taxes": 49.5, "total": 544.5})
+
+
 def run_tests():
     """Run all tests with verbose output"""
     unittest.main(verbosity=2)
@@ -433,6 +1722,23 @@ if __name__ == '__main__':
     suite.addTests(loader.loadTestsFromTestCase(TestRoomLogicModule))
     suite.addTests(loader.loadTestsFromTestCase(TestUtilityFunctions))
     suite.addTests(loader.loadTestsFromTestCase(TestRefactoringImpact))
+    suite.addTests(loader.loadTestsFromTestCase(TestPartitionedStorage))
+    suite.addTests(loader.loadTestsFromTestCase(TestBookingSegment))
+    suite.addTests(loader.loadTestsFromTestCase(TestRoomHolds))
+    suite.addTests(loader.loadTestsFromTestCase(TestEmailTemplates))
+    suite.addTests(loader.loadTestsFromTestCase(TestEmailDispatcher))
+    suite.addTests(loader.loadTestsFromTestCase(TestEmailRetry))
+    suite.addTests(loader.loadTestsFromTestCase(TestSMTPSink))
+    suite.addTests(loader.loadTestsFromTestCase(TestCommandLine))
+    suite.addTests(loader.loadTestsFromTestCase(TestAPIServer))
+    suite.addTests(loader.loadTestsFromTestCase(TestAsyncService))
+    suite.addTests(loader.loadTestsFromTestCase(TestReportJobs))
+    suite.addTests(loader.loadTestsFromTestCase(TestAnalytics))
+    suite.addTests(loader.loadTestsFromTestCase(TestRollups))
+    suite.addTests(loader.loadTestsFromTestCase(TestReportExport))
+    suite.addTests(loader.loadTestsFromTestCase(TestForecast))
+    suite.addTests(loader.loadTestsFromTestCase(TestPricing))
+    suite.addTests(loader.loadTestsFromTestCase(TestAmenityQuotes))
     
     runner = unittest.TextTestRunner(verbosity=2)
     result = runner.run(suite)
@@ -6,62 +6,74 @@ This module contains helper functions for date validation, confirmation
 number generation, and booking management.
 
 Functions:
-    save_booking: Save new booking to JSON
+    save_booking: Save new booking to storage
     update_booking_status: Update existing booking status
+    update_booking_statuses: Update many booking statuses at once
+    update_statuses_where: Update every booking matching rooms/dates/status
     find_booking: Search for booking by confirmation number
+    find_bookings_by_guest: Search for all of a guest's bookings by email or phone
     validate_date: Validate date format (YYYY-MM-DD)
     generate_conf_number: Generate unique confirmation numbers
-    load_bookings: Load bookings from JSON storage
+    allocate_conf_numbers: Reserve a block of unique confirmation numbers
+    is_valid_conf_number: Check a confirmation number's check character
+    load_bookings: Load bookings from partitioned storage
+    read_booking_feed: Stream reservation records out of a CSV or JSONL feed
 """
 
+import csv
 import json
-import os
 import random
 import string
+import threading
+import time
+from collections import deque
 from datetime import datetime
 
+import storage
+
 def load_bookings():
     #Javier Herrera 11/21/2025
     """
-    Load all bookings from the JSON storage file.
+    Load all bookings from storage.
     
-    Reads bookings.json file and returns all stored bookings.
-    Returns empty list if file doesn't exist or on read error.
+    Reads every month partition, including the compressed archive, so
+    reports see the whole history. Returns empty list if none are stored.
     
     Returns:
         list: List of booking dictionaries, empty list if none found
     """
-    json_file = "bookings/bookings.json"
-    if os.path.exists(json_file):
-        try:
-            with open(json_file, "r") as f:
-                return json.load(f)
-        except:
-            return []
-    return []
+    return storage.load_bookings()
 
 def update_booking_status(conf_num, new_status):
     # Javier Herrera 11/21/2025
     """
-    Update booking status in JSON file.
+    Update booking status in storage.
 
     Returns:
         bool: True if a matching booking was found and updated, False otherwise.
     """
-    bookings = load_bookings()
-    found = False
+    return storage.update_booking_status(conf_num, new_status)
+
+def update_booking_statuses(mapping):
+    """
+    Update many booking statuses in one pass over storage.
+
+    Args:
+        mapping (dict): Confirmation number -> new status
 
-    for booking in bookings:
-        if booking.get('confirmation_number') == conf_num:
-            booking['status'] = new_status
-            found = True
-            break
+    Returns:
+        dict: Confirmation number -> True if updated, False if not found
+    """
+    return storage.update_booking_statuses(mapping)
 
-    if found:
-        with open("bookings/bookings.json", "w") as f:
-            json.dump(bookings, f, indent=2)
+def update_statuses_where(new_status, predicate=None, room_ids=None, start=None, end=None, status=None):
+    """
+    Update every booking for the given rooms/dates/status in one pass.
 
-    return found
+    Returns:
+        list: The updated booking dictionaries
+    """
+    return storage.update_statuses_where(new_status, predicate, room_ids, start, end, status)
 
 
 def validate_date(date_string):
@@ -86,27 +98,103 @@ def validate_date(date_string):
     except:
         return None
 
+#Confirmation numbers are '#' + 7 random base 36 characters + 1 check character
+_CONF_ALPHABET = string.digits + string.ascii_uppercase
+_CONF_BODY_LENGTH = 7
+#Numbers handed out by this process that aren't stored yet (e.g. a reserved import block) -> when
+_issued_conf_numbers = {}
+#The same (when, number) pairs oldest first, so pruning only ever looks at the head
+_issued_order = deque()
+#Unstored numbers are forgotten after this long (the booking failed, or it was only an email reference)
+ISSUED_TTL_SECONDS = 60 * 60
+_conf_lock = threading.Lock()
+_conf_random = random.SystemRandom()
+
+def _conf_check_char(body):
+    """Luhn mod 36 check character, catches any single mistyped character"""
+    total = 0
+    factor = 2
+    for ch in reversed(body):
+        addend = factor * _CONF_ALPHABET.index(ch)
+        total += addend // 36 + addend % 36
+        factor = 1 if factor == 2 else 2
+    return _CONF_ALPHABET[(36 - total % 36) % 36]
+
+def is_valid_conf_number(conf_num):
+    """
+    Check the format and check character of a confirmation number.
+
+    Confirmation numbers made before check characters were added fail this
+    check, so only use it to catch typos, not to reject old bookings.
+
+    Args:
+        conf_num (str): Confirmation number like "#4K2Z9QA7"
+
+    Returns:
+        bool: True if the check character matches
+    """
+    if not isinstance(conf_num, str) or len(conf_num) != _CONF_BODY_LENGTH + 2 or conf_num[0] != '#':
+        return False
+    body = conf_num[1:-1]
+    if any(ch not in _CONF_ALPHABET for ch in body):
+        return False
+    return _conf_check_char(body) == conf_num[-1]
+
+def allocate_conf_numbers(count):
+    """
+    Reserve a block of unique confirmation numbers.
+
+    Each candidate is checked against the hot booking index and the numbers
+    this process handed out that aren't stored yet, both O(1) lookups; the
+    index is taken once per block. Issued numbers are forgotten oldest
+    first, once they are stored or an hour has passed, so each call only
+    looks at the few at the head of the queue. Another
+    process can still draw the same number, so Transaction._verify rejects
+    a commit whose number is already stored. Archived bookings aren't
+    checked; with 36^7 possible numbers a clash with one is vanishingly
+    unlikely. Batch imports grab their whole block up front.
+
+    Args:
+        count (int): How many numbers to reserve
+
+    Returns:
+        list: Confirmation numbers in format "#XXXXXXXX"
+    """
+    existing = storage.get_index().by_conf
+    block = []
+    with _conf_lock:
+        now = time.monotonic()
+        while _issued_order and (_issued_order[0][1] in existing or now - _issued_order[0][0] > ISSUED_TTL_SECONDS):
+            del _issued_conf_numbers[_issued_order.popleft()[1]]
+        while len(block) < count:
+            body = ''.join(_conf_random.choices(_CONF_ALPHABET, k=_CONF_BODY_LENGTH))
+            conf_num = '#' + body + _conf_check_char(body)
+            if conf_num in existing or conf_num in _issued_conf_numbers:
+                continue
+            _issued_conf_numbers[conf_num] = now
+            _issued_order.append((now, conf_num))
+            block.append(conf_num)
+    return block
+
 def generate_conf_number():
     #Sergio Ruelas 11/21/2025
     """
     Generate a random unique confirmation number.
     
-    Creates a confirmation number in format "CONF-XXXXXXXX" where X
-    is a random uppercase letter or digit. Used for all bookings.
+    Creates a confirmation number in format "#XXXXXXXX": 7 random uppercase
+    letters or digits plus a check character. It doesn't clash with any
+    hot booking or unstored number this process issued, see
+    allocate_conf_numbers.
     
     Returns:
-        str: Confirmation number in format "CONF-XXXXXXXX"
+        str: Confirmation number in format "#XXXXXXXX"
     """
-    return '#' + ''.join(random.choices(string.ascii_uppercase + string.digits, k=8))
+    return allocate_conf_numbers(1)[0]
 
 def save_booking(booking_dict):
     #Sergio Ruelas 11/21/2025
-    """Save a new booking to JSON file"""
-    os.makedirs("bookings", exist_ok=True)
-    bookings = load_bookings()
-    bookings.append(booking_dict)
-    with open("bookings/bookings.json", "w") as f:
-        json.dump(bookings, f, indent=2)
+    """Save a new booking to its check-in month partition"""
+    storage.save_booking(booking_dict)
 
 def find_booking(conf_num):
     #Sergio Ruelas 11/21/2025  
@@ -118,11 +206,41 @@ def find_booking(conf_num):
     Returns:
         dict: Reservation with all the details particular to that confirmation number
     """
-    bookings = load_bookings()
-    for booking in bookings:
-        # CHANGED LINE: removed "and booking.get('status') != 'CANCELLED'"
-        if booking.get('confirmation_number') == conf_num:
-            return booking
-    return None
-#```
+    return storage.find_booking(conf_num)
 
+def find_bookings_by_guest(email=None, phone=None):
+    """Find all of a guest's reservations when they don't have the confirmation number
+    
+    Args:
+        email (str): Guest email, case and surrounding spaces don't matter
+        phone (str): Guest phone, only the digits are compared
+        
+    Returns:
+        list: Every reservation made with that email or phone, empty list if none
+    """
+    return storage.find_bookings_by_guest(email, phone)
+
+def read_booking_feed(path):
+    """
+    Stream reservation records out of a group/OTA feed file.
+
+    CSV files need a header row with the record keys (room_id, guest_name,
+    guest_email, guest_phone, check_in, check_out); anything else is read
+    as JSON Lines. Records are yielded one at a time so a big feed never
+    sits in memory twice.
+
+    Args:
+        path (str): Feed file ending in .csv or .jsonl
+
+    Yields:
+        dict: One reservation record per row/line
+    """
+    with open(path, "r", encoding="utf-8", newline="") as f:
+        if path.lower().endswith(".csv"):
+            for row in csv.DictReader(f):
+                yield {key.strip(): (value or "").strip() for key, value in row.items() if key}
+        else:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+#```